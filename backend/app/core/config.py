@@ -1,2 +1,50 @@
 import os
 DATABASE_URL = os.getenv("DATABASE_URL","sqlite:///./h2ready.db")
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE","20"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW","40"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE","1800"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT","30"))
+RESCORE_CHUNK_SIZE = int(os.getenv("RESCORE_CHUNK_SIZE","5000"))
+CURRENT_SCORES = os.getenv("CURRENT_SCORES","1")=="1"
+INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE","5000"))
+BULK_MAX_ERRORS = int(os.getenv("BULK_MAX_ERRORS","1000"))
+PENALTIES_PATH = os.getenv("PENALTIES_PATH")
+SCORE_CACHE_SIZE = int(os.getenv("SCORE_CACHE_SIZE","100000"))
+SCORE_CACHE_PERSIST = os.getenv("SCORE_CACHE_PERSIST","0")=="1"
+PAGE_SIZE_DEFAULT = int(os.getenv("PAGE_SIZE_DEFAULT","500"))
+PAGE_SIZE_MAX = int(os.getenv("PAGE_SIZE_MAX","5000"))
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE","10000"))
+MC_DRAWS = int(os.getenv("MC_DRAWS","10000"))
+MC_MAX_DRAWS = int(os.getenv("MC_MAX_DRAWS","100000"))
+MC_MAX_CELLS = int(os.getenv("MC_MAX_CELLS","2000000"))
+MC_WORKERS = int(os.getenv("MC_WORKERS","0"))
+SCENARIO_MAX = int(os.getenv("SCENARIO_MAX","1000"))
+SCENARIO_MAX_DETAIL_ROWS = int(os.getenv("SCENARIO_MAX_DETAIL_ROWS","200000"))
+SENSITIVITY_MAX_RESULTS = int(os.getenv("SENSITIVITY_MAX_RESULTS","5000"))
+JOB_CHUNK_SIZE = int(os.getenv("JOB_CHUNK_SIZE","5000"))
+JOB_POLL_S = float(os.getenv("JOB_POLL_S","1.0"))
+JOB_CLAIM_TIMEOUT_S = int(os.getenv("JOB_CLAIM_TIMEOUT_S","900"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS","3"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS","0"))
+HISTORY_FULL_DAYS = int(os.getenv("HISTORY_FULL_DAYS","180"))
+HISTORY_KEEP_DAYS = int(os.getenv("HISTORY_KEEP_DAYS","0"))
+INTERN_CACHE_SIZE = int(os.getenv("INTERN_CACHE_SIZE","100000"))
+LRS_TOLERANCE_KM = float(os.getenv("LRS_TOLERANCE_KM","0.001"))
+ILI_CHUNK_SIZE = int(os.getenv("ILI_CHUNK_SIZE","100000"))
+ILI_MAX_DISTANCE_KM = float(os.getenv("ILI_MAX_DISTANCE_KM","0.05"))
+SCADA_CHUNK_SIZE = int(os.getenv("SCADA_CHUNK_SIZE","1000000"))
+SCADA_RESOLUTION_BAR = float(os.getenv("SCADA_RESOLUTION_BAR","0.1"))
+SCADA_MIN_CYCLE_BAR = float(os.getenv("SCADA_MIN_CYCLE_BAR","1.0"))
+SCADA_SURGE_BAR_PER_S = float(os.getenv("SCADA_SURGE_BAR_PER_S","0.5"))
+SCADA_SURGE_GAP_S = float(os.getenv("SCADA_SURGE_GAP_S","60"))
+SCADA_MAX_GAP_S = float(os.getenv("SCADA_MAX_GAP_S","60"))
+SCADA_DPDT_BIN_BAR_PER_S = float(os.getenv("SCADA_DPDT_BIN_BAR_PER_S","0.005"))
+SCADA_DPDT_MAX_BAR_PER_S = float(os.getenv("SCADA_DPDT_MAX_BAR_PER_S","10"))
+SCADA_MIN_HOURS = float(os.getenv("SCADA_MIN_HOURS","24"))
+CP_CHUNK_SIZE = int(os.getenv("CP_CHUNK_SIZE","200000"))
+CP_MAX_DISTANCE_KM = float(os.getenv("CP_MAX_DISTANCE_KM","0.05"))
+SHADOW_TOP = int(os.getenv("SHADOW_TOP","50"))
+PLAN_MAX_INTERVENTIONS = int(os.getenv("PLAN_MAX_INTERVENTIONS","100"))
+PLAN_MAX_OPTIONS = int(os.getenv("PLAN_MAX_OPTIONS","2000"))
+ML_MODEL_DIR = os.getenv("ML_MODEL_DIR")
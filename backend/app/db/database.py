@@ -1,14 +1,39 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine,async_sessionmaker
 from sqlalchemy.orm import sessionmaker, declarative_base
-from app.core.config import DATABASE_URL
+from app.core.config import (DATABASE_URL,ASYNC_DATABASE_URL,DB_POOL_SIZE,DB_MAX_OVERFLOW,
+                             DB_POOL_RECYCLE,DB_POOL_TIMEOUT)
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+ASYNC_DRIVERS={"postgresql":"postgresql+asyncpg","sqlite":"sqlite+aiosqlite"}
+
+def pool_args(url:str)->dict:
+    """QueuePool sizing for server databases; SQLite keeps SQLAlchemy's default file pool."""
+    if make_url(url).get_backend_name()=="sqlite":
+        return {}
+    return {"pool_size":DB_POOL_SIZE,"max_overflow":DB_MAX_OVERFLOW,
+            "pool_recycle":DB_POOL_RECYCLE,"pool_timeout":DB_POOL_TIMEOUT}
+
+def async_url(url:str)->str:
+    """Swap the sync driver for its asyncio counterpart (psycopg2 -> asyncpg, pysqlite -> aiosqlite)."""
+    u=make_url(url)
+    return u.set(drivername=ASYNC_DRIVERS.get(u.get_backend_name(),u.drivername)).render_as_string(hide_password=False)
+
+engine = create_engine(DATABASE_URL, pool_pre_ping=True, **pool_args(DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+_async_url=ASYNC_DATABASE_URL or async_url(DATABASE_URL)
+async_engine = create_async_engine(_async_url, pool_pre_ping=True, **pool_args(_async_url))
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,5 +1,60 @@
-from app.db.database import Base,engine
+from sqlalchemy import select,exists,inspect,text
+from app.core.config import CURRENT_SCORES
+from app.db.database import Base,engine,SessionLocal
 from app.db import models  # noqa
 
 def init_db():
     Base.metadata.create_all(bind=engine)
+    _ensure_columns()
+    _ensure_indexes()
+    if CURRENT_SCORES:
+        _backfill_current_scores()
+
+def _ensure_columns():
+    """create_all skips tables that already exist; add columns introduced since.
+
+    Nullable columns come in empty. NOT NULL ones need a server_default (e.g. segment_inputs.revision),
+    which fills existing rows; others cannot be added to a populated table and are left to a migration.
+    """
+    insp=inspect(engine)
+    ddl=engine.dialect.ddl_compiler(engine.dialect,None)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            have={c["name"] for c in insp.get_columns(table.name)}
+            for col in table.columns:
+                if col.name in have:
+                    continue
+                spec=f"{col.name} {col.type.compile(engine.dialect)}"
+                if not col.nullable:
+                    if col.server_default is None:
+                        continue
+                    # Rendered as create_all would, so the column matches a freshly created one.
+                    spec+=f" NOT NULL DEFAULT {ddl.get_column_default_string(col)}"
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {spec}"))
+
+def _ensure_indexes():
+    """create_all skips indexes on tables that already exist; add any that are missing."""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine,checkfirst=True)
+
+def _backfill_current_scores():
+    """Populate current_scores, current_drivers and pipeline_rollups once for databases that predate them."""
+    from app.scoring.history import classify_drivers,refresh_current_drivers
+    from app.scoring.rollups import refresh_rollups
+    from app.scoring.latest import refresh_current_scores
+    db=SessionLocal()
+    try:
+        classify_drivers(db)
+        if db.scalar(select(exists().where(models.HRIScore.id.isnot(None)))) and \
+           not db.scalar(select(exists().where(models.CurrentScore.segment_id.isnot(None)))):
+            refresh_current_scores(db)
+        elif db.scalar(select(exists().where(models.CurrentScore.driver_ids.isnot(None)))) and \
+             not db.scalar(select(exists().where(models.CurrentDriver.segment_id.isnot(None)))):
+            refresh_current_drivers(db)
+            refresh_rollups(db)
+        elif db.scalar(select(exists().where(models.CurrentScore.segment_id.isnot(None)))) and \
+             not db.scalar(select(exists().where(models.PipelineRollup.pipeline_id.isnot(None)))):
+            refresh_rollups(db)
+    finally:
+        db.close()
@@ -0,0 +1,95 @@
+from __future__ import annotations
+from typing import Any,Dict,List,Optional,Sequence,Tuple
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.core.config import LRS_TOLERANCE_KM
+from app.db.models import Segment
+
+class SegmentIndex:
+    """Linear-referencing index of one pipeline's segments: arrays sorted by start_km.
+
+    ``reach`` is the running maximum of end_km, which is non-decreasing even when segments
+    overlap, so every lookup is a binary search plus the matches themselves. Chainages on a
+    shared boundary belong to the segment that starts there.
+    """
+    def __init__(self,ids:Sequence[str],starts:Sequence[float],ends:Sequence[float]):
+        starts=np.asarray(starts,dtype=float); ends=np.asarray(ends,dtype=float)
+        order=np.lexsort((ends,starts))
+        self.ids=np.asarray(ids,dtype=object)[order]
+        self.starts=starts[order]
+        self.ends=ends[order]
+        self.reach=np.maximum.accumulate(self.ends) if len(order) else self.ends
+        # holder[k]: position of the segment that reaches reach[k]
+        self.holder=np.maximum.accumulate(np.where(self.ends>=self.reach,np.arange(len(order)),0)) if len(order) else order
+
+    @classmethod
+    def load(cls,db:Session,pipeline_id:str)->"SegmentIndex":
+        rows=db.execute(select(Segment.id,Segment.start_km,Segment.end_km)
+                        .where(Segment.pipeline_id==pipeline_id).order_by(Segment.start_km,Segment.id)).all()
+        return cls([r[0] for r in rows],[r[1] for r in rows],[r[2] for r in rows])
+
+    def __len__(self)->int:
+        return len(self.ids)
+
+    def intersecting(self,km_min:float,km_max:float)->np.ndarray:
+        """Positions of segments overlapping [km_min, km_max], in start order."""
+        lo=int(np.searchsorted(self.reach,km_min,side="left"))
+        hi=int(np.searchsorted(self.starts,km_max,side="right"))
+        if hi<=lo:
+            return np.empty(0,dtype=np.intp)
+        pos=np.arange(lo,hi)
+        return pos[self.ends[lo:hi]>=km_min]
+
+    def locate(self,km:Sequence[float])->Tuple[np.ndarray,np.ndarray]:
+        """Nearest segment position for each chainage and the distance to it (0 inside a segment).
+
+        Vectorized: one searchsorted over all chainages. -1 only when the index is empty. On a shared
+        boundary the later segment wins; where segments overlap, the one reaching furthest.
+        """
+        km=np.asarray(km,dtype=float)
+        n=len(self.ids)
+        if n==0:
+            return np.full(km.shape,-1,dtype=np.intp),np.full(km.shape,np.inf)
+        j=np.searchsorted(self.starts,km,side="right")-1
+        before=np.clip(j,0,n-1)
+        after=np.clip(j+1,0,n-1)
+        # Of the segments starting at or before km, the one reaching furthest is the nearest (or contains km).
+        d_before=np.where(j>=0,np.maximum(km-self.reach[before],0.0),np.inf)
+        d_after=np.where(j+1<n,self.starts[after]-km,np.inf)
+        pos=np.where(d_before<=d_after,self.holder[before],after)
+        return pos,np.minimum(d_before,d_after)
+
+    def problems(self,tol:float=LRS_TOLERANCE_KM)->List[Dict[str,Any]]:
+        """Gaps and overlaps between consecutive segments, plus segments with no positive length."""
+        out:List[Dict[str,Any]]=[]
+        for k in np.flatnonzero(self.ends-self.starts<=0):
+            out.append({"kind":"empty","segment_id":self.ids[k],"start_km":float(self.starts[k]),"end_km":float(self.ends[k])})
+        if len(self.ids)<2:
+            return out
+        # Each gap/overlap is measured against the segment reaching furthest so far.
+        holder=self.holder
+        delta=self.starts[1:]-self.reach[:-1]
+        for k in np.flatnonzero(np.abs(delta)>tol):
+            b,reach=k+1,float(self.reach[k])
+            if delta[k]>0:
+                lo,hi=reach,float(self.starts[b])
+            else:
+                lo,hi=float(self.starts[b]),min(reach,float(self.ends[b]))
+            out.append({"kind":"gap" if delta[k]>0 else "overlap","segment_id":self.ids[b],"other_id":self.ids[holder[k]],
+                        "start_km":lo,"end_km":hi,"length_km":round(hi-lo,6)})
+        return out
+
+def overlapping(db:Session,pipeline_id:str,start_km:float,end_km:float,exclude:Optional[str]=None,
+                tol:float=LRS_TOLERANCE_KM)->List[str]:
+    """Ids of stored segments sharing more than ``tol`` km with [start_km, end_km] (touching ends is fine)."""
+    q=select(Segment.id).where(Segment.pipeline_id==pipeline_id,Segment.start_km<end_km-tol,Segment.end_km>start_km+tol)
+    if exclude is not None:
+        q=q.where(Segment.id!=exclude)
+    return list(db.scalars(q.order_by(Segment.start_km)))
+
+def describe(pipeline_id:str,p:Dict[str,Any])->str:
+    if p["kind"]=="empty":
+        return f"pipeline {pipeline_id}: segment {p['segment_id']} has no length ({p['start_km']}–{p['end_km']} km)"
+    return (f"pipeline {pipeline_id}: {p['kind']} of {p['length_km']:.3f} km between {p['other_id']} and "
+            f"{p['segment_id']} at {p['start_km']:.3f}–{p['end_km']:.3f} km")
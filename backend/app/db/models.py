@@ -1,7 +1,8 @@
-from sqlalchemy import Column,String,Float,Integer,DateTime,ForeignKey,Boolean,Text
+from sqlalchemy import Column,String,Float,Integer,DateTime,ForeignKey,Boolean,Text,Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.db.database import Base
+from app.scoring.engine import MODEL_VERSION
 
 class Pipeline(Base):
     __tablename__="pipelines"
@@ -11,6 +12,7 @@ class Pipeline(Base):
     region=Column(String)
     created_at=Column(DateTime(timezone=True),server_default=func.now())
     segments=relationship("Segment",back_populates="pipeline",cascade="all, delete-orphan")
+    __table_args__=(Index("ix_pipelines_region","region"),)
 
 class Segment(Base):
     __tablename__="segments"
@@ -21,10 +23,17 @@ class Segment(Base):
     pipeline=relationship("Pipeline",back_populates="segments")
     inputs=relationship("SegmentInputs",back_populates="segment",uselist=False,cascade="all, delete-orphan")
     scores=relationship("HRIScore",back_populates="segment",cascade="all, delete-orphan")
+    current=relationship("CurrentScore",uselist=False,cascade="all, delete-orphan")
+    # Serves the pipeline filter and the (pipeline_id, start_km, id) keyset order of list endpoints;
+    # the end_km index bounds the other side of km-range and overlap queries.
+    __table_args__=(Index("ix_segments_pipeline_position","pipeline_id","start_km","id"),
+                    Index("ix_segments_pipeline_end","pipeline_id","end_km"))
 
 class SegmentInputs(Base):
     __tablename__="segment_inputs"
     segment_id=Column(String,ForeignKey("segments.id"),primary_key=True)
+    # Bumped only when an input value actually changes; scores record the revision they used.
+    revision=Column(Integer,nullable=False,default=0,server_default="0")
 
     # Metallurgy
     api_grade=Column(String)
@@ -79,11 +88,20 @@ class SegmentInputs(Base):
 
     segment=relationship("Segment",back_populates="inputs")
 
+class ScadaTag(Base):
+    """A SCADA pressure tag and the km range of one pipeline its readings represent."""
+    __tablename__="scada_tags"
+    tag=Column(String,primary_key=True)
+    pipeline_id=Column(String,ForeignKey("pipelines.id"),nullable=False)
+    start_km=Column(Float,nullable=False)
+    end_km=Column(Float,nullable=False)
+    __table_args__=(Index("ix_scada_tags_pipeline","pipeline_id"),)
+
 class HRIScore(Base):
     __tablename__="hri_scores"
     id=Column(Integer,primary_key=True,autoincrement=True)
     segment_id=Column(String,ForeignKey("segments.id"),nullable=False)
-    model_version=Column(String,nullable=False,default="rules-v2-gated")
+    model_version=Column(String,nullable=False,default=MODEL_VERSION)
     hri=Column(Float,nullable=False)
     readiness_class=Column(String,nullable=False)
     m=Column(Float,nullable=False)
@@ -93,6 +111,138 @@ class HRIScore(Base):
     e=Column(Float,nullable=False)
     q=Column(Float,nullable=False)
     o=Column(Float,nullable=False)
+    # Legacy: formatted driver strings. New rows store driver_ids (comma-separated Driver ids) instead.
     drivers_json=Column(Text)
+    driver_ids=Column(Text)
+    # Values quoted by triggered gates, JSON {rule: [values]}; their drivers rows hold only the gate label.
+    gate_values=Column(Text)
     created_at=Column(DateTime(timezone=True),server_default=func.now())
     segment=relationship("Segment",back_populates="scores")
+    __table_args__=(Index("ix_hri_scores_segment_latest","segment_id","created_at","id"),)
+
+class CurrentScore(Base):
+    """Latest HRIScore per segment, maintained on write so dashboards never scan history."""
+    __tablename__="current_scores"
+    segment_id=Column(String,ForeignKey("segments.id"),primary_key=True)
+    score_id=Column(Integer,ForeignKey("hri_scores.id"),nullable=False)
+    cache_key=Column(String)
+    inputs_revision=Column(Integer)
+    ruleset_version=Column(String)
+    model_version=Column(String,nullable=False)
+    hri=Column(Float,nullable=False)
+    readiness_class=Column(String,nullable=False)
+    m=Column(Float,nullable=False)
+    d=Column(Float,nullable=False)
+    i=Column(Float,nullable=False)
+    c=Column(Float,nullable=False)
+    e=Column(Float,nullable=False)
+    q=Column(Float,nullable=False)
+    o=Column(Float,nullable=False)
+    driver_ids=Column(Text)
+    gate_values=Column(Text)
+    __table_args__=(Index("ix_current_scores_class_hri","readiness_class","hri"),
+                    Index("ix_current_scores_hri","hri"))
+
+class Driver(Base):
+    """Interned driver: rendered text plus the structured code (pillar, rule id, band, penalty) it came from.
+
+    Score rows reference drivers by id. Rules are NULL for legacy text the active ruleset no longer labels.
+    """
+    __tablename__="drivers"
+    id=Column(Integer,primary_key=True,autoincrement=True)
+    text=Column(Text,nullable=False)
+    pillar=Column(String)
+    rule=Column(String)
+    band=Column(Integer)
+    penalty=Column(Float)
+    __table_args__=(Index("ux_drivers_text","text",unique=True),
+                    Index("ix_drivers_rule","rule","band"))
+
+class CurrentDriver(Base):
+    """Drivers of each segment's current score, one row per (segment, driver), for SQL aggregation."""
+    __tablename__="current_drivers"
+    segment_id=Column(String,ForeignKey("current_scores.segment_id"),primary_key=True)
+    driver_id=Column(Integer,ForeignKey("drivers.id"),primary_key=True)
+    __table_args__=(Index("ix_current_drivers_driver","driver_id"),)
+
+class PipelineRollup(Base):
+    """Running sums over each pipeline's current scores, adjusted on every current score write.
+
+    Sums are km-weighted, so region/operator/portfolio rollups are plain sums of these rows.
+    """
+    __tablename__="pipeline_rollups"
+    pipeline_id=Column(String,ForeignKey("pipelines.id"),primary_key=True)
+    segments=Column(Integer,nullable=False,default=0)
+    km=Column(Float,nullable=False,default=0.0)
+    hri_km=Column(Float,nullable=False,default=0.0)
+    km_not_ready=Column(Float,nullable=False,default=0.0)
+    km_conditional=Column(Float,nullable=False,default=0.0)
+    km_controls=Column(Float,nullable=False,default=0.0)
+    km_fully=Column(Float,nullable=False,default=0.0)
+    m_km=Column(Float,nullable=False,default=0.0)
+    d_km=Column(Float,nullable=False,default=0.0)
+    i_km=Column(Float,nullable=False,default=0.0)
+    c_km=Column(Float,nullable=False,default=0.0)
+    e_km=Column(Float,nullable=False,default=0.0)
+    q_km=Column(Float,nullable=False,default=0.0)
+    o_km=Column(Float,nullable=False,default=0.0)
+    gate_ki_kth=Column(Integer,nullable=False,default=0)
+    gate_integrity=Column(Integer,nullable=False,default=0)
+    gate_data_quality=Column(Integer,nullable=False,default=0)
+
+class ScoreCacheEntry(Base):
+    """Persistent content-addressed score cache (see app.scoring.cache.score_key)."""
+    __tablename__="score_cache"
+    key=Column(String,primary_key=True)
+    model_version=Column(String,nullable=False)
+    ruleset_version=Column(String,nullable=False)
+    hri=Column(Float,nullable=False)
+    readiness_class=Column(String,nullable=False)
+    m=Column(Float,nullable=False)
+    d=Column(Float,nullable=False)
+    i=Column(Float,nullable=False)
+    c=Column(Float,nullable=False)
+    e=Column(Float,nullable=False)
+    q=Column(Float,nullable=False)
+    o=Column(Float,nullable=False)
+    drivers_json=Column(Text)
+    created_at=Column(DateTime(timezone=True),server_default=func.now())
+
+class Job(Base):
+    """Background job (rescore, uncertainty...) split into JobChunk rows that worker processes claim."""
+    __tablename__="jobs"
+    id=Column(String,primary_key=True)
+    kind=Column(String,nullable=False)
+    params_json=Column(Text,nullable=False,default="{}")
+    status=Column(String,nullable=False,default="queued")
+    segments_total=Column(Integer,nullable=False,default=0)
+    segments_done=Column(Integer,nullable=False,default=0)
+    chunks_total=Column(Integer,nullable=False,default=0)
+    chunks_done=Column(Integer,nullable=False,default=0)
+    cancel_requested=Column(Boolean,nullable=False,default=False)
+    error=Column(Text)
+    created_at=Column(DateTime(timezone=True),server_default=func.now())
+    started_at=Column(DateTime(timezone=True))
+    finished_at=Column(DateTime(timezone=True))
+    chunks=relationship("JobChunk",cascade="all, delete-orphan")
+    __table_args__=(Index("ix_jobs_created","created_at"),)
+
+class JobChunk(Base):
+    """A segment id window [first_id, stop_id) of a job; stop_id None means open-ended."""
+    __tablename__="job_chunks"
+    id=Column(Integer,primary_key=True,autoincrement=True)
+    job_id=Column(String,ForeignKey("jobs.id"),nullable=False)
+    seq=Column(Integer,nullable=False)
+    first_id=Column(String,nullable=False)
+    stop_id=Column(String)
+    segments=Column(Integer,nullable=False)
+    status=Column(String,nullable=False,default="pending")
+    attempts=Column(Integer,nullable=False,default=0)
+    claimed_by=Column(String)
+    claimed_at=Column(DateTime(timezone=True))
+    finished_at=Column(DateTime(timezone=True))
+    result_json=Column(Text)
+    error=Column(Text)
+    # Claims scan pending chunks in id (FIFO) order; results are read back per job in seq order.
+    __table_args__=(Index("ix_job_chunks_status","status","id"),
+                    Index("ix_job_chunks_job","job_id","seq"))
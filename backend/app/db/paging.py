@@ -0,0 +1,74 @@
+from __future__ import annotations
+from typing import Any,Dict,List,Optional,Sequence,Tuple
+import base64,json
+from fastapi import HTTPException,Request,Response
+from sqlalchemy import select,tuple_
+from app.core.config import PAGE_SIZE_DEFAULT,PAGE_SIZE_MAX
+from app.db.models import Pipeline,Segment
+
+def encode_cursor(values:Sequence[Any])->str:
+    return base64.urlsafe_b64encode(json.dumps(list(values),separators=(",",":")).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor:str,n:int)->List[Any]:
+    try:
+        vals=json.loads(base64.urlsafe_b64decode(cursor+"="*(-len(cursor)%4)))
+    except ValueError:
+        vals=None
+    if not isinstance(vals,list) or len(vals)!=n:
+        raise HTTPException(status_code=400,detail="Invalid cursor")
+    return vals
+
+def page_size(cursor:Optional[str],limit:Optional[int])->Optional[int]:
+    """Rows per page: None (every row, as before paging existed) unless the client pages with limit or cursor."""
+    if limit is None and cursor is None:
+        return None
+    return PAGE_SIZE_DEFAULT if limit is None else limit
+
+def keyset(stmt,order:Sequence,cursor:Optional[str],limit:Optional[int]):
+    """Order by the unique column tuple ``order`` (ascending), resume after ``cursor``, fetch limit+1 rows (all with limit None)."""
+    if limit is not None and not 1<=limit<=PAGE_SIZE_MAX:
+        raise HTTPException(status_code=400,detail=f"limit must be between 1 and {PAGE_SIZE_MAX}")
+    if cursor:
+        stmt=stmt.where(tuple_(*order)>tuple_(*decode_cursor(cursor,len(order))))
+    stmt=stmt.order_by(*order)
+    return stmt if limit is None else stmt.limit(limit+1)
+
+def page(rows:List[Any],limit:Optional[int],key)->Tuple[List[Any],Optional[str]]:
+    """Trim the look-ahead row; the cursor is key(last row kept) when more rows exist."""
+    if limit is None or len(rows)<=limit:
+        return rows,None
+    rows=rows[:limit]
+    return rows,encode_cursor(key(rows[-1]))
+
+def projection(fields:Optional[str],allowed:Sequence[str])->Optional[List[str]]:
+    """Parse a comma-separated ``fields`` parameter; None keeps every field."""
+    if not fields:
+        return None
+    want=[f.strip() for f in fields.split(",") if f.strip()]
+    bad=[f for f in want if f not in allowed]
+    if bad:
+        raise HTTPException(status_code=400,detail=f"Unknown fields: {', '.join(bad)} (allowed: {', '.join(allowed)})")
+    return want
+
+def respond(request:Request,response:Response,items:List[Dict[str,Any]],cursor:Optional[str],
+            fields:Optional[List[str]]=None)->List[Dict[str,Any]]:
+    """Project items and advertise the next page in X-Next-Cursor and an RFC 8288 Link header."""
+    if cursor:
+        response.headers["X-Next-Cursor"]=cursor
+        response.headers["Link"]=f'<{request.url.include_query_params(cursor=cursor)}>; rel="next"'
+    if fields:
+        items=[{f:it[f] for f in fields} for it in items]
+    return items
+
+def segment_filters(stmt,pipeline_id:Optional[str]=None,region:Optional[str]=None,
+                    km_min:Optional[float]=None,km_max:Optional[float]=None):
+    """Segments on a pipeline/region whose [start_km, end_km] overlaps [km_min, km_max]."""
+    if pipeline_id:
+        stmt=stmt.where(Segment.pipeline_id==pipeline_id)
+    if region:
+        stmt=stmt.where(Segment.pipeline_id.in_(select(Pipeline.id).where(Pipeline.region==region)))
+    if km_min is not None:
+        stmt=stmt.where(Segment.end_km>=km_min)
+    if km_max is not None:
+        stmt=stmt.where(Segment.start_km<=km_max)
+    return stmt
@@ -0,0 +1,34 @@
+from typing import Any,Dict,List,Optional,Sequence
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+def upsert(db:Session,model,rows:List[Dict[str,Any]],keys:Sequence[str],revision:Optional[str]=None,
+           accumulate:bool=False):
+    """Multi-row INSERT ... ON CONFLICT DO UPDATE on Postgres and SQLite.
+
+    With ``revision`` naming an integer column, conflicting rows are only
+    updated when some value actually differs, and that column is bumped.
+    With ``accumulate`` conflicting rows add the new values to the stored ones.
+    """
+    if not rows:
+        return
+    if db.get_bind().dialect.name=="postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    # Core insert on the Table: the ORM bulk path would split rows by NULL pattern and recompile per group.
+    table=model.__table__
+    stmt=insert(table)
+    cols=[k for k in rows[0] if k not in keys]
+    if cols and revision:
+        stmt=stmt.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={**{k:stmt.excluded[k] for k in cols},revision:table.c[revision]+1},
+            where=or_(*[table.c[k].is_distinct_from(stmt.excluded[k]) for k in cols]))
+    elif cols and accumulate:
+        stmt=stmt.on_conflict_do_update(index_elements=list(keys),set_={k:table.c[k]+stmt.excluded[k] for k in cols})
+    elif cols:
+        stmt=stmt.on_conflict_do_update(index_elements=list(keys),set_={k:stmt.excluded[k] for k in cols})
+    else:
+        stmt=stmt.on_conflict_do_nothing(index_elements=list(keys))
+    db.execute(stmt,rows)
@@ -0,0 +1,104 @@
+from __future__ import annotations
+from datetime import datetime
+from typing import Any,Dict,Iterator,List,Optional
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+from sqlalchemy import select,and_
+from sqlalchemy.orm import Session
+from app.core.config import CURRENT_SCORES,EXPORT_CHUNK_SIZE
+from app.db.models import Pipeline,Segment,HRIScore,CurrentScore
+from app.db.paging import segment_filters
+from app.scoring.history import load_drivers
+from app.scoring.latest import ranked_scores
+
+FORMATS={
+    "parquet":("application/vnd.apache.parquet","parquet"),
+    "arrow":("application/vnd.apache.arrow.stream","arrows"),
+    "csv":("text/csv","csv"),
+}
+
+SCHEMA=pa.schema([
+    ("pipeline_id",pa.string()),("pipeline_name",pa.string()),("operator",pa.string()),("region",pa.string()),
+    ("segment_id",pa.string()),("start_km",pa.float64()),("end_km",pa.float64()),
+    ("score_id",pa.int64()),("created_at",pa.timestamp("us",tz="UTC")),("model_version",pa.string()),
+    ("hri",pa.float64()),("readiness_class",pa.string()),
+    ("m",pa.float64()),("d",pa.float64()),("i",pa.float64()),("c",pa.float64()),
+    ("e",pa.float64()),("q",pa.float64()),("o",pa.float64()),
+    ("drivers",pa.list_(pa.string())),
+])
+COLUMNS=SCHEMA.names
+# CSV has no list type: drivers are written as one " | "-joined cell.
+CSV_SCHEMA=SCHEMA.set(SCHEMA.get_field_index("drivers"),pa.field("drivers",pa.string()))
+
+def _columns(h):
+    return [Pipeline.id,Pipeline.name,Pipeline.operator,Pipeline.region,
+            Segment.id,Segment.start_km,Segment.end_km,
+            h.id,h.created_at,h.model_version,h.hri,h.readiness_class,h.m,h.d,h.i,h.c,h.e,h.q,h.o,h.driver_ids,h.drivers_json,h.gate_values]
+
+def export_stmt(history:bool=False,pipeline_id:Optional[str]=None,region:Optional[str]=None,
+                since:Optional[datetime]=None,until:Optional[datetime]=None):
+    """Scored segments joined to pipeline metadata: every HRIScore row with ``history``, else the latest per segment."""
+    h=HRIScore.__table__.c
+    stmt=select(*_columns(h)).select_from(Segment).join(Pipeline,Pipeline.id==Segment.pipeline_id)
+    if history:
+        stmt=stmt.join(HRIScore.__table__,h.segment_id==Segment.id)
+        if since is not None:
+            stmt=stmt.where(h.created_at>=since)
+        if until is not None:
+            stmt=stmt.where(h.created_at<until)
+        order=(Segment.pipeline_id,Segment.start_km,Segment.id,h.created_at,h.id)
+    elif CURRENT_SCORES:
+        stmt=stmt.join(CurrentScore,CurrentScore.segment_id==Segment.id).join(HRIScore.__table__,h.id==CurrentScore.score_id)
+        order=(Segment.pipeline_id,Segment.start_km,Segment.id)
+    else:
+        r=ranked_scores(pipeline_id)
+        stmt=stmt.join(r,and_(r.c.segment_id==Segment.id,r.c.rn==1)).join(HRIScore.__table__,h.id==r.c.id)
+        order=(Segment.pipeline_id,Segment.start_km,Segment.id)
+    return segment_filters(stmt,pipeline_id,region).order_by(*order)
+
+def _batch(db:Session,rows:List[Any],csv:bool)->pa.RecordBatch:
+    cols:Dict[str,List[Any]]={k:[] for k in COLUMNS}
+    for r in rows:
+        for k,v in zip(COLUMNS[:-1],r):
+            cols[k].append(v)
+    for drivers in load_drivers(db,[tuple(r[-3:]) for r in rows]):
+        cols["drivers"].append(" | ".join(drivers) if csv else drivers)
+    return pa.RecordBatch.from_pydict(cols,schema=CSV_SCHEMA if csv else SCHEMA)
+
+class _Sink:
+    """Write-only file object whose buffered bytes are drained after each record batch."""
+    def __init__(self):
+        self.parts:List[bytes]=[]
+        self.closed=False
+    def write(self,b)->int:
+        self.parts.append(bytes(b)); return len(b)
+    def flush(self):
+        pass
+    def close(self):
+        self.closed=True
+    def drain(self)->bytes:
+        out=b"".join(self.parts); self.parts.clear(); return out
+
+def _writer(fmt:str,sink:_Sink):
+    if fmt=="parquet":
+        return pq.ParquetWriter(sink,SCHEMA,compression="zstd")
+    if fmt=="arrow":
+        return pa.ipc.new_stream(sink,SCHEMA)
+    return pacsv.CSVWriter(sink,CSV_SCHEMA)
+
+def stream_export(db:Session,stmt,fmt:str,chunk_size:int=EXPORT_CHUNK_SIZE)->Iterator[bytes]:
+    """Encode rows chunk by chunk (server-side cursor on Postgres), yielding bytes as each batch is written.
+
+    Memory is bounded by one chunk plus the Parquet footer; Parquet gets one row group per chunk.
+    """
+    sink=_Sink()
+    writer=_writer(fmt,sink)
+    try:
+        result=db.execute(stmt,execution_options={"stream_results":True,"yield_per":chunk_size})
+        for rows in result.partitions():
+            writer.write_batch(_batch(db,rows,fmt=="csv"))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
@@ -0,0 +1,126 @@
+from __future__ import annotations
+from typing import Any,BinaryIO,Dict,List,Optional,Set
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.core.config import INGEST_CHUNK_SIZE,BULK_MAX_ERRORS
+from app.db.lrs import SegmentIndex,describe
+from app.db.models import Pipeline,Segment,SegmentInputs
+from app.db.upsert import upsert
+from app.ingest.readers import Rows,iter_rows
+from app.schemas import SegmentInputsUpsert
+from app.scoring.rollups import tracked
+
+PIPELINE_COLUMNS=["pipeline_id","pipeline_name","operator","region"]
+SEGMENT_COLUMNS=["segment_id","start_km","end_km"]
+INPUT_COLUMNS=list(SegmentInputsUpsert.model_fields)
+TEMPLATE_COLUMNS=PIPELINE_COLUMNS+SEGMENT_COLUMNS+INPUT_COLUMNS
+
+class BulkLoader:
+    """Validates and upserts bulk rows chunk by chunk, keeping only counters and capped errors."""
+    def __init__(self,db:Session,max_errors:int=BULK_MAX_ERRORS):
+        self.db=db
+        self.max_errors=max_errors
+        self.result={"pipelines_created":0,"segments_created":0,"inputs_upserted":0,
+                     "rows_processed":0,"errors":[],"warnings":[]}
+        self.touched:Set[str]=set()
+
+    def error(self,row:int,msg:str):
+        errs=self.result["errors"]
+        if len(errs)<self.max_errors:
+            errs.append(f"row {row}: {msg}")
+        elif len(errs)==self.max_errors:
+            errs.append("further errors truncated")
+
+    def check_geometry(self):
+        """Report gaps and overlaps on every pipeline the load touched, once all chunks are in."""
+        warns=self.result["warnings"]
+        for pid in sorted(self.touched):
+            for p in SegmentIndex.load(self.db,pid).problems():
+                if len(warns)==self.max_errors:
+                    warns.append("further warnings truncated")
+                    return
+                warns.append(describe(pid,p))
+
+    def load(self,chunk:Rows,first_row:int):
+        pipes:Dict[str,Dict[str,Any]]={}
+        segs:Dict[str,Dict[str,Any]]={}
+        inputs:Dict[str,Dict[str,Any]]={}
+        rows:Dict[str,int]={}
+        for k,raw in enumerate(chunk):
+            row=first_row+k
+            self.result["rows_processed"]+=1
+            sid=raw.get("segment_id")
+            if not sid:
+                self.error(row,"segment_id is required"); continue
+            present={c:raw[c] for c in INPUT_COLUMNS if c in raw}
+            try:
+                inp=SegmentInputsUpsert.model_validate(present)
+                seg=_segment(raw)
+            except ValidationError as e:
+                self.error(row,"; ".join(f"{'.'.join(map(str,x['loc']))}: {x['msg']}" for x in e.errors())); continue
+            except ValueError as e:
+                self.error(row,str(e)); continue
+            pid=raw.get("pipeline_id")
+            if pid and pid not in pipes:
+                pipes[pid]={"id":pid,"name":raw.get("pipeline_name") or pid,
+                            "operator":raw.get("operator"),"region":raw.get("region")}
+            if seg is not None:
+                segs[sid]={"id":sid,"pipeline_id":pid,**seg}
+                self.touched.add(pid)
+            if present:
+                inputs[sid]={"segment_id":sid,**inp.model_dump(include=set(present))}
+            rows[sid]=row
+        self._write(pipes,segs,inputs,rows)
+
+    def _write(self,pipes,segs,inputs,rows:Dict[str,int]):
+        db=self.db
+        if pipes:
+            have=set(db.scalars(select(Pipeline.id).where(Pipeline.id.in_(list(pipes)))))
+            new=[p for k,p in pipes.items() if k not in have]
+            upsert(db,Pipeline,new,["id"])
+            self.result["pipelines_created"]+=len(new)
+        wanted=set(segs)|set(inputs)
+        have=set(db.scalars(select(Segment.id).where(Segment.id.in_(list(wanted))))) if wanted else set()
+        if segs:
+            # Moving or resizing a scored segment changes its pipeline's km-weighted rollup.
+            with tracked(db,[k for k in segs if k in have]):
+                upsert(db,Segment,list(segs.values()),["id"])
+            self.result["segments_created"]+=sum(1 for k in segs if k not in have)
+        orphans=[k for k in inputs if k not in have and k not in segs]
+        for k in orphans:
+            self.error(rows[k],f"segment {k} not found and no pipeline_id/start_km/end_km given")
+            inputs.pop(k)
+        # Group by column set so each multi-row upsert has a uniform shape.
+        shapes:Dict[tuple,List[Dict[str,Any]]]={}
+        for r in inputs.values():
+            shapes.setdefault(tuple(r),[]).append(r)
+        for batch in shapes.values():
+            upsert(db,SegmentInputs,batch,["segment_id"],revision="revision")
+        self.result["inputs_upserted"]+=len(inputs)
+        db.commit()
+
+def _segment(raw:Dict[str,Any])->Optional[Dict[str,float]]:
+    """Segment geometry when the row carries pipeline_id, start_km and end_km, else None."""
+    geo=[raw.get("pipeline_id"),raw.get("start_km"),raw.get("end_km")]
+    if all(v is None or v=="" for v in geo):
+        return None
+    if any(v is None or v=="" for v in geo):
+        raise ValueError("pipeline_id, start_km and end_km must be given together")
+    try:
+        start,end=float(geo[1]),float(geo[2])
+    except (TypeError,ValueError):
+        raise ValueError("start_km/end_km must be numbers")
+    if end<=start:
+        raise ValueError("end_km must be greater than start_km")
+    return {"start_km":start,"end_km":end}
+
+def bulk_upsert(db:Session,f:BinaryIO,fmt:str,chunk_size:int=INGEST_CHUNK_SIZE)->Dict[str,Any]:
+    """Stream a CSV/Parquet file into pipelines, segments and segment_inputs."""
+    loader=BulkLoader(db)
+    first=1
+    for chunk in iter_rows(f,fmt,chunk_size):
+        loader.load(chunk,first)
+        first+=len(chunk)
+    loader.check_geometry()
+    return loader.result
@@ -0,0 +1,152 @@
+from __future__ import annotations
+from datetime import datetime,timezone
+from typing import Any,BinaryIO,Dict,List,Optional
+import numpy as np
+import pandas as pd
+from sqlalchemy.orm import Session
+from app.core.config import CP_CHUNK_SIZE,CP_MAX_DISTANCE_KM,BULK_MAX_ERRORS
+from app.db.lrs import SegmentIndex
+from app.db.models import SegmentInputs
+from app.db.upsert import upsert
+from app.ingest.readers import NO_TIME,epoch_ns,iter_frames,numbers
+from app.scoring.rules import active
+
+CP_COLUMNS=["pipeline_id","chainage_km","potential_v","timestamp"]
+# Accepted in place of potential_v.
+ALT_COLUMNS=["potential_mv"]
+DAYS_PER_MONTH=365.25/12
+UPSERT_BATCH=5000
+
+class _Run:
+    """Per-segment running sums of one pipeline's readings, indexed like its SegmentIndex."""
+    def __init__(self,ix:SegmentIndex):
+        n=len(ix)
+        self.ix=ix
+        self.total=np.zeros(n)
+        self.count=np.zeros(n,dtype=np.int64)
+        self.over=np.zeros(n,dtype=np.int64)
+        self.latest=np.full(n,NO_TIME,dtype=np.int64)
+
+    def add(self,pos:np.ndarray,pot:np.ndarray,over:np.ndarray,t:np.ndarray):
+        n=len(self.count)
+        self.total+=np.bincount(pos,weights=pot,minlength=n)
+        self.count+=np.bincount(pos,minlength=n)
+        self.over+=np.bincount(pos[over],minlength=n)
+        np.maximum.at(self.latest,pos,t)
+
+    def rows(self,as_of:int)->List[Dict[str,Any]]:
+        """SegmentInputs updates for the segments that received readings; survey age needs a dated reading."""
+        sel=np.flatnonzero(self.count)
+        avg=self.total[sel]/self.count[sel]
+        pct=100.0*self.over[sel]/self.count[sel]
+        latest=self.latest[sel]
+        age=np.maximum(as_of-np.where(latest==NO_TIME,as_of,latest),0)/(86400e9*DAYS_PER_MONTH)
+        out=[]
+        for sid,a,p,t,m in zip(self.ix.ids[sel].tolist(),avg,pct,latest,age):
+            row={"segment_id":sid,"cp_potential_avg_v":round(float(a),4),"cp_overprotect_pct":round(float(p),3)}
+            if t!=NO_TIME:
+                row["cp_survey_age_months"]=round(float(m),2)
+            out.append(row)
+        return out
+
+class CpLoader:
+    """Streams CIPS / remote monitoring unit potentials into per-segment CP aggregates; memory is bounded by segment count."""
+    def __init__(self,db:Session,max_distance_km:float=CP_MAX_DISTANCE_KM,survey_date:Optional[datetime]=None,
+                 as_of:Optional[datetime]=None,max_errors:int=BULK_MAX_ERRORS):
+        self.db=db
+        self.max_distance_km=max_distance_km
+        self.max_errors=max_errors
+        # Readings at or below the ruleset's screening potential count as overprotected.
+        self.threshold=active().flags["C.pot_screen"].at
+        self.survey_date=_ns(survey_date) if survey_date else NO_TIME
+        self.as_of=_ns(as_of or datetime.now(timezone.utc))
+        self.runs:Dict[str,Optional[_Run]]={}
+        self.result={"readings_read":0,"readings_assigned":0,"readings_unmatched":0,"readings_overprotected":0,
+                     "overprotect_threshold_v":self.threshold,"pipelines":0,"segments_updated":0,"errors":[]}
+
+    def error(self,row:int,msg:str):
+        errs=self.result["errors"]
+        if len(errs)<self.max_errors:
+            errs.append(f"row {row}: {msg}")
+        elif len(errs)==self.max_errors:
+            errs.append("further errors truncated")
+
+    def _run(self,pipeline_id:str)->Optional[_Run]:
+        if pipeline_id not in self.runs:
+            ix=SegmentIndex.load(self.db,pipeline_id)
+            self.runs[pipeline_id]=_Run(ix) if len(ix) else None
+        return self.runs[pipeline_id]
+
+    def load(self,df:pd.DataFrame,first_row:int):
+        n=len(df)
+        self.result["readings_read"]+=n
+        pid=df["pipeline_id"] if "pipeline_id" in df else pd.Series([None]*n,index=df.index)
+        km=numbers(df,"chainage_km")
+        pot=numbers(df,"potential_v") if "potential_v" in df else numbers(df,"potential_mv")/1000.0
+        t=epoch_ns(df["timestamp"]) if "timestamp" in df else np.full(n,NO_TIME,dtype=np.int64)
+        # Readings without a date of their own take the survey date, if one was given.
+        t=np.where(t==NO_TIME,self.survey_date,t)
+        bad=pid.isna().to_numpy()|np.isnan(km)|np.isnan(pot)
+        for k in np.flatnonzero(bad)[:self.max_errors+1]:
+            self.error(first_row+int(k),"pipeline_id, a numeric chainage_km and potential_v (or potential_mv) are required")
+        self.result["readings_unmatched"]+=int(bad.sum())
+        good=np.flatnonzero(~bad)
+        if not len(good):
+            return
+        over=pot<=self.threshold
+        groups=pd.Series(good).groupby(pid.to_numpy()[good].astype(str)).indices
+        for p,where in groups.items():
+            rows=good[where]
+            run=self._run(p)
+            if run is None:
+                self.result["readings_unmatched"]+=len(rows)
+                continue
+            pos,dist=run.ix.locate(km[rows])
+            ok=dist<=self.max_distance_km
+            self.result["readings_unmatched"]+=int((~ok).sum())
+            rows,pos=rows[ok],pos[ok]
+            if not len(rows):
+                continue
+            self.result["readings_assigned"]+=len(rows)
+            self.result["readings_overprotected"]+=int(over[rows].sum())
+            run.add(pos,pot[rows],over[rows],t[rows])
+
+    def finish(self)->List[str]:
+        """Upsert the aggregates in batches; inputs whose values change get a new revision, which makes them stale for rescoring."""
+        updated=[]
+        for p,run in sorted(self.runs.items()):
+            rows=run.rows(self.as_of) if run is not None else []
+            # Rows with and without a survey age go in separate statements (one column set per statement).
+            for part in ([r for r in rows if "cp_survey_age_months" in r],[r for r in rows if "cp_survey_age_months" not in r]):
+                for s in range(0,len(part),UPSERT_BATCH):
+                    upsert(self.db,SegmentInputs,part[s:s+UPSERT_BATCH],["segment_id"],revision="revision")
+            self.db.commit()
+            if rows:
+                updated.append(p)
+                self.result["segments_updated"]+=len(rows)
+        self.result["pipelines"]=len(updated)
+        return updated
+
+def _ns(d:datetime)->int:
+    if d.tzinfo is None:
+        d=d.replace(tzinfo=timezone.utc)
+    return int(pd.Timestamp(d).value)
+
+def ingest_cp(db:Session,f:BinaryIO,fmt:str,max_distance_km:float=CP_MAX_DISTANCE_KM,survey_date:Optional[datetime]=None,
+              as_of:Optional[datetime]=None,chunk_size:int=CP_CHUNK_SIZE)->Dict[str,Any]:
+    """Aggregate CP potential readings (CSV/Parquet) into cp_potential_avg_v, cp_overprotect_pct and
+    cp_survey_age_months of the segments they fall on, in one streaming pass.
+
+    Each reading goes to the segment containing its chainage (or the nearest one within
+    ``max_distance_km``), so a CIPS walk and a remote monitoring unit's time series load the same way.
+    cp_overprotect_pct is the share of readings at or below the C.pot_screen potential of the active
+    ruleset; cp_survey_age_months runs from the segment's latest reading to ``as_of`` (default now).
+    Segments without readings are left alone.
+    """
+    loader=CpLoader(db,max_distance_km,survey_date,as_of)
+    first=1
+    for df in iter_frames(f,fmt,chunk_size,usecols=CP_COLUMNS+ALT_COLUMNS,text=("pipeline_id",)):
+        loader.load(df,first)
+        first+=len(df)
+    loader.result["updated_pipelines"]=loader.finish()
+    return loader.result
@@ -0,0 +1,145 @@
+from __future__ import annotations
+from typing import Any,BinaryIO,Dict,List,Optional,Tuple
+import numpy as np
+import pandas as pd
+from sqlalchemy.orm import Session
+from app.core.config import ILI_CHUNK_SIZE,ILI_MAX_DISTANCE_KM,BULK_MAX_ERRORS
+from app.db.lrs import SegmentIndex
+from app.db.models import SegmentInputs
+from app.db.upsert import upsert
+from app.ingest.readers import iter_frames,numbers
+
+ILI_COLUMNS=["pipeline_id","chainage_km","feature_type","depth_pct","length_mm"]
+# Matched against the lower-cased feature_type.
+CRACK_PATTERN=r"crack|scc|lamination"
+METAL_LOSS_PATTERN=r"metal|corros|pitting|loss|gouge"
+UPSERT_BATCH=5000
+
+def _kinds(df:pd.DataFrame)->Tuple[np.ndarray,np.ndarray]:
+    """(crack, metal_loss) masks, classifying each distinct feature_type once."""
+    if "feature_type" not in df:
+        return np.zeros(len(df),dtype=bool),np.zeros(len(df),dtype=bool)
+    codes,uniq=pd.factorize(df["feature_type"])
+    kind=pd.Series(uniq,dtype=object).fillna("").astype(str).str.lower()
+    crack=kind.str.contains(CRACK_PATTERN,regex=True).to_numpy()
+    loss=kind.str.contains(METAL_LOSS_PATTERN,regex=True).to_numpy()&~crack
+    # factorize gives NaN the code -1, which picks the appended False
+    return np.append(crack,False)[codes],np.append(loss,False)[codes]
+
+class _Run:
+    """Per-segment running aggregates of one pipeline, indexed like its SegmentIndex."""
+    def __init__(self,ix:SegmentIndex):
+        n=len(ix)
+        self.ix=ix
+        self.metal_loss=np.zeros(n)
+        self.cracks=np.zeros(n,dtype=np.int64)
+        self.crack_len=np.zeros(n)
+        self.lo=np.inf
+        self.hi=-np.inf
+
+    def add(self,pos:np.ndarray,km:np.ndarray,crack:np.ndarray,loss:np.ndarray,depth:np.ndarray,length:np.ndarray):
+        self.lo=min(self.lo,float(km.min()))
+        self.hi=max(self.hi,float(km.max()))
+        # fmax ignores NaN depths/lengths, so a feature without a measurement still counts as a crack.
+        np.fmax.at(self.metal_loss,pos[loss],depth[loss])
+        np.add.at(self.cracks,pos[crack],1)
+        np.fmax.at(self.crack_len,pos[crack],length[crack])
+
+    def rows(self)->List[Dict[str,Any]]:
+        """SegmentInputs updates for every segment inside the inspected span (zeros where nothing was found)."""
+        if self.hi<self.lo:
+            return []
+        ix=self.ix
+        sel=ix.intersecting(self.lo,self.hi)
+        km=ix.ends[sel]-ix.starts[sel]
+        density=np.where(km>0,self.cracks[sel]/np.where(km>0,km,1.0),0.0)
+        return [{"segment_id":sid,"max_metal_loss_pct":round(float(ml),3),
+                 "crack_density_per_km":round(float(d),4),"max_crack_length_mm":round(float(cl),3)}
+                for sid,ml,d,cl in zip(ix.ids[sel].tolist(),self.metal_loss[sel],density,self.crack_len[sel])]
+
+class IliLoader:
+    """Streams ILI feature listings into per-segment integrity aggregates; memory is bounded by segment count."""
+    def __init__(self,db:Session,max_distance_km:float=ILI_MAX_DISTANCE_KM,max_errors:int=BULK_MAX_ERRORS):
+        self.db=db
+        self.max_distance_km=max_distance_km
+        self.max_errors=max_errors
+        self.runs:Dict[str,Optional[_Run]]={}
+        self.result={"features_read":0,"features_assigned":0,"features_unmatched":0,"cracks":0,"metal_loss":0,
+                     "pipelines":0,"segments_updated":0,"errors":[]}
+
+    def error(self,row:int,msg:str):
+        errs=self.result["errors"]
+        if len(errs)<self.max_errors:
+            errs.append(f"row {row}: {msg}")
+        elif len(errs)==self.max_errors:
+            errs.append("further errors truncated")
+
+    def _run(self,pipeline_id:str)->Optional[_Run]:
+        if pipeline_id not in self.runs:
+            ix=SegmentIndex.load(self.db,pipeline_id)
+            self.runs[pipeline_id]=_Run(ix) if len(ix) else None
+        return self.runs[pipeline_id]
+
+    def load(self,df:pd.DataFrame,first_row:int):
+        n=len(df)
+        self.result["features_read"]+=n
+        pid=df["pipeline_id"] if "pipeline_id" in df else pd.Series([None]*n,index=df.index)
+        km=numbers(df,"chainage_km")
+        bad=pid.isna().to_numpy()|np.isnan(km)
+        for k in np.flatnonzero(bad)[:self.max_errors+1]:
+            self.error(first_row+int(k),"pipeline_id and a numeric chainage_km are required")
+        self.result["features_unmatched"]+=int(bad.sum())
+        crack,loss=_kinds(df)
+        depth=numbers(df,"depth_pct")
+        length=numbers(df,"length_mm")
+        good=np.flatnonzero(~bad)
+        if not len(good):
+            return
+        groups=pd.Series(good).groupby(pid.to_numpy()[good].astype(str)).indices
+        for p,where in groups.items():
+            rows=good[where]
+            run=self._run(p)
+            if run is None:
+                self.result["features_unmatched"]+=len(rows)
+                continue
+            pos,dist=run.ix.locate(km[rows])
+            ok=dist<=self.max_distance_km
+            self.result["features_unmatched"]+=int((~ok).sum())
+            rows,pos=rows[ok],pos[ok]
+            if not len(rows):
+                continue
+            self.result["features_assigned"]+=len(rows)
+            self.result["cracks"]+=int(crack[rows].sum())
+            self.result["metal_loss"]+=int(loss[rows].sum())
+            run.add(pos,km[rows],crack[rows],loss[rows],depth[rows],length[rows])
+
+    def finish(self)->List[str]:
+        """Upsert the aggregates; inputs whose values change get a new revision, which makes them stale for rescoring."""
+        updated=[]
+        for p,run in sorted(self.runs.items()):
+            rows=run.rows() if run is not None else []
+            for s in range(0,len(rows),UPSERT_BATCH):
+                upsert(self.db,SegmentInputs,rows[s:s+UPSERT_BATCH],["segment_id"],revision="revision")
+            self.db.commit()
+            if rows:
+                updated.append(p)
+                self.result["segments_updated"]+=len(rows)
+        self.result["pipelines"]=len(updated)
+        return updated
+
+def ingest_ili(db:Session,f:BinaryIO,fmt:str,max_distance_km:float=ILI_MAX_DISTANCE_KM,
+               chunk_size:int=ILI_CHUNK_SIZE)->Dict[str,Any]:
+    """Aggregate an ILI feature listing (CSV/Parquet) into max_metal_loss_pct, crack_density_per_km and
+    max_crack_length_mm of the segments it inspected, in one streaming pass.
+
+    Each feature goes to the segment containing its chainage (or the nearest one within
+    ``max_distance_km``). A pipeline's inspected span runs from its first to its last feature;
+    segments in it with no features of a kind get 0 for that aggregate, segments outside it are left alone.
+    """
+    loader=IliLoader(db,max_distance_km)
+    first=1
+    for df in iter_frames(f,fmt,chunk_size,usecols=ILI_COLUMNS,text=("pipeline_id","feature_type")):
+        loader.load(df,first)
+        first+=len(df)
+    loader.result["updated_pipelines"]=loader.finish()
+    return loader.result
@@ -0,0 +1,84 @@
+from __future__ import annotations
+from typing import Any,BinaryIO,Dict,Iterator,List,Optional
+import math
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from app.core.config import INGEST_CHUNK_SIZE
+
+Rows=List[Dict[str,Any]]
+NO_TIME=np.iinfo(np.int64).min
+
+def detect_format(filename:Optional[str],fmt:Optional[str]=None)->str:
+    fmt=(fmt or _ext(filename)).lower()
+    if fmt in ("csv","txt"):
+        return "csv"
+    if fmt in ("parquet","pq"):
+        return "parquet"
+    raise ValueError(f"Unsupported file format: {fmt or 'unknown'} (expected csv or parquet)")
+
+def _ext(filename:Optional[str])->str:
+    name=filename or ""
+    return name.rsplit(".",1)[-1] if "." in name else ""
+
+def _clean(rows:Rows)->Rows:
+    for r in rows:
+        for k,v in r.items():
+            if v is None or (isinstance(v,float) and math.isnan(v)):
+                r[k]=None
+    return rows
+
+def iter_csv(f:BinaryIO,chunk_size:int=INGEST_CHUNK_SIZE,usecols=None)->Iterator[Rows]:
+    """Yield row-dict chunks from a CSV stream; cells stay strings so pydantic does the coercion."""
+    if usecols is not None:
+        wanted=set(usecols)
+        usecols=lambda c:c in wanted
+    for df in pd.read_csv(f,chunksize=chunk_size,dtype=str,usecols=usecols):
+        yield _clean(df.to_dict("records"))
+
+def iter_parquet(f:BinaryIO,chunk_size:int=INGEST_CHUNK_SIZE,usecols=None)->Iterator[Rows]:
+    """Yield row-dict chunks from a Parquet file one record batch at a time."""
+    pf=pq.ParquetFile(f)
+    if usecols is not None:
+        usecols=[c for c in pf.schema_arrow.names if c in set(usecols)]
+    for batch in pf.iter_batches(batch_size=chunk_size,columns=usecols):
+        yield _clean(batch.to_pylist())
+
+def iter_rows(f:BinaryIO,fmt:str,chunk_size:int=INGEST_CHUNK_SIZE,usecols=None)->Iterator[Rows]:
+    if fmt=="parquet":
+        return iter_parquet(f,chunk_size,usecols)
+    return iter_csv(f,chunk_size,usecols)
+
+def iter_frames(f:BinaryIO,fmt:str,chunk_size:int=INGEST_CHUNK_SIZE,usecols=None,text=None)->Iterator[pd.DataFrame]:
+    """DataFrame chunks for columnar loaders: CSV columns in ``text`` stay strings, the rest are inferred."""
+    if fmt=="parquet":
+        pf=pq.ParquetFile(f)
+        if usecols is not None:
+            usecols=[c for c in pf.schema_arrow.names if c in set(usecols)]
+        for batch in pf.iter_batches(batch_size=chunk_size,columns=usecols):
+            yield batch.to_pandas()
+        return
+    if usecols is not None:
+        wanted=set(usecols)
+        usecols=lambda c:c in wanted
+    yield from pd.read_csv(f,chunksize=chunk_size,dtype=dict.fromkeys(text,str) if text else None,usecols=usecols)
+
+def epoch_ns(s:pd.Series)->np.ndarray:
+    """Timestamps as int64 ns since the epoch (NaT -> NO_TIME); numbers are epoch seconds."""
+    if s.dtype.kind=="M":
+        if getattr(s.dt,"tz",None) is not None:
+            s=s.dt.tz_convert("UTC").dt.tz_localize(None)
+        return s.astype("datetime64[ns]").to_numpy().view(np.int64)
+    if s.dtype.kind in "fiu":
+        v=s.to_numpy(dtype=float)*1e9
+        return np.where(np.isnan(v),NO_TIME,v).astype(np.int64)
+    t=pd.to_datetime(s,errors="coerce",utc=True,format="ISO8601")
+    return t.dt.tz_localize(None).astype("datetime64[ns]").to_numpy().view(np.int64)
+
+def numbers(df:pd.DataFrame,col:str)->np.ndarray:
+    """A column as floats; missing columns and unparseable cells become NaN."""
+    if col not in df:
+        return np.full(len(df),np.nan)
+    if df[col].dtype.kind in "fiu":
+        return df[col].to_numpy(dtype=float)
+    return pd.to_numeric(df[col],errors="coerce").to_numpy(dtype=float)
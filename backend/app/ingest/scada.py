@@ -0,0 +1,349 @@
+"""SCADA pressure ingestion: streams per-tag pressure series into the Design & Ops cycling inputs.
+
+    python -m app.ingest.scada pressures.parquet            # memory-mapped, one record batch at a time
+    python -m app.ingest.scada pressures.csv --rescore
+
+Series are long format (tag, timestamp, pressure_bar), in time order within each tag; tags may be
+interleaved. Each tag maps to a km range of one pipeline (scada_tags). Per tag, the loader keeps only
+a rainflow residue, a dp/dt histogram and a few counters, so memory is bounded by the number of tags,
+not the length of the series.
+"""
+from __future__ import annotations
+from typing import Any,BinaryIO,Dict,List,Optional,Tuple
+import argparse,json,sys
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.core.config import (SCADA_CHUNK_SIZE,SCADA_RESOLUTION_BAR,SCADA_MIN_CYCLE_BAR,SCADA_SURGE_BAR_PER_S,
+                             SCADA_SURGE_GAP_S,SCADA_MAX_GAP_S,SCADA_DPDT_BIN_BAR_PER_S,SCADA_DPDT_MAX_BAR_PER_S,
+                             SCADA_MIN_HOURS,BULK_MAX_ERRORS)
+from app.db.lrs import SegmentIndex
+from app.db.models import ScadaTag,SegmentInputs
+from app.db.upsert import upsert
+from app.ingest.readers import NO_TIME,epoch_ns,iter_frames
+
+SCADA_COLUMNS=["tag","timestamp","pressure_bar"]
+TAG_COLUMNS=["tag","pipeline_id","start_km","end_km"]
+METRICS=("cycles_per_day","cycle_range_bar","surge_events_per_year","dpdt_p95_bar_per_s")
+# Exponent of the equivalent cycle range: the S-N slope of welded steel.
+FATIGUE_EXPONENT=3.0
+SECONDS_PER_YEAR=365.25*86400.0
+UPSERT_BATCH=5000
+
+def reversals(x:np.ndarray,g:np.ndarray)->Tuple[np.ndarray,np.ndarray]:
+    """Turning points of x within each run of equal group ids g: repeats dropped, first and last of each run kept."""
+    if not len(x):
+        return x,g
+    keep=np.ones(len(x),dtype=bool)
+    keep[1:]=(x[1:]!=x[:-1])|(g[1:]!=g[:-1])
+    x,g=x[keep],g[keep]
+    edge=np.ones(len(x),dtype=bool)
+    edge[1:-1]=(g[1:-1]!=g[:-2])|(g[1:-1]!=g[2:])
+    d=np.diff(x)
+    edge[1:-1]|=d[1:]*d[:-1]<0
+    return x[edge],g[edge]
+
+def rainflow(x:np.ndarray,g:np.ndarray)->Tuple[np.ndarray,np.ndarray,np.ndarray,np.ndarray]:
+    """Full-cycle ranges (and their group ids) of the reversal runs in x by the four-point rule,
+    and the residue (with group ids) left over.
+
+    Vectorized over all groups at once: each pass extracts every pair whose range is enclosed by both
+    neighbouring ranges of the same group, which leaves each run alternating, until no pair qualifies.
+    A run's last reversal may still be extended by later data; that only widens its range, so the
+    pairs taken stay valid and the residue can be prepended to the group's next samples.
+    """
+    ranges,owners=[],[]
+    while len(x)>=4:
+        d=np.abs(np.diff(x))
+        inner=d[1:-1]
+        c=np.flatnonzero((inner<=d[:-2])&(inner<=d[2:])&(g[:-3]==g[3:]))
+        if not len(c):
+            break
+        # Adjacent candidates (equal ranges) share a point: take every other one of each run.
+        k=np.arange(len(c))
+        start=np.maximum.accumulate(np.where(np.r_[True,np.diff(c)!=1],k,0))
+        c=c[(k-start)%2==0]
+        ranges.append(inner[c])
+        owners.append(g[c])
+        keep=np.ones(len(x),dtype=bool)
+        keep[c+1]=False
+        keep[c+2]=False
+        x,g=x[keep],g[keep]
+    if not ranges:
+        return np.empty(0),np.empty(0,dtype=g.dtype),x,g
+    return np.concatenate(ranges),np.concatenate(owners),x,g
+
+def _firsts(g:np.ndarray)->np.ndarray:
+    first=np.ones(len(g),dtype=bool)
+    first[1:]=g[1:]!=g[:-1]
+    return first
+
+class ScadaLoader:
+    """Streams pressure series through per-tag cycle, surge and dp/dt estimators.
+
+    Tag state lives in arrays indexed by tag number, so each chunk is processed for all of its tags
+    with the same handful of array operations however many tags are interleaved in it.
+    """
+    STATE={"last_t":(np.int64,NO_TIME),"last_p":(float,np.nan),"last_surge_t":(float,-np.inf),
+           "seconds":(float,0.0),"samples":(np.int64,0),"surges":(np.int64,0),"rate_max":(float,0.0),
+           "cycles":(float,0.0),"cycles_r3":(float,0.0)}
+
+    def __init__(self,db:Session,max_errors:int=BULK_MAX_ERRORS):
+        self.db=db
+        self.max_errors=max_errors
+        self.resolution=SCADA_RESOLUTION_BAR
+        self.min_range=SCADA_MIN_CYCLE_BAR
+        self.surge_rate=SCADA_SURGE_BAR_PER_S
+        self.surge_gap_s=SCADA_SURGE_GAP_S
+        self.max_gap_s=SCADA_MAX_GAP_S
+        self.min_hours=SCADA_MIN_HOURS
+        self.dpdt_bin=SCADA_DPDT_BIN_BAR_PER_S
+        # The last histogram bin collects rates above SCADA_DPDT_MAX_BAR_PER_S.
+        self.bins=int(np.ceil(SCADA_DPDT_MAX_BAR_PER_S/SCADA_DPDT_BIN_BAR_PER_S))+1
+        self.names:List[str]=[]
+        self.index:Dict[str,int]={}
+        self.residues:List[np.ndarray]=[]
+        for k,(dtype,fill) in self.STATE.items():
+            setattr(self,k,np.full(0,fill,dtype=dtype))
+        self.hist=np.zeros((0,self.bins),dtype=np.int64)
+        self.result={"samples_read":0,"samples_used":0,"samples_invalid":0,"samples_out_of_order":0,
+                     "tags":[],"tags_unmapped":[],"tags_short":[],"pipelines":0,"segments_updated":0,"errors":[]}
+
+    def error(self,row:int,msg:str):
+        errs=self.result["errors"]
+        if len(errs)<self.max_errors:
+            errs.append(f"row {row}: {msg}")
+        elif len(errs)==self.max_errors:
+            errs.append("further errors truncated")
+
+    def _ids(self,names:List[str])->np.ndarray:
+        """Tag numbers for these names, allocating state for new tags."""
+        for name in names:
+            if name not in self.index:
+                self.index[name]=len(self.names)
+                self.names.append(name)
+                self.residues.append(np.empty(0))
+        n=len(self.names)
+        if n>len(self.seconds):
+            cap=max(n,2*len(self.seconds),16)
+            for k,(dtype,fill) in self.STATE.items():
+                old=getattr(self,k)
+                setattr(self,k,np.r_[old,np.full(cap-len(old),fill,dtype=dtype)])
+            self.hist=np.vstack([self.hist,np.zeros((cap-len(self.hist),self.bins),dtype=np.int64)])
+        return np.array([self.index[k] for k in names],dtype=np.intp)
+
+    def load(self,df:pd.DataFrame,first_row:int):
+        n=len(df)
+        self.result["samples_read"]+=n
+        missing=[c for c in SCADA_COLUMNS if c not in df]
+        if missing:
+            raise ValueError(f"missing columns: {', '.join(missing)}")
+        t=epoch_ns(df["timestamp"])
+        p=df["pressure_bar"]
+        p=(p if p.dtype.kind in "fiu" else pd.to_numeric(p,errors="coerce")).to_numpy(dtype=float)
+        tag=df["tag"]
+        bad=tag.isna().to_numpy()|(t==NO_TIME)|np.isnan(p)
+        for k in np.flatnonzero(bad)[:self.max_errors+1]:
+            self.error(first_row+int(k),"tag, a parseable timestamp and a numeric pressure_bar are required")
+        self.result["samples_invalid"]+=int(bad.sum())
+        good=np.flatnonzero(~bad)
+        if not len(good):
+            return
+        # Parquet dictionary columns arrive categorical: reuse their codes instead of hashing strings.
+        if isinstance(tag.dtype,pd.CategoricalDtype):
+            codes,uniq=tag.cat.codes.to_numpy()[good],tag.cat.categories
+        else:
+            codes,uniq=pd.factorize(tag.to_numpy()[good])
+        if len(uniq)<np.iinfo(np.int16).max:
+            codes=codes.astype(np.int16)  # stable sort of 16-bit keys is a radix sort
+        # Stable sort groups each tag's samples while keeping their file order.
+        order=np.argsort(codes,kind="stable")
+        rows=good[order]
+        g=self._ids([str(v) for v in uniq])[codes[order]]
+        t,p=t[rows],p[rows]
+        ok=self._in_order(t,g)
+        if not ok.all():
+            self.result["samples_out_of_order"]+=int((~ok).sum())
+            t,p,g=t[ok],p[ok],g[ok]
+        if len(t):
+            self.result["samples_used"]+=len(t)
+            self._add(t,p,g)
+
+    def _in_order(self,t:np.ndarray,g:np.ndarray)->np.ndarray:
+        """Samples later than every earlier sample of their tag; only tags with a step back pay for a running max."""
+        first=_firsts(g)
+        prev=np.empty_like(t)
+        prev[1:]=t[:-1]
+        prev[first]=self.last_t[g[first]]
+        ok=t>prev
+        if ok.all():
+            return ok
+        for k in np.unique(g[~ok]):
+            rows=np.flatnonzero(g==k)
+            ok[rows]=t[rows]>np.maximum.accumulate(np.r_[self.last_t[k],t[rows]])[:-1]
+        return ok
+
+    def _add(self,t:np.ndarray,p:np.ndarray,g:np.ndarray):
+        """t: int64 ns, increasing within each tag and after its last_t; p: bar; g: tag numbers, contiguous."""
+        first=_firsts(g)
+        starts=np.flatnonzero(first)
+        ends=np.r_[starts[1:],len(g)]-1
+        tags=g[starts]
+        local=np.cumsum(first)-1
+        m=len(tags)
+        prev_t=np.empty_like(t)
+        prev_t[1:]=t[:-1]
+        prev_t[first]=self.last_t[tags]
+        prev_p=np.empty_like(p)
+        prev_p[1:]=p[:-1]
+        prev_p[first]=self.last_p[tags]
+        dt=np.subtract(t,prev_t,dtype=float)/1e9
+        ok=(dt>0)&(dt<=self.max_gap_s)&~np.isnan(prev_p)
+        with np.errstate(invalid="ignore",divide="ignore"):
+            rate=np.abs(p-prev_p)/dt
+        rate[~ok]=0.0
+        self.samples[tags]+=np.bincount(local,minlength=m)
+        self.seconds[tags]+=np.bincount(local,weights=np.where(ok,dt,0.0),minlength=m)
+        self.rate_max[tags]=np.maximum(self.rate_max[tags],np.maximum.reduceat(rate,starts))
+        b=np.minimum(rate/self.dpdt_bin,self.bins-1).astype(np.int64)
+        self.hist[tags]+=np.bincount(local[ok]*self.bins+b[ok],minlength=m*self.bins).reshape(m,self.bins)
+        # Exceedances closer than surge_gap_s to the tag's previous one belong to the same event.
+        ex=np.flatnonzero(ok&(rate>=self.surge_rate))
+        if len(ex):
+            te,ge=t[ex]/1e9,g[ex]
+            fe=_firsts(ge)
+            prev_te=np.empty_like(te)
+            prev_te[1:]=te[:-1]
+            prev_te[fe]=self.last_surge_t[ge[fe]]
+            np.add.at(self.surges,ge[te-prev_te>self.surge_gap_s],1)
+            last=np.r_[np.flatnonzero(fe)[1:],len(ge)]-1
+            self.last_surge_t[ge[last]]=te[last]
+        self.last_t[tags]=t[ends]
+        self.last_p[tags]=p[ends]
+        # Rainflow on each tag's residue followed by its new (quantized) samples.
+        q=np.round(p/self.resolution)
+        parts=[]
+        for k,tg in enumerate(tags.tolist()):
+            parts+=[self.residues[tg],q[starts[k]:ends[k]+1]]
+        x=np.concatenate(parts)
+        gx=np.repeat(tags,[len(self.residues[tg]) for tg in tags.tolist()]+(ends-starts+1))
+        full,owner,x,gx=rainflow(*reversals(x,gx))
+        r=full*self.resolution
+        counted=r>=self.min_range
+        np.add.at(self.cycles,owner[counted],1.0)
+        np.add.at(self.cycles_r3,owner[counted],r[counted]**FATIGUE_EXPONENT)
+        cuts=np.flatnonzero(_firsts(gx))
+        for a,b in zip(cuts.tolist(),np.r_[cuts[1:],len(gx)].tolist()):
+            self.residues[gx[a]]=x[a:b]
+
+    def metrics(self,k:int)->Optional[Dict[str,Any]]:
+        """Metrics of tag number k so far (None without usable samples); the residue counts as half cycles."""
+        seconds=float(self.seconds[k])
+        if seconds<=0:
+            return None
+        r=np.abs(np.diff(self.residues[k]))*self.resolution
+        r=r[r>=self.min_range]
+        cycles=float(self.cycles[k])+0.5*len(r)
+        r3=float(self.cycles_r3[k])+0.5*float(np.sum(r**FATIGUE_EXPONENT))
+        hist=self.hist[k]
+        n=int(hist.sum())
+        b=int(np.searchsorted(np.cumsum(hist),0.95*n,side="left")) if n else 0
+        # Upper edge of the P95 bin, or the largest rate seen when P95 falls in the overflow bin.
+        p95=min((b+1)*self.dpdt_bin,float(self.rate_max[k])) if b<self.bins-1 else float(self.rate_max[k])
+        return {"hours":round(seconds/3600.0,3),"samples":int(self.samples[k]),
+                "cycles_per_day":round(cycles*86400.0/seconds,3),
+                "cycle_range_bar":round((r3/cycles)**(1.0/FATIGUE_EXPONENT),3) if cycles else 0.0,
+                "surge_events_per_year":round(int(self.surges[k])*SECONDS_PER_YEAR/seconds,3),
+                "dpdt_p95_bar_per_s":round(p95,4)}
+
+    def finish(self)->List[str]:
+        """Write each mapped tag's metrics to the segments in its km range; a segment covered by several
+        tags takes the most severe value of each. Changed inputs get a new revision (stale for rescoring).
+        """
+        stats={name:self.metrics(k) for k,name in enumerate(self.names)}
+        self.result["tags"]=[{"tag":k,**v} for k,v in sorted(stats.items()) if v is not None]
+        # Rates extrapolated from a short window are noise; such tags are reported but not written.
+        names=[k for k,v in stats.items() if v is not None and v["hours"]>=self.min_hours]
+        self.result["tags_short"]=sorted(k for k,v in stats.items() if v is not None and v["hours"]<self.min_hours)
+        mapping:Dict[str,List[Any]]={}
+        for s in range(0,len(names),UPSERT_BATCH):
+            for m in self.db.scalars(select(ScadaTag).where(ScadaTag.tag.in_(names[s:s+UPSERT_BATCH]))):
+                mapping.setdefault(m.pipeline_id,[]).append(m)
+        self.result["tags_unmapped"]=sorted(set(names)-{m.tag for ms in mapping.values() for m in ms})
+        updated=[]
+        for pid,tags in sorted(mapping.items()):
+            ix=SegmentIndex.load(self.db,pid)
+            worst:Dict[str,Dict[str,Any]]={}
+            for m in tags:
+                a,b=min(m.start_km,m.end_km),max(m.start_km,m.end_km)
+                sel=ix.intersecting(a,b)
+                if b>a:
+                    # Segments that only touch the range's ends are not covered by it.
+                    sel=sel[np.minimum(ix.ends[sel],b)-np.maximum(ix.starts[sel],a)>0]
+                for sid in ix.ids[sel].tolist():
+                    row=worst.setdefault(sid,{"segment_id":sid})
+                    for k in METRICS:
+                        row[k]=max(row.get(k,0.0),stats[m.tag][k])
+            rows=[worst[k] for k in sorted(worst)]
+            for s in range(0,len(rows),UPSERT_BATCH):
+                upsert(self.db,SegmentInputs,rows[s:s+UPSERT_BATCH],["segment_id"],revision="revision")
+            self.db.commit()
+            if rows:
+                updated.append(pid)
+                self.result["segments_updated"]+=len(rows)
+        self.result["pipelines"]=len(updated)
+        return updated
+
+def ingest_scada(db:Session,f:BinaryIO,fmt:str,chunk_size:int=SCADA_CHUNK_SIZE)->Dict[str,Any]:
+    """Derive cycles_per_day, cycle_range_bar, surge_events_per_year and dpdt_p95_bar_per_s per tag from
+    a pressure series (CSV/Parquet) in one streaming pass, and write them to the segments each tag covers.
+
+    Pressures are quantized to SCADA_RESOLUTION_BAR before rainflow counting, which removes sensor noise
+    and bounds the residue. Only cycles of at least SCADA_MIN_CYCLE_BAR count; cycle_range_bar is their
+    equivalent constant-amplitude range (cube-mean). Rates use consecutive samples at most
+    SCADA_MAX_GAP_S apart, and rates and durations exclude longer gaps. Tags observed for less than
+    SCADA_MIN_HOURS are reported but not written.
+    """
+    loader=ScadaLoader(db)
+    first=1
+    for df in iter_frames(f,fmt,chunk_size,usecols=SCADA_COLUMNS,text=("tag",)):
+        loader.load(df,first)
+        first+=len(df)
+    loader.result["updated_pipelines"]=loader.finish()
+    return loader.result
+
+def ingest_scada_path(db:Session,path:str,fmt:Optional[str]=None,chunk_size:int=SCADA_CHUNK_SIZE)->Dict[str,Any]:
+    """ingest_scada on a local file; Parquet is memory-mapped, so only the current record batch is resident."""
+    import pyarrow as pa
+    from app.ingest.readers import detect_format
+    fmt=detect_format(path,fmt)
+    if fmt=="parquet":
+        with pa.memory_map(path,"r") as f:
+            return ingest_scada(db,f,fmt,chunk_size)
+    with open(path,"rb") as f:
+        return ingest_scada(db,f,fmt,chunk_size)
+
+def main(argv:Optional[List[str]]=None):
+    ap=argparse.ArgumentParser(description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("path")
+    ap.add_argument("--format",help="csv or parquet (default: from the extension)")
+    ap.add_argument("--chunk-size",type=int,default=SCADA_CHUNK_SIZE)
+    ap.add_argument("--rescore",action="store_true",help="queue a rescore_stale job per updated pipeline")
+    args=ap.parse_args(argv)
+    from app.db.database import SessionLocal
+    from app.db.init_db import init_db
+    from app.jobs.queue import enqueue
+    init_db()
+    db=SessionLocal()
+    try:
+        res=ingest_scada_path(db,args.path,args.format,args.chunk_size)
+        if args.rescore:
+            res["rescore_jobs"]=[enqueue(db,"rescore_stale",{"pipeline_id":p}).id for p in res["updated_pipelines"]]
+    finally:
+        db.close()
+    json.dump(res,sys.stdout,indent=2)
+    print()
+
+if __name__=="__main__":
+    main()
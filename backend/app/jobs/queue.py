@@ -0,0 +1,143 @@
+from __future__ import annotations
+from datetime import datetime,timedelta,timezone
+from typing import Any,Dict,List,Mapping,Optional,Tuple
+import json,uuid
+from sqlalchemy import select,update,insert,func
+from sqlalchemy.orm import Session
+from app.core.config import JOB_CHUNK_SIZE,JOB_CLAIM_TIMEOUT_S,JOB_MAX_ATTEMPTS
+from app.db.models import Job,JobChunk,Segment
+from app.db.paging import segment_filters
+from app.jobs.tasks import TASKS
+from app.scoring.rules import active
+
+ACTIVE=("queued","running")
+FINISHED=("succeeded","failed","cancelled")
+# A claimed chunk is identified by (id, attempts): a chunk reaped and re-claimed elsewhere has moved on.
+CLAIM_COLUMNS=(JobChunk.id,JobChunk.job_id,JobChunk.seq,JobChunk.first_id,JobChunk.stop_id,
+               JobChunk.segments,JobChunk.attempts)
+
+def _now()->datetime:
+    return datetime.now(timezone.utc)
+
+def plan(db:Session,pipeline_id:Optional[str]=None,region:Optional[str]=None,
+         chunk_size:int=JOB_CHUNK_SIZE)->List[Tuple[str,Optional[str],int]]:
+    """Split the matching segments into (first_id, stop_id, count) windows of chunk_size ids.
+
+    Only every chunk_size-th id leaves the database; windows are contiguous in id order, so a
+    chunk re-reads its segments with the same scope filter plus the id window.
+    """
+    ranked=segment_filters(select(Segment.id,func.row_number().over(order_by=Segment.id).label("rn")),
+                           pipeline_id,region).subquery()
+    firsts=db.execute(select(ranked.c.id,ranked.c.rn).where((ranked.c.rn-1)%chunk_size==0)
+                      .order_by(ranked.c.rn)).all()
+    total=db.scalar(segment_filters(select(func.count()).select_from(Segment),pipeline_id,region))
+    return [(sid,firsts[j+1][0] if j+1<len(firsts) else None,min(chunk_size,total-rn+1))
+            for j,(sid,rn) in enumerate(firsts)]
+
+def enqueue(db:Session,kind:str,params:Mapping[str,Any],chunk_size:int=JOB_CHUNK_SIZE)->Job:
+    """Validate params, plan chunks and queue a job; raises ValueError on bad input.
+
+    The active ruleset version is pinned in the params so workers score with the ruleset the API has.
+    """
+    task=TASKS.get(kind)
+    if task is None:
+        raise ValueError(f"unknown job kind {kind} (one of {', '.join(TASKS)})")
+    params={**task.prepare(dict(params)),"ruleset_version":active().version}
+    windows=plan(db,params.get("pipeline_id"),params.get("region"),chunk_size)
+    job=Job(id=uuid.uuid4().hex,kind=kind,params_json=json.dumps(params),status="queued",
+            segments_total=sum(w[2] for w in windows),segments_done=0,chunks_total=len(windows),chunks_done=0,
+            cancel_requested=False)
+    if not windows:
+        job.status="succeeded"
+        job.started_at=job.finished_at=_now()
+    db.add(job)
+    db.flush()
+    if windows:
+        db.execute(insert(JobChunk),[{"job_id":job.id,"seq":j,"first_id":lo,"stop_id":hi,"segments":n,
+                                      "status":"pending","attempts":0} for j,(lo,hi,n) in enumerate(windows)])
+    db.commit()
+    return job
+
+def claim(db:Session,worker:str):
+    """Atomically take the oldest pending chunk (SKIP LOCKED on Postgres; SQLite serializes writers)."""
+    pick=(select(JobChunk.id).where(JobChunk.status=="pending").order_by(JobChunk.id).limit(1)
+          .with_for_update(skip_locked=True).scalar_subquery())
+    now=_now()
+    row=db.execute(update(JobChunk).where(JobChunk.id==pick,JobChunk.status=="pending")
+                   .values(status="running",claimed_by=worker,claimed_at=now,attempts=JobChunk.attempts+1)
+                   .returning(*CLAIM_COLUMNS)).first()
+    if row is None:
+        db.rollback()
+        return None
+    db.execute(update(Job).where(Job.id==row.job_id,Job.status=="queued").values(status="running",started_at=now))
+    db.commit()
+    return row
+
+def _held(c):
+    return (JobChunk.id==c.id,JobChunk.status=="running",JobChunk.attempts==c.attempts)
+
+def complete(db:Session,c,result:Dict[str,Any]):
+    done=db.execute(update(JobChunk).where(*_held(c))
+                    .values(status="done",finished_at=_now(),result_json=json.dumps(result),error=None)).rowcount
+    if done:
+        db.execute(update(Job).where(Job.id==c.job_id)
+                   .values(segments_done=Job.segments_done+c.segments,chunks_done=Job.chunks_done+1))
+    db.commit()
+    finalize(db,c.job_id)
+
+def fail(db:Session,c,error:str):
+    """Put a chunk back for another attempt, or fail the job once JOB_MAX_ATTEMPTS are used."""
+    if c.attempts<JOB_MAX_ATTEMPTS:
+        db.execute(update(JobChunk).where(*_held(c)).values(status="pending",claimed_by=None,claimed_at=None,error=error))
+        db.commit()
+        return
+    if db.execute(update(JobChunk).where(*_held(c)).values(status="failed",finished_at=_now(),error=error)).rowcount:
+        db.execute(update(Job).where(Job.id==c.job_id,Job.status.in_(ACTIVE))
+                   .values(status="failed",error=f"chunk {c.seq}: {error}",finished_at=_now()))
+        db.execute(update(JobChunk).where(JobChunk.job_id==c.job_id,JobChunk.status=="pending").values(status="cancelled"))
+    db.commit()
+
+def finalize(db:Session,job_id:str):
+    """Close a job once no chunk is pending or running; the status guard makes concurrent calls safe."""
+    left=db.scalar(select(func.count()).select_from(JobChunk)
+                   .where(JobChunk.job_id==job_id,JobChunk.status.in_(("pending","running"))))
+    if left:
+        return
+    job=db.get(Job,job_id)
+    db.execute(update(Job).where(Job.id==job_id,Job.status.in_(ACTIVE))
+               .values(status="cancelled" if job.cancel_requested else "succeeded",finished_at=_now()))
+    db.commit()
+
+def cancel(db:Session,job_id:str)->Optional[Job]:
+    """Drop pending chunks; chunks already running finish and are kept, then the job ends as cancelled."""
+    job=db.get(Job,job_id)
+    if job is None or job.status in FINISHED:
+        return job
+    job.cancel_requested=True
+    db.execute(update(JobChunk).where(JobChunk.job_id==job_id,JobChunk.status=="pending").values(status="cancelled"))
+    db.commit()
+    finalize(db,job_id)
+    db.refresh(job)
+    return job
+
+def reap(db:Session,timeout_s:int=JOB_CLAIM_TIMEOUT_S)->int:
+    """Release chunks whose worker died (claimed longer than timeout_s ago)."""
+    cutoff=_now()-timedelta(seconds=timeout_s)
+    lost=db.execute(select(*CLAIM_COLUMNS).where(JobChunk.status=="running",JobChunk.claimed_at<cutoff)).all()
+    for c in lost:
+        fail(db,c,f"claim expired after {timeout_s}s")
+    return len(lost)
+
+def status(job:Job)->Dict[str,Any]:
+    return {"id":job.id,"kind":job.kind,"status":job.status,"params":json.loads(job.params_json),
+            "segments_total":job.segments_total,"segments_done":job.segments_done,
+            "chunks_total":job.chunks_total,"chunks_done":job.chunks_done,
+            "progress":round(job.segments_done/job.segments_total,4) if job.segments_total else float(job.status in FINISHED),
+            "cancel_requested":job.cancel_requested,"error":job.error,
+            "created_at":job.created_at,"started_at":job.started_at,"finished_at":job.finished_at}
+
+def result(db:Session,job:Job)->Dict[str,Any]:
+    """Merge the results of every finished chunk (all of them for a succeeded job)."""
+    rows=db.scalars(select(JobChunk.result_json).where(JobChunk.job_id==job.id,JobChunk.status=="done")
+                    .order_by(JobChunk.seq)).all()
+    return TASKS[job.kind].merge(json.loads(job.params_json),[json.loads(r) for r in rows])
@@ -0,0 +1,106 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from datetime import datetime,timezone
+from typing import Any,Callable,Dict,List,Mapping,Optional,Tuple
+import numpy as np
+from sqlalchemy.orm import Session
+from app.core.config import MC_DRAWS,HISTORY_FULL_DAYS,HISTORY_KEEP_DAYS
+from app.scoring.engine import MODEL_VERSION
+from app.scoring.history import compact_history
+from app.scoring.ml import registry,rescore_ml
+from app.scoring.rescore import rescore
+from app.scoring.rules import active
+from app.scoring.uncertainty import DEFAULT_DISTRIBUTIONS,check_distributions,check_run,run_uncertainty
+
+Window=Tuple[Optional[str],Optional[str]]
+
+@dataclass(frozen=True)
+class Task:
+    """A job kind: validate and pin params at enqueue, run one segment window, merge chunk results in seq order."""
+    prepare:Callable[[Dict[str,Any]],Dict[str,Any]]
+    run:Callable[[Session,Mapping[str,Any],Window],Dict[str,Any]]
+    merge:Callable[[Mapping[str,Any],List[Dict[str,Any]]],Dict[str,Any]]
+
+def _scope(p:Mapping[str,Any])->Dict[str,Any]:
+    return {"pipeline_id":p.get("pipeline_id"),"region":p.get("region")}
+
+def _prepare_rescore(p:Dict[str,Any])->Dict[str,Any]:
+    return {**_scope(p),"force":bool(p.get("force"))}
+
+def _run_rescore(db:Session,p:Mapping[str,Any],w:Window)->Dict[str,Any]:
+    return rescore(db,force=p.get("force",False),id_range=w,**_scope(p))
+
+def _run_stale(db:Session,p:Mapping[str,Any],w:Window)->Dict[str,Any]:
+    return rescore(db,stale_only=True,id_range=w,**_scope(p))
+
+def _merge_rescore(p:Mapping[str,Any],results:List[Dict[str,Any]])->Dict[str,Any]:
+    """Summed chunk results; elapsed_s is total worker time, not wall time."""
+    classes:Dict[str,int]={}
+    for r in results:
+        for k,v in r["class_counts"].items():
+            classes[k]=classes.get(k,0)+v
+    return {"segments_scored":sum(r["segments_scored"] for r in results),
+            "segments_unchanged":sum(r["segments_unchanged"] for r in results),
+            "history_deduplicated":sum(r.get("history_deduplicated",0) for r in results),
+            "chunks":sum(r["chunks"] for r in results),"model_version":MODEL_VERSION,"class_counts":classes,
+            "elapsed_s":round(sum(r["elapsed_s"] for r in results),3)}
+
+def _prepare_ml(p:Dict[str,Any])->Dict[str,Any]:
+    if not p.get("model_version"):
+        raise ValueError("ml_rescore needs a model_version (see GET /models)")
+    return {**_scope(p),"force":bool(p.get("force")),"model_version":registry().get(p["model_version"]).model_version}
+
+def _run_ml(db:Session,p:Mapping[str,Any],w:Window)->Dict[str,Any]:
+    return rescore_ml(db,p["model_version"],force=p.get("force",False),id_range=w,**_scope(p))
+
+def _merge_ml(p:Mapping[str,Any],results:List[Dict[str,Any]])->Dict[str,Any]:
+    return {**_merge_rescore(p,results),"model_version":p["model_version"]}
+
+def _prepare_uncertainty(p:Dict[str,Any])->Dict[str,Any]:
+    """Defaults are resolved and the seed fixed here so every chunk samples the same way."""
+    draws=MC_DRAWS if p.get("draws") is None else int(p["draws"])
+    percentiles=list(p.get("percentiles") or (5,50,95))
+    check_run(draws,percentiles)
+    specs=dict(DEFAULT_DISTRIBUTIONS if p.get("distributions") is None else p["distributions"])
+    check_distributions(specs)
+    seed=p.get("seed")
+    if seed is None:
+        seed=int(np.random.SeedSequence().generate_state(1)[0])
+    return {**_scope(p),"draws":draws,"seed":int(seed),"percentiles":percentiles,"distributions":specs}
+
+def _run_uncertainty(db:Session,p:Mapping[str,Any],w:Window)->Dict[str,Any]:
+    # The job's worker processes are the parallelism; each chunk runs in-process.
+    return run_uncertainty(db,distributions=p["distributions"],draws=p["draws"],seed=p["seed"],
+                           percentiles=p["percentiles"],workers=0,id_range=w,**_scope(p))
+
+def _merge_uncertainty(p:Mapping[str,Any],results:List[Dict[str,Any]])->Dict[str,Any]:
+    return {"draws":p["draws"],"seed":p["seed"],
+            "ruleset_version":results[0]["ruleset_version"] if results else active().version,
+            "distributions":p["distributions"],"elapsed_s":round(sum(r["elapsed_s"] for r in results),3),
+            "segments":[s for r in results for s in r["segments"]]}
+
+def _prepare_compact(p:Dict[str,Any])->Dict[str,Any]:
+    """Cutoffs are measured from enqueue time so every chunk applies the same ones."""
+    full=HISTORY_FULL_DAYS if p.get("full_days") is None else int(p["full_days"])
+    keep=HISTORY_KEEP_DAYS if p.get("keep_days") is None else int(p["keep_days"])
+    if full<0 or keep<0 or (keep and keep<full):
+        raise ValueError("full_days and keep_days must be >= 0, and keep_days (0 = forever) >= full_days")
+    return {**_scope(p),"full_days":full,"keep_days":keep,"dry_run":bool(p.get("dry_run")),
+            "now":datetime.now(timezone.utc).isoformat()}
+
+def _run_compact(db:Session,p:Mapping[str,Any],w:Window)->Dict[str,Any]:
+    return compact_history(db,id_range=w,now=datetime.fromisoformat(p["now"]),full_days=p["full_days"],
+                           keep_days=p["keep_days"],dry_run=p.get("dry_run",False),**_scope(p))
+
+def _merge_compact(p:Mapping[str,Any],results:List[Dict[str,Any]])->Dict[str,Any]:
+    keys=("rows_converted","duplicates_removed","downsampled","expired","elapsed_s")
+    return {**{k:round(sum(r[k] for r in results),3) if k=="elapsed_s" else sum(r[k] for r in results) for k in keys},
+            "dry_run":p.get("dry_run",False)}
+
+TASKS:Dict[str,Task]={
+    "rescore":Task(_prepare_rescore,_run_rescore,_merge_rescore),
+    "rescore_stale":Task(_prepare_rescore,_run_stale,_merge_rescore),
+    "ml_rescore":Task(_prepare_ml,_run_ml,_merge_ml),
+    "uncertainty":Task(_prepare_uncertainty,_run_uncertainty,_merge_uncertainty),
+    "compact_history":Task(_prepare_compact,_run_compact,_merge_compact),
+}
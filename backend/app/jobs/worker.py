@@ -0,0 +1,107 @@
+"""Job worker: N processes that claim job chunks from the database until stopped.
+
+    python -m app.jobs.worker                 # one process per core
+    python -m app.jobs.worker --processes 4
+    python -m app.jobs.worker --drain         # exit once the queue is empty
+
+No broker: processes coordinate only through the jobs/job_chunks tables, so any number of
+workers on any number of hosts can share one Postgres database. SQLite works too, but it
+serializes writes, so extra processes mostly help CPU-heavy kinds such as uncertainty.
+"""
+from __future__ import annotations
+from typing import List,Optional,Tuple
+import argparse,json,multiprocessing as mp,os,signal,socket,sys,traceback
+from sqlalchemy.orm import Session
+from app.core.config import JOB_POLL_S
+from app.db.database import SessionLocal
+from app.db.models import Job
+from app.jobs.queue import claim,complete,fail,reap
+from app.jobs.tasks import TASKS
+from app.scoring import rules
+
+def _sync_rules(version:Optional[str]):
+    """Reload penalties.yaml when a job was enqueued under another ruleset than this process holds.
+
+    Worker processes compile the ruleset once at import, so without this a POST /rules/reload on the
+    API would leave rescore_stale jobs stamping the old version and never converging.
+    """
+    if version is None or rules.active().version==version:
+        return
+    rules.reload()
+    if rules.active().version!=version:
+        raise RuntimeError(f"job needs ruleset {version} but penalties.yaml here compiles to {rules.active().version}")
+
+def run_one(db:Session,worker:str)->bool:
+    """Claim and run one chunk; False when nothing is pending."""
+    c=claim(db,worker)
+    if c is None:
+        return False
+    job=db.get(Job,c.job_id)
+    try:
+        params=json.loads(job.params_json)
+        _sync_rules(params.get("ruleset_version"))
+        res=TASKS[job.kind].run(db,params,(c.first_id,c.stop_id))
+    except Exception as e:
+        db.rollback()
+        traceback.print_exc(file=sys.stderr)
+        fail(db,c,f"{type(e).__name__}: {e}")
+        return True
+    complete(db,c,res)
+    return True
+
+def work(worker:str,stop,poll:float=JOB_POLL_S,drain:bool=False):
+    """Claim chunks until ``stop`` is set (a chunk in progress is finished first)."""
+    db=SessionLocal()
+    try:
+        while not stop.is_set():
+            if run_one(db,worker):
+                continue
+            reap(db)
+            if drain:
+                return
+            stop.wait(poll)
+    finally:
+        db.close()
+
+def _process(prefix:str,stop,poll:float,drain:bool):
+    signal.signal(signal.SIGINT,signal.SIG_IGN)  # the parent handles Ctrl-C and sets stop
+    work(f"{prefix}:{os.getpid()}",stop,poll,drain)
+
+def start(processes:int,poll:float=JOB_POLL_S,drain:bool=False)->Tuple[List[mp.Process],object]:
+    """Spawn worker processes (fresh interpreters, so no DB connection is shared across a fork)."""
+    ctx=mp.get_context("spawn")
+    stop=ctx.Event()
+    procs=[ctx.Process(target=_process,args=(socket.gethostname(),stop,poll,drain),daemon=True)
+           for _ in range(processes)]
+    for p in procs:
+        p.start()
+    return procs,stop
+
+def shutdown(procs:List[mp.Process],stop,timeout:Optional[float]=None):
+    stop.set()
+    for p in procs:
+        p.join(timeout)
+        if p.is_alive():
+            p.terminate()
+
+def main(argv:Optional[List[str]]=None):
+    ap=argparse.ArgumentParser(description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--processes",type=int,default=os.cpu_count() or 1)
+    ap.add_argument("--poll",type=float,default=JOB_POLL_S,help="idle poll interval in seconds")
+    ap.add_argument("--drain",action="store_true",help="exit once no chunk is pending")
+    args=ap.parse_args(argv)
+    from app.db.init_db import init_db
+    init_db()
+    procs,stop=start(max(1,args.processes),args.poll,args.drain)
+    signal.signal(signal.SIGTERM,lambda *_:stop.set())
+    print(f"job worker: {len(procs)} processes",file=sys.stderr)
+    try:
+        for p in procs:
+            p.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        shutdown(procs,stop)
+
+if __name__=="__main__":
+    main()
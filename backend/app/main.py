@@ -1,7 +1,9 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from app.core.config import JOB_WORKERS
+from app.db.database import async_engine
 from app.db.init_db import init_db
-from app.routes import health,pipelines,segments,scoring,bulk,reports
+from app.routes import health,pipelines,segments,scoring,bulk,reports,rules,scenarios,jobs,models
 
 app=FastAPI(title="H2Ready Full MVP API",version="0.7.0")
 
@@ -16,6 +18,20 @@ app.add_middleware(
 @app.on_event("startup")
 def startup():
     init_db()
+    # Load Level-2 model artifacts once, not on the first ML request.
+    from app.scoring.ml import registry
+    registry()
+    if JOB_WORKERS>0:
+        # Worker processes owned by the API, for single-container setups; normally run python -m app.jobs.worker.
+        from app.jobs.worker import start
+        app.state.job_workers=start(JOB_WORKERS)
+
+@app.on_event("shutdown")
+async def shutdown():
+    if getattr(app.state,"job_workers",None):
+        from app.jobs.worker import shutdown as stop_workers
+        stop_workers(*app.state.job_workers,timeout=10)
+    await async_engine.dispose()
 
 app.include_router(health.router,tags=["health"])
 app.include_router(pipelines.router,prefix="/pipelines",tags=["pipelines"])
@@ -23,3 +39,7 @@ app.include_router(segments.router,prefix="/segments",tags=["segments"])
 app.include_router(scoring.router,tags=["scoring"])
 app.include_router(bulk.router,tags=["bulk"])
 app.include_router(reports.router,tags=["reports"])
+app.include_router(rules.router,tags=["rules"])
+app.include_router(scenarios.router,tags=["scenarios"])
+app.include_router(jobs.router,prefix="/jobs",tags=["jobs"])
+app.include_router(models.router,tags=["models"])
@@ -1,5 +1,118 @@
-from fastapi import APIRouter
+from datetime import datetime
+from typing import List,Optional
+from fastapi import APIRouter,Depends,File,HTTPException,UploadFile
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.db.database import get_db
+from app.db.models import Pipeline,ScadaTag
+from app.db.upsert import upsert
+from app.core.config import ILI_MAX_DISTANCE_KM,CP_MAX_DISTANCE_KM
+from app.ingest.bulk import TEMPLATE_COLUMNS,bulk_upsert
+from app.ingest.cp import CP_COLUMNS,ingest_cp
+from app.ingest.ili import ILI_COLUMNS,ingest_ili
+from app.ingest.scada import SCADA_COLUMNS,TAG_COLUMNS,ingest_scada
+from app.ingest.readers import detect_format
+from app.jobs.queue import enqueue
+from app.schemas import BulkUpsertResult,CpIngestResult,IliIngestResult,ScadaTagIn,ScadaIngestResult
+
 router=APIRouter()
+
 @router.get("/bulk/template")
 def template():
-    return {"columns":[]}
+    return {"columns":TEMPLATE_COLUMNS}
+
+@router.post("/bulk/upload",response_model=BulkUpsertResult)
+def upload(file:UploadFile=File(...),format:str|None=None,db:Session=Depends(get_db)):
+    """Upsert pipelines, segments and inputs from a CSV or Parquet file, streamed in chunks."""
+    try:
+        fmt=detect_format(file.filename,format)
+    except ValueError as e:
+        raise HTTPException(status_code=400,detail=str(e))
+    return bulk_upsert(db,file.file,fmt)
+
+@router.get("/bulk/ili/template")
+def ili_template():
+    return {"columns":ILI_COLUMNS}
+
+@router.post("/bulk/ili",response_model=IliIngestResult)
+def upload_ili(file:UploadFile=File(...),format:str|None=None,max_distance_km:float=ILI_MAX_DISTANCE_KM,
+               rescore:bool=False,db:Session=Depends(get_db)):
+    """Aggregate an ILI feature listing into segment integrity inputs in one streaming pass.
+
+    Changed inputs make their segments stale; with rescore=true a rescore_stale job is queued per updated pipeline.
+    """
+    try:
+        fmt=detect_format(file.filename,format)
+    except ValueError as e:
+        raise HTTPException(status_code=400,detail=str(e))
+    res=ingest_ili(db,file.file,fmt,max_distance_km)
+    if rescore:
+        res["rescore_jobs"]=[enqueue(db,"rescore_stale",{"pipeline_id":p}).id for p in res["updated_pipelines"]]
+    return res
+
+@router.get("/bulk/cp/template")
+def cp_template():
+    return {"columns":CP_COLUMNS}
+
+@router.post("/bulk/cp",response_model=CpIngestResult)
+def upload_cp(file:UploadFile=File(...),format:str|None=None,max_distance_km:float=CP_MAX_DISTANCE_KM,
+              survey_date:Optional[datetime]=None,rescore:bool=False,db:Session=Depends(get_db)):
+    """Aggregate CIPS / remote monitoring unit potentials into segment CP inputs in one streaming pass.
+
+    survey_date dates readings without a timestamp. Changed inputs make their segments stale; with
+    rescore=true a rescore_stale job is queued per updated pipeline.
+    """
+    try:
+        fmt=detect_format(file.filename,format)
+    except ValueError as e:
+        raise HTTPException(status_code=400,detail=str(e))
+    res=ingest_cp(db,file.file,fmt,max_distance_km,survey_date)
+    if rescore:
+        res["rescore_jobs"]=[enqueue(db,"rescore_stale",{"pipeline_id":p}).id for p in res["updated_pipelines"]]
+    return res
+
+@router.get("/bulk/scada/template")
+def scada_template():
+    return {"columns":SCADA_COLUMNS,"tag_columns":TAG_COLUMNS}
+
+@router.get("/bulk/scada/tags",response_model=List[ScadaTagIn])
+def list_scada_tags(pipeline_id:Optional[str]=None,db:Session=Depends(get_db)):
+    stmt=select(ScadaTag).order_by(ScadaTag.tag)
+    if pipeline_id:
+        stmt=stmt.where(ScadaTag.pipeline_id==pipeline_id)
+    return [ScadaTagIn(tag=t.tag,pipeline_id=t.pipeline_id,start_km=t.start_km,end_km=t.end_km) for t in db.scalars(stmt)]
+
+@router.put("/bulk/scada/tags")
+def put_scada_tags(tags:List[ScadaTagIn],db:Session=Depends(get_db)):
+    """Create or move tags; each maps to the km range of one pipeline its pressure readings represent."""
+    pids={t.pipeline_id for t in tags}
+    known=set(db.scalars(select(Pipeline.id).where(Pipeline.id.in_(pids)))) if pids else set()
+    if pids-known:
+        raise HTTPException(status_code=400,detail=f"Unknown pipelines: {', '.join(sorted(pids-known))}")
+    bad=[t.tag for t in tags if t.end_km<t.start_km]
+    if bad:
+        raise HTTPException(status_code=400,detail=f"end_km < start_km for tags: {', '.join(bad)}")
+    # Last entry wins for a repeated tag (one statement may not update a row twice).
+    rows={t.tag:t.model_dump() for t in tags}
+    upsert(db,ScadaTag,list(rows.values()),["tag"])
+    db.commit()
+    return {"tags":len(rows)}
+
+@router.post("/bulk/scada",response_model=ScadaIngestResult)
+def upload_scada(file:UploadFile=File(...),format:str|None=None,rescore:bool=False,db:Session=Depends(get_db)):
+    """Derive cycling, surge and dp/dt inputs from SCADA pressure series in one streaming pass.
+
+    Changed inputs make their segments stale; with rescore=true a rescore_stale job is queued per updated pipeline.
+    For very large series run ``python -m app.ingest.scada`` on the file instead, which memory-maps Parquet.
+    """
+    try:
+        fmt=detect_format(file.filename,format)
+    except ValueError as e:
+        raise HTTPException(status_code=400,detail=str(e))
+    try:
+        res=ingest_scada(db,file.file,fmt)
+    except ValueError as e:
+        raise HTTPException(status_code=400,detail=str(e))
+    if rescore:
+        res["rescore_jobs"]=[enqueue(db,"rescore_stale",{"pipeline_id":p}).id for p in res["updated_pipelines"]]
+    return res
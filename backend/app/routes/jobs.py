@@ -0,0 +1,65 @@
+from typing import Any,Dict,List
+from fastapi import APIRouter,Depends,HTTPException,Query
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.core.config import PAGE_SIZE_MAX
+from app.db.database import get_db
+from app.db.models import Job
+from app.jobs.queue import enqueue,cancel,status,result,FINISHED
+from app.schemas import JobCreate,JobOut
+
+router=APIRouter()
+
+def _job(db:Session,job_id:str)->Job:
+    job=db.get(Job,job_id)
+    if not job:
+        raise HTTPException(status_code=404,detail="Job not found")
+    return job
+
+@router.post("",response_model=JobOut,status_code=202)
+def create_job(payload:JobCreate,db:Session=Depends(get_db)):
+    """Queue a background job and return at once; worker processes (python -m app.jobs.worker) run it chunk by chunk.
+
+    Poll GET /jobs/{id} for progress and fetch GET /jobs/{id}/result when it has finished.
+    """
+    params:Dict[str,Any]={"pipeline_id":payload.pipeline_id,"region":payload.region,"force":payload.force,
+                          "model_version":payload.model_version,"full_days":payload.full_days,"keep_days":payload.keep_days,
+                          "dry_run":payload.dry_run}
+    if payload.uncertainty is not None:
+        u=payload.uncertainty
+        params.update(draws=u.draws,seed=u.seed,percentiles=u.percentiles,
+                      distributions=None if u.distributions is None else
+                      {k:v.model_dump(exclude_none=True) for k,v in u.distributions.items()})
+    try:
+        return status(enqueue(db,payload.kind,params))
+    except ValueError as e:
+        raise HTTPException(status_code=400,detail=str(e))
+
+@router.get("",response_model=List[JobOut])
+def list_jobs(state:str|None=Query(None,alias="status"),kind:str|None=None,limit:int=50,db:Session=Depends(get_db)):
+    """Most recent jobs first."""
+    if not 1<=limit<=PAGE_SIZE_MAX:
+        raise HTTPException(status_code=400,detail=f"limit must be between 1 and {PAGE_SIZE_MAX}")
+    stmt=select(Job).order_by(Job.created_at.desc(),Job.id).limit(limit)
+    if state:
+        stmt=stmt.where(Job.status==state)
+    if kind:
+        stmt=stmt.where(Job.kind==kind)
+    return [status(j) for j in db.scalars(stmt)]
+
+@router.get("/{job_id}",response_model=JobOut)
+def get_job(job_id:str,db:Session=Depends(get_db)):
+    return status(_job(db,job_id))
+
+@router.get("/{job_id}/result")
+def get_job_result(job_id:str,db:Session=Depends(get_db)):
+    """Merged chunk results: a RescoreResult (also for ml_rescore) or an UncertaintyOut. Cancelled and failed jobs return what finished."""
+    job=_job(db,job_id)
+    if job.status not in FINISHED:
+        raise HTTPException(status_code=409,detail=f"Job is {job.status}")
+    return result(db,job)
+
+@router.post("/{job_id}/cancel",response_model=JobOut)
+def cancel_job(job_id:str,db:Session=Depends(get_db)):
+    """Stop a job: pending chunks are dropped, running chunks finish (their writes are kept)."""
+    return status(cancel(db,_job(db,job_id).id))
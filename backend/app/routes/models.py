@@ -0,0 +1,34 @@
+from fastapi import APIRouter,Depends,HTTPException
+from sqlalchemy.orm import Session
+from app.db.database import get_db
+from app.schemas import MlRegistryOut,RescoreResult
+from app.scoring import ml
+
+router=APIRouter()
+
+def _out(reg:ml.Registry)->MlRegistryOut:
+    return MlRegistryOut(path=reg.path,models=[m.info() for m in reg.models.values()],errors=reg.errors)
+
+@router.get("/models",response_model=MlRegistryOut)
+def list_models():
+    """Level-2 models loaded from the registry directory, and artifacts that failed to load."""
+    return _out(ml.registry())
+
+@router.post("/models/reload",response_model=MlRegistryOut)
+def reload_models():
+    """Re-read the model artifacts without restarting; in-flight runs finish on the models they started with."""
+    return _out(ml.reload())
+
+@router.post("/scores/rescore/ml",response_model=RescoreResult)
+def rescore_with_model(model_version:str,pipeline_id:str|None=None,region:str|None=None,force:bool=False,
+                       db:Session=Depends(get_db)):
+    """Score a pipeline, a region or the portfolio with a Level-2 model, gated like the rules engine.
+
+    Rows go to score history under the model's model_version; current scores stay on the rules engine.
+    Segments whose latest score from this model is unchanged are skipped unless force=true.
+    """
+    try:
+        scorer=ml.registry().get(model_version)
+    except ValueError as e:
+        raise HTTPException(status_code=404,detail=str(e))
+    return ml.rescore_ml(db,scorer.model_version,pipeline_id=pipeline_id,region=region,force=force)
@@ -1,8 +1,14 @@
-from fastapi import APIRouter,Depends,HTTPException
+from typing import List
+from fastapi import APIRouter,Depends,HTTPException,Query,Request,Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.db.database import get_db
+from app.core.config import PAGE_SIZE_MAX
+from app.db.database import get_db,get_async_db
+from app.db.lrs import SegmentIndex
 from app.db.models import Pipeline
-from app.schemas import PipelineCreate
+from app.db.paging import keyset,page,page_size,projection,respond
+from app.schemas import PipelineCreate,SegmentLocation,SegmentProblem
 
 router=APIRouter()
 
@@ -14,7 +20,42 @@ def create_pipeline(payload:PipelineCreate,db:Session=Depends(get_db)):
     db.add(p); db.commit()
     return {"ok":True,"pipeline_id":p.id}
 
+PIPELINE_FIELDS=("id","name","operator","region")
+
 @router.get("")
-def list_pipelines(db:Session=Depends(get_db)):
-    pipes=db.query(Pipeline).all()
-    return [{"id":p.id,"name":p.name,"operator":p.operator,"region":p.region} for p in pipes]
+async def list_pipelines(request:Request,response:Response,region:str|None=None,operator:str|None=None,
+                         fields:str|None=None,cursor:str|None=None,limit:int|None=None,
+                         db:AsyncSession=Depends(get_async_db)):
+    """Pipelines in id order. Every match without limit or cursor; otherwise one keyset page, follow X-Next-Cursor for more."""
+    limit=page_size(cursor,limit)
+    want=projection(fields,PIPELINE_FIELDS)
+    q=select(Pipeline.id,Pipeline.name,Pipeline.operator,Pipeline.region)
+    if region:
+        q=q.where(Pipeline.region==region)
+    if operator:
+        q=q.where(Pipeline.operator==operator)
+    pipes=(await db.execute(keyset(q,(Pipeline.id,),cursor,limit))).all()
+    pipes,nxt=page(pipes,limit,lambda p:(p.id,))
+    items=[{"id":p.id,"name":p.name,"operator":p.operator,"region":p.region} for p in pipes]
+    return respond(request,response,items,nxt,want)
+
+def _index(db:Session,pipeline_id:str)->SegmentIndex:
+    if not db.get(Pipeline,pipeline_id):
+        raise HTTPException(status_code=404,detail="Pipeline not found")
+    return SegmentIndex.load(db,pipeline_id)
+
+@router.get("/{pipeline_id}/segments/locate",response_model=List[SegmentLocation])
+def locate_segments(pipeline_id:str,km:List[float]=Query(...),db:Session=Depends(get_db)):
+    """Nearest segment for each chainage (distance 0 inside a segment), by binary search over the pipeline's segments."""
+    if len(km)>PAGE_SIZE_MAX:
+        raise HTTPException(status_code=400,detail=f"at most {PAGE_SIZE_MAX} chainages per request")
+    ix=_index(db,pipeline_id)
+    pos,dist=ix.locate(km)
+    return [{"km":k,"segment_id":ix.ids[p] if p>=0 else None,"distance_km":float(d) if p>=0 else None}
+            for k,p,d in zip(km,pos.tolist(),dist.tolist())]
+
+@router.get("/{pipeline_id}/segments/validate",response_model=List[SegmentProblem])
+def validate_segments(pipeline_id:str,tolerance_km:float|None=None,db:Session=Depends(get_db)):
+    """Gaps, overlaps and zero-length segments along a pipeline, in km order."""
+    ix=_index(db,pipeline_id)
+    return ix.problems() if tolerance_km is None else ix.problems(tolerance_km)
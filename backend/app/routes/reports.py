@@ -1,2 +1,32 @@
-from fastapi import APIRouter
+from datetime import datetime
+from fastapi import APIRouter,HTTPException
+from fastapi.responses import StreamingResponse
+from app.db.database import SessionLocal
+from app.export.writers import FORMATS,export_stmt,stream_export
+
 router=APIRouter()
+
+def _export(stmt,fmt:str,name:str)->StreamingResponse:
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400,detail=f"Unsupported export format: {fmt} (expected {', '.join(FORMATS)})")
+    media,ext=FORMATS[fmt]
+    def body():
+        # Own session: request-scoped dependencies are closed before a streamed body finishes.
+        db=SessionLocal()
+        try:
+            yield from stream_export(db,stmt,fmt)
+        finally:
+            db.close()
+    return StreamingResponse(body(),media_type=media,
+                             headers={"Content-Disposition":f'attachment; filename="{name}.{ext}"'})
+
+@router.get("/reports/scores/latest")
+def export_latest(format:str="parquet",pipeline_id:str|None=None,region:str|None=None):
+    """Latest score of every scored segment with pipeline metadata and parsed drivers, streamed as Parquet, Arrow IPC or CSV."""
+    return _export(export_stmt(False,pipeline_id,region),format,"hri_latest")
+
+@router.get("/reports/scores/history")
+def export_history(format:str="parquet",pipeline_id:str|None=None,region:str|None=None,
+                   since:datetime|None=None,until:datetime|None=None):
+    """Every stored HRIScore row (optionally within [since, until)), streamed in segment then time order."""
+    return _export(export_stmt(True,pipeline_id,region,since,until),format,"hri_history")
@@ -0,0 +1,38 @@
+from fastapi import APIRouter,Depends,HTTPException
+from sqlalchemy.orm import Session
+from app.core.config import SHADOW_TOP
+from app.db.database import get_db
+from app.schemas import RulesetOut,ShadowRequest,ShadowOut
+from app.scoring import rules
+from app.scoring.shadow import shadow_diff
+
+router=APIRouter()
+
+@router.get("/rules",response_model=RulesetOut)
+def current_rules():
+    rs=rules.active()
+    return RulesetOut(version=rs.version,weights=rs.weights)
+
+@router.post("/rules/reload",response_model=RulesetOut)
+def reload_rules():
+    """Recompile penalties.yaml and swap it in without restarting; in-flight scores finish on the old ruleset."""
+    try:
+        prev,rs=rules.reload()
+    except Exception as e:
+        raise HTTPException(status_code=400,detail=f"Ruleset not reloaded: {e}")
+    return RulesetOut(version=rs.version,weights=rs.weights,previous_version=prev.version)
+
+@router.post("/rules/shadow",response_model=ShadowOut)
+def shadow_rules(payload:ShadowRequest,db:Session=Depends(get_db)):
+    """Score the scope under a candidate penalties.yaml alongside the active ruleset and return the diff.
+
+    Nothing is written and the active ruleset is untouched: class changes, HRI deltas by km,
+    newly triggered or cleared gates, and the segments that move most.
+    """
+    try:
+        candidate=rules.parse_rules(payload.penalties.encode())
+    except Exception as e:
+        raise HTTPException(status_code=400,detail=f"Candidate ruleset does not compile: {e}")
+    top=SHADOW_TOP if payload.top is None else max(0,payload.top)
+    return shadow_diff(db,candidate,pipeline_id=payload.pipeline_id,region=payload.region,
+                       segment_ids=payload.segment_ids,top=top)
@@ -0,0 +1,55 @@
+from typing import Any,Dict
+from fastapi import APIRouter,Depends,HTTPException
+from pydantic import ValidationError
+from sqlalchemy.orm import Session
+from app.core.config import SCENARIO_MAX,PLAN_MAX_INTERVENTIONS
+from app.db.database import get_db
+from app.schemas import ScenarioIn,ScenarioRequest,ScenarioOut,SegmentInputsUpsert,PlanRequest,PlanOut
+from app.scoring.planner import plan
+from app.scoring.scenarios import run_scenarios
+
+router=APIRouter()
+
+def _coerce(sc:ScenarioIn)->Dict[str,Any]:
+    raw=sc.model_dump()
+    try:
+        # Coerce known fields; unknown ones pass through for check_scenarios to reject.
+        raw["set"].update(SegmentInputsUpsert.model_validate(sc.set).model_dump(include=set(sc.set)))
+    except ValidationError as e:
+        raise HTTPException(status_code=422,detail=f"scenario {sc.name}: {e.errors()[0]['loc'][0]}: {e.errors()[0]['msg']}")
+    return raw
+
+@router.post("/scenarios/score",response_model=ScenarioOut)
+def score_scenarios(payload:ScenarioRequest,db:Session=Depends(get_db)):
+    """Score mitigation scenarios (overlays on stored inputs) across segments without saving anything.
+
+    Scope is segment_ids, pipeline_id and/or region (the whole portfolio if none). Summaries compare
+    each scenario with the baseline; detail=true adds per-segment results.
+    """
+    if not payload.scenarios or len(payload.scenarios)>SCENARIO_MAX:
+        raise HTTPException(status_code=400,detail=f"Give between 1 and {SCENARIO_MAX} scenarios")
+    scenarios=[_coerce(sc) for sc in payload.scenarios]
+    try:
+        return run_scenarios(db,scenarios,segment_ids=payload.segment_ids,pipeline_id=payload.pipeline_id,
+                             region=payload.region,detail=payload.detail,with_drivers=payload.with_drivers)
+    except ValueError as e:
+        raise HTTPException(status_code=400,detail=str(e))
+
+@router.post("/scenarios/plan",response_model=PlanOut)
+def plan_interventions(payload:PlanRequest,db:Session=Depends(get_db)):
+    """Pick the interventions to fund within a capex budget; nothing is saved.
+
+    objective=hri_km maximizes km-weighted HRI gain, not_ready_km the km moved out of Not Ready.
+    Each segment gets at most one combination of up to max_per_segment interventions.
+    upper_bound is the LP relaxation bound, so objective_value/upper_bound bounds the optimality gap.
+    """
+    if not payload.interventions or len(payload.interventions)>PLAN_MAX_INTERVENTIONS:
+        raise HTTPException(status_code=400,detail=f"Give between 1 and {PLAN_MAX_INTERVENTIONS} interventions")
+    if len({iv.name for iv in payload.interventions})<len(payload.interventions):
+        raise HTTPException(status_code=400,detail="Intervention names must be unique")
+    interventions=[_coerce(iv) for iv in payload.interventions]
+    try:
+        return plan(db,interventions,payload.budget,objective=payload.objective,max_per_segment=payload.max_per_segment,
+                    segment_ids=payload.segment_ids,pipeline_id=payload.pipeline_id,region=payload.region)
+    except ValueError as e:
+        raise HTTPException(status_code=400,detail=str(e))
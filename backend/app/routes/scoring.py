@@ -1,10 +1,23 @@
-import json
-from fastapi import APIRouter,Depends,HTTPException
+from typing import List
+from fastapi import APIRouter,Depends,HTTPException,Query,Request,Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.db.database import get_db
-from app.db.models import Segment,SegmentInputs,HRIScore
-from app.schemas import ScoreOut
-from app.scoring.engine import compute_hri,WEIGHTS
+from app.core.config import PAGE_SIZE_DEFAULT,MC_DRAWS,SENSITIVITY_MAX_RESULTS,CURRENT_SCORES
+from app.db.database import get_db,get_async_db
+from app.db.models import Segment,SegmentInputs,HRIScore,CurrentScore
+from app.db.paging import keyset,page,page_size,projection,respond
+from app.schemas import ScoreOut,RescoreResult,UncertaintyRequest,UncertaintyOut,SensitivityOut,DriverSummaryOut,RollupsOut
+from app.scoring.engine import compute_hri,MODEL_VERSION
+from app.scoring.rules import active,render
+from app.scoring.rescore import rescore,count_stale
+from app.scoring.history import driver_ids,gate_values,load_drivers,unchanged
+from app.scoring.latest import (latest_page_async,record_current,current_keys,confirm_current,restamp_current,
+                                driver_summary)
+from app.scoring.cache import CACHE,score_key,lookup,store
+from app.scoring.uncertainty import run_uncertainty,check_run
+from app.scoring.sensitivity import run_sensitivity
+from app.scoring.rollups import GROUPS,rollups
 
 router=APIRouter()
 
@@ -16,41 +29,163 @@ def compute_segment_hri(segment_id:str,db:Session=Depends(get_db)):
     if not inp:
         inp=SegmentInputs(segment_id=segment_id); db.add(inp); db.commit(); db.refresh(inp)
     inputs={c.name:getattr(inp,c.name) for c in inp.__table__.columns}
-    hri,klass,pillars,drivers=compute_hri(inputs)
-    rec=HRIScore(segment_id=segment_id,model_version="rules-v2-gated",
-                 hri=hri,readiness_class=klass,
-                 m=pillars["M"],d=pillars["D"],i=pillars["I"],c=pillars["C"],
-                 e=pillars["E"],q=pillars["Q"],o=pillars["O"],
-                 drivers_json=json.dumps(drivers[:80]))
-    db.add(rec); db.commit()
-    return ScoreOut(segment_id=segment_id,model_version=rec.model_version,
-                    hri=rec.hri,readiness_class=rec.readiness_class,
+    rs=active()
+    key=score_key(inputs,rs,MODEL_VERSION)
+    if current_keys(db,[segment_id]).get(segment_id)==key:
+        # Unchanged inputs and ruleset: answer from the stored score instead of appending a duplicate.
+        prev=db.get(HRIScore,db.get(CurrentScore,segment_id).score_id)
+        confirm_current(db,[{"sid":segment_id,"rev":inp.revision,"ver":rs.version}]); db.commit()
+        CACHE.count("duplicate_inserts_skipped")
+        return ScoreOut(segment_id=segment_id,model_version=prev.model_version,
+                        hri=prev.hri,readiness_class=prev.readiness_class,
+                        pillars={"M":prev.m,"D":prev.d,"I":prev.i,"C":prev.c,"E":prev.e,"Q":prev.q,"O":prev.o},
+                        weights=rs.weights,drivers=load_drivers(db,[(prev.driver_ids,prev.drivers_json,prev.gate_values)])[0][:20])
+    res=lookup(db,key)
+    if res is None:
+        res=compute_hri(inputs,rs)
+        store(db,key,res,MODEL_VERSION,rs.version)
+    hri,klass,pillars,drivers=res
+    row={"segment_id":segment_id,"model_version":MODEL_VERSION,"hri":hri,"readiness_class":klass,
+         "m":pillars["M"],"d":pillars["D"],"i":pillars["I"],"c":pillars["C"],
+         "e":pillars["E"],"q":pillars["Q"],"o":pillars["O"],"driver_ids":driver_ids(db,[drivers],rs)[0],
+         "gate_values":gate_values([drivers])[0]}
+    if unchanged(db,[row])[0]:
+        # New inputs, same score: history keeps only changes, so just move the current score's keys.
+        restamp_current(db,[{"sid":segment_id,"key":key,"rev":inp.revision,"ver":rs.version}])
+    else:
+        rec=HRIScore(**row)
+        db.add(rec); db.flush()
+        record_current(db,[{**row,"id":rec.id,"cache_key":key,"inputs_revision":inp.revision,
+                            "ruleset_version":rs.version}])
+    db.commit()
+    return ScoreOut(segment_id=segment_id,model_version=MODEL_VERSION,
+                    hri=hri,readiness_class=klass,
                     pillars={k:float(v) for k,v in pillars.items()},
-                    weights=WEIGHTS,drivers=drivers[:20])
+                    weights=rs.weights,drivers=[render(c,rs) for c in drivers[:20]])
+
+def _uncertainty(db:Session,payload:UncertaintyRequest,**scope)->UncertaintyOut:
+    draws=MC_DRAWS if payload.draws is None else payload.draws
+    specs=None
+    if payload.distributions is not None:
+        specs={k:v.model_dump(exclude_none=True) for k,v in payload.distributions.items()}
+    try:
+        check_run(draws,payload.percentiles)
+        return run_uncertainty(db,distributions=specs,draws=draws,seed=payload.seed,
+                               percentiles=payload.percentiles,**scope)
+    except ValueError as e:
+        raise HTTPException(status_code=400,detail=str(e))
+
+HISTORY_FIELDS=("score_id","created_at","model_version","hri","readiness_class","pillars","drivers")
+
+@router.get("/segments/{segment_id}/hri/history")
+def segment_history(segment_id:str,request:Request,response:Response,fields:str|None=None,cursor:str|None=None,
+                    limit:int=PAGE_SIZE_DEFAULT,model_version:str|None=None,db:Session=Depends(get_db)):
+    """Stored score changes of one segment, oldest first, one keyset page at a time (follow X-Next-Cursor).
+
+    model_version keeps one scoring mode (the rules engine or a Level-2 model) when both have run.
+    """
+    if not db.get(Segment,segment_id):
+        raise HTTPException(status_code=404,detail="Segment not found")
+    want=projection(fields,HISTORY_FIELDS)
+    h=HRIScore.__table__.c
+    q=select(h.id,h.created_at,h.model_version,h.hri,h.readiness_class,h.m,h.d,h.i,h.c,h.e,h.q,h.o,
+             h.driver_ids,h.drivers_json,h.gate_values).where(h.segment_id==segment_id)
+    if model_version:
+        q=q.where(h.model_version==model_version)
+    rows,nxt=page(db.execute(keyset(q,(h.id,),cursor,limit)).all(),limit,lambda r:(r.id,))
+    drivers=load_drivers(db,[(r.driver_ids,r.drivers_json,r.gate_values) for r in rows])
+    items=[{"score_id":r.id,"created_at":r.created_at,"model_version":r.model_version,"hri":r.hri,
+            "readiness_class":r.readiness_class,
+            "pillars":{"M":r.m,"D":r.d,"I":r.i,"C":r.c,"E":r.e,"Q":r.q,"O":r.o},"drivers":d}
+           for r,d in zip(rows,drivers)]
+    return respond(request,response,items,nxt,want)
+
+@router.post("/segments/{segment_id}/hri/uncertainty",response_model=UncertaintyOut)
+def segment_uncertainty(segment_id:str,payload:UncertaintyRequest,db:Session=Depends(get_db)):
+    """Monte Carlo HRI for one segment: percentiles, class probabilities and gate-trigger probabilities.
+
+    Without ``distributions``, K_I, K_TH, HAZ hardness and crack length get default measurement error.
+    """
+    if not db.get(Segment,segment_id):
+        raise HTTPException(status_code=404,detail="Segment not found")
+    return _uncertainty(db,payload,segment_ids=[segment_id])
+
+@router.post("/scores/uncertainty",response_model=UncertaintyOut)
+def portfolio_uncertainty(payload:UncertaintyRequest,pipeline_id:str|None=None,region:str|None=None,
+                          db:Session=Depends(get_db)):
+    """Monte Carlo HRI for every segment of a pipeline, a region or the portfolio (same seed, same draws per segment)."""
+    return _uncertainty(db,payload,pipeline_id=pipeline_id,region=region)
+
+@router.get("/segments/{segment_id}/hri/sensitivity",response_model=SensitivityOut)
+def segment_sensitivity(segment_id:str,db:Session=Depends(get_db)):
+    """HRI gain from moving each penalized input of one segment to its next better band, best first."""
+    if not db.get(Segment,segment_id):
+        raise HTTPException(status_code=404,detail="Segment not found")
+    return run_sensitivity(db,segment_ids=[segment_id],limit=SENSITIVITY_MAX_RESULTS)
+
+@router.get("/scores/sensitivity",response_model=SensitivityOut)
+def portfolio_sensitivity(pipeline_id:str|None=None,region:str|None=None,limit:int=100,min_gain:float=0.0,
+                          db:Session=Depends(get_db)):
+    """Portfolio-wide intervention list ranked by HRI gain (one input moved one band, gate releases included)."""
+    if not 1<=limit<=SENSITIVITY_MAX_RESULTS:
+        raise HTTPException(status_code=400,detail=f"limit must be between 1 and {SENSITIVITY_MAX_RESULTS}")
+    return run_sensitivity(db,pipeline_id=pipeline_id,region=region,limit=limit,min_gain=min_gain)
+
+@router.post("/scores/rescore",response_model=RescoreResult)
+def rescore_portfolio(pipeline_id:str|None=None,region:str|None=None,force:bool=False,db:Session=Depends(get_db)):
+    """Rescore a pipeline, a region or (with no filter) the whole portfolio in batch.
+
+    Segments whose inputs and ruleset are unchanged since their current score are skipped unless force=true.
+    """
+    return rescore(db,pipeline_id=pipeline_id,region=region,force=force)
+
+@router.get("/scores/stale")
+def stale_count(pipeline_id:str|None=None,db:Session=Depends(get_db)):
+    return {"stale_segments":count_stale(db,pipeline_id)}
+
+@router.post("/scores/rescore/stale",response_model=RescoreResult)
+def rescore_stale(pipeline_id:str|None=None,region:str|None=None,db:Session=Depends(get_db)):
+    """Incremental refresh: rescore only segments whose inputs or ruleset changed since their current score."""
+    return rescore(db,pipeline_id=pipeline_id,region=region,stale_only=True)
+
+@router.get("/scores/drivers",response_model=DriverSummaryOut)
+def top_drivers(pipeline_id:str|None=None,region:str|None=None,pillar:str|None=None,by:str="rule",limit:int=20,
+                db:Session=Depends(get_db)):
+    """Top penalty rules (by=rule) or rule bands (by=band) across current scores, ranked by km affected."""
+    if not CURRENT_SCORES:
+        raise HTTPException(status_code=409,detail="driver aggregation needs CURRENT_SCORES=1")
+    if by not in ("rule","band"):
+        raise HTTPException(status_code=400,detail="by must be rule or band")
+    if not 1<=limit<=1000:
+        raise HTTPException(status_code=400,detail="limit must be between 1 and 1000")
+    rs=active()
+    return {"ruleset_version":rs.version,"by":by,
+            "drivers":driver_summary(db,rs,pipeline_id=pipeline_id,region=region,pillar=pillar,by=by,limit=limit)}
+
+@router.get("/scores/rollups",response_model=RollupsOut)
+def score_rollups(by:str="pipeline",pipeline_id:str|None=None,region:str|None=None,operator:str|None=None,
+                  db:Session=Depends(get_db)):
+    """Portfolio rollups per pipeline, region or operator (or by=portfolio), maintained as scores are written."""
+    if not CURRENT_SCORES:
+        raise HTTPException(status_code=409,detail="rollups need CURRENT_SCORES=1")
+    if by not in GROUPS:
+        raise HTTPException(status_code=400,detail=f"by must be one of {', '.join(GROUPS)}")
+    return {"by":by,"groups":rollups(db,by,pipeline_id=pipeline_id,region=region,operator=operator)}
+
+@router.get("/scores/cache")
+def cache_stats():
+    return CACHE.snapshot()
+
+LATEST_FIELDS=("segment_id","pipeline_id","start_km","end_km","hri","readiness_class","pillars")
 
 @router.get("/scores/latest")
-def latest_scores(pipeline_id:str|None=None,db:Session=Depends(get_db)):
-    q=db.query(Segment)
-    if pipeline_id:
-        q=q.filter(Segment.pipeline_id==pipeline_id)
-    segs=q.all()
-    from app.db.models import HRIScore
-    out=[]
-    for s in segs:
-        latest=(db.query(HRIScore)
-                  .filter(HRIScore.segment_id==s.id)
-                  .order_by(HRIScore.created_at.desc(),HRIScore.id.desc())
-                  .first())
-        out.append({
-            "segment_id":s.id,
-            "pipeline_id":s.pipeline_id,
-            "start_km":s.start_km,
-            "end_km":s.end_km,
-            "hri":latest.hri if latest else None,
-            "readiness_class":latest.readiness_class if latest else None,
-            "pillars":{
-                "M":latest.m,"D":latest.d,"I":latest.i,"C":latest.c,
-                "E":latest.e,"Q":latest.q,"O":latest.o,
-            } if latest else None,
-        })
-    return out
+async def latest_scores(request:Request,response:Response,pipeline_id:str|None=None,region:str|None=None,
+                        readiness_class:List[str]|None=Query(None),hri_min:float|None=None,hri_max:float|None=None,
+                        km_min:float|None=None,km_max:float|None=None,fields:str|None=None,cursor:str|None=None,
+                        limit:int|None=None,db:AsyncSession=Depends(get_async_db)):
+    """Latest score per segment. Every match without limit or cursor; otherwise one keyset page, follow X-Next-Cursor (or Link rel=next) for more."""
+    limit=page_size(cursor,limit)
+    want=projection(fields,LATEST_FIELDS)
+    items,nxt=await latest_page_async(db,cursor,limit,pipeline_id=pipeline_id,region=region,classes=readiness_class,
+                                      hri_min=hri_min,hri_max=hri_max,km_min=km_min,km_max=km_max)
+    return respond(request,response,items,nxt,want)
@@ -1,7 +1,11 @@
-from fastapi import APIRouter,Depends,HTTPException
+from fastapi import APIRouter,Depends,HTTPException,Request,Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.db.database import get_db
+from app.db.database import get_db,get_async_db
 from app.db.models import Segment,Pipeline,SegmentInputs
+from app.db.lrs import overlapping
+from app.db.paging import keyset,page,page_size,projection,respond,segment_filters
 from app.schemas import SegmentCreate,SegmentInputsUpsert
 
 router=APIRouter()
@@ -12,26 +16,40 @@ def create_segment(payload:SegmentCreate,db:Session=Depends(get_db)):
         raise HTTPException(status_code=404,detail="Pipeline not found")
     if db.get(Segment,payload.id):
         raise HTTPException(status_code=400,detail="Segment already exists")
+    if payload.end_km<=payload.start_km:
+        raise HTTPException(status_code=400,detail="end_km must be greater than start_km")
+    clash=overlapping(db,payload.pipeline_id,payload.start_km,payload.end_km)
+    if clash:
+        raise HTTPException(status_code=409,detail=f"overlaps segment(s) {', '.join(clash[:10])}")
     s=Segment(**payload.model_dump())
     db.add(s); db.add(SegmentInputs(segment_id=s.id)); db.commit()
     return {"ok":True,"segment_id":s.id}
 
+SEGMENT_FIELDS=("id","pipeline_id","start_km","end_km")
+SEGMENT_ORDER=(Segment.pipeline_id,Segment.start_km,Segment.id)
+
 @router.get("")
-def list_segments(pipeline_id:str|None=None,db:Session=Depends(get_db)):
-    q=db.query(Segment)
-    if pipeline_id:
-        q=q.filter(Segment.pipeline_id==pipeline_id)
-    segs=q.all()
-    return [{"id":s.id,"pipeline_id":s.pipeline_id,"start_km":s.start_km,"end_km":s.end_km} for s in segs]
+async def list_segments(request:Request,response:Response,pipeline_id:str|None=None,region:str|None=None,
+                        km_min:float|None=None,km_max:float|None=None,fields:str|None=None,cursor:str|None=None,
+                        limit:int|None=None,db:AsyncSession=Depends(get_async_db)):
+    """Segments in (pipeline_id, start_km, id) order. Every match without limit or cursor; otherwise one keyset page, follow X-Next-Cursor for more."""
+    limit=page_size(cursor,limit)
+    want=projection(fields,SEGMENT_FIELDS)
+    q=segment_filters(select(Segment.id,Segment.pipeline_id,Segment.start_km,Segment.end_km),
+                      pipeline_id,region,km_min,km_max)
+    segs=(await db.execute(keyset(q,SEGMENT_ORDER,cursor,limit))).all()
+    segs,nxt=page(segs,limit,lambda s:(s.pipeline_id,s.start_km,s.id))
+    items=[{"id":s.id,"pipeline_id":s.pipeline_id,"start_km":s.start_km,"end_km":s.end_km} for s in segs]
+    return respond(request,response,items,nxt,want)
 
 @router.get("/{segment_id}/inputs")
-def get_inputs(segment_id:str,db:Session=Depends(get_db)):
-    seg=db.get(Segment,segment_id)
+async def get_inputs(segment_id:str,db:AsyncSession=Depends(get_async_db)):
+    seg=await db.get(Segment,segment_id)
     if not seg:
         raise HTTPException(status_code=404,detail="Segment not found")
-    inp=db.get(SegmentInputs,segment_id)
+    inp=await db.get(SegmentInputs,segment_id)
     if not inp:
-        inp=SegmentInputs(segment_id=segment_id); db.add(inp); db.commit(); db.refresh(inp)
+        inp=SegmentInputs(segment_id=segment_id); db.add(inp); await db.commit(); await db.refresh(inp)
     data={c.name:getattr(inp,c.name) for c in inp.__table__.columns}
     return {"segment_id":segment_id,"inputs":data}
 
@@ -41,8 +59,11 @@ def upsert_inputs(segment_id:str,payload:SegmentInputsUpsert,db:Session=Depends(
         raise HTTPException(status_code=404,detail="Segment not found")
     inp=db.get(SegmentInputs,segment_id)
     if not inp:
-        inp=SegmentInputs(segment_id=segment_id); db.add(inp)
-    for k,v in payload.model_dump().items():
-        setattr(inp,k,v)
+        inp=SegmentInputs(segment_id=segment_id,revision=0); db.add(inp)
+    changed=[k for k,v in payload.model_dump().items() if getattr(inp,k)!=v]
+    for k in changed:
+        setattr(inp,k,getattr(payload,k))
+    if changed:
+        inp.revision=(inp.revision or 0)+1
     db.commit()
-    return {"ok":True}
+    return {"ok":True,"changed":changed,"revision":inp.revision}
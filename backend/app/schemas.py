@@ -1,5 +1,6 @@
+from datetime import datetime
 from pydantic import BaseModel
-from typing import Optional,Dict,List
+from typing import Optional,Dict,List,Any
 
 class PipelineCreate(BaseModel):
     id:str
@@ -67,3 +68,367 @@ class BulkUpsertResult(BaseModel):
     inputs_upserted:int
     rows_processed:int
     errors:List[str]
+    warnings:List[str]=[]
+
+class SegmentLocation(BaseModel):
+    km:float
+    segment_id:Optional[str]=None
+    distance_km:Optional[float]=None
+
+class SegmentProblem(BaseModel):
+    kind:str
+    segment_id:str
+    other_id:Optional[str]=None
+    start_km:float
+    end_km:float
+    length_km:Optional[float]=None
+
+class IliIngestResult(BaseModel):
+    features_read:int
+    features_assigned:int
+    features_unmatched:int
+    cracks:int
+    metal_loss:int
+    pipelines:int
+    segments_updated:int
+    updated_pipelines:List[str]
+    rescore_jobs:List[str]=[]
+    errors:List[str]
+
+class CpIngestResult(BaseModel):
+    readings_read:int
+    readings_assigned:int
+    readings_unmatched:int
+    readings_overprotected:int
+    overprotect_threshold_v:float
+    pipelines:int
+    segments_updated:int
+    updated_pipelines:List[str]
+    rescore_jobs:List[str]=[]
+    errors:List[str]
+
+class ScadaTagIn(BaseModel):
+    tag:str
+    pipeline_id:str
+    start_km:float
+    end_km:float
+
+class ScadaTagStats(BaseModel):
+    tag:str
+    hours:float
+    samples:int
+    cycles_per_day:float
+    cycle_range_bar:float
+    surge_events_per_year:float
+    dpdt_p95_bar_per_s:float
+
+class ScadaIngestResult(BaseModel):
+    samples_read:int
+    samples_used:int
+    samples_invalid:int
+    samples_out_of_order:int
+    tags:List[ScadaTagStats]
+    tags_unmapped:List[str]
+    tags_short:List[str]
+    pipelines:int
+    segments_updated:int
+    updated_pipelines:List[str]
+    rescore_jobs:List[str]=[]
+    errors:List[str]
+
+class RescoreResult(BaseModel):
+    segments_scored:int
+    segments_unchanged:int=0
+    history_deduplicated:int=0
+    chunks:int
+    model_version:str
+    class_counts:Dict[str,int]
+    elapsed_s:float
+
+class MlModelOut(BaseModel):
+    model_version:str
+    name:str
+    version:str
+    kind:str
+    features:List[str]
+    sha256:str
+
+class MlRegistryOut(BaseModel):
+    path:str
+    models:List[MlModelOut]
+    errors:Dict[str,str]
+
+class RulesetOut(BaseModel):
+    version:str
+    weights:Dict[str,float]
+    previous_version:Optional[str]=None
+
+class ShadowRequest(BaseModel):
+    """Candidate penalties.yaml contents, scored against the active ruleset over the scope (whole portfolio if none)."""
+    penalties:str
+    segment_ids:Optional[List[str]]=None
+    pipeline_id:Optional[str]=None
+    region:Optional[str]=None
+    top:Optional[int]=None
+
+class ClassChange(BaseModel):
+    from_class:str
+    to_class:str
+    segments:int
+    km:float
+
+class DeltaBucket(BaseModel):
+    min_delta:Optional[float]=None
+    max_delta:Optional[float]=None
+    segments:int
+    km:float
+
+class GateDiff(BaseModel):
+    active:int
+    candidate:int
+    triggered:int
+    cleared:int
+    triggered_km:float
+
+class ShadowSegment(BaseModel):
+    segment_id:str
+    pipeline_id:str
+    km:float
+    hri_active:float
+    hri_candidate:float
+    delta_hri:float
+    class_active:str
+    class_candidate:str
+    gates_triggered:List[str]
+
+class ShadowOut(BaseModel):
+    active_version:str
+    candidate_version:str
+    model_version:str
+    elapsed_s:float
+    segments:int
+    km:float
+    segments_unchanged:int
+    segments_changing_class:int
+    km_changing_class:float
+    hri_active:Optional[float]=None
+    hri_candidate:Optional[float]=None
+    class_changes:List[ClassChange]
+    hri_delta_buckets:List[DeltaBucket]
+    pillars:Dict[str,Dict[str,Optional[float]]]
+    gates:Dict[str,GateDiff]
+    largest_changes:List[ShadowSegment]
+
+class FieldDistribution(BaseModel):
+    """Spread around the stored value (or ``value``): sd absolute, cv relative; lognormal uses cv as log-space sigma."""
+    dist:str="normal"
+    sd:Optional[float]=None
+    cv:Optional[float]=None
+    value:Optional[float]=None
+    min:Optional[float]=None
+    max:Optional[float]=None
+
+class UncertaintyRequest(BaseModel):
+    draws:Optional[int]=None
+    seed:Optional[int]=None
+    distributions:Optional[Dict[str,FieldDistribution]]=None
+    percentiles:List[float]=[5,50,95]
+
+class SegmentUncertainty(BaseModel):
+    segment_id:str
+    hri_deterministic:float
+    readiness_class_deterministic:str
+    hri_mean:float
+    hri_std:float
+    hri_percentiles:Dict[str,float]
+    class_probabilities:Dict[str,float]
+    gate_probabilities:Dict[str,float]
+
+class UncertaintyOut(BaseModel):
+    draws:int
+    seed:int
+    ruleset_version:str
+    distributions:Dict[str,Dict[str,Any]]
+    elapsed_s:float
+    segments:List[SegmentUncertainty]
+
+class ScenarioIn(BaseModel):
+    """Overlay on stored inputs: set (any field, null clears), then scale, add, floor and cap numeric fields."""
+    name:str
+    set:Dict[str,Any]={}
+    scale:Dict[str,float]={}
+    add:Dict[str,float]={}
+    floor:Dict[str,float]={}
+    cap:Dict[str,float]={}
+
+class ScenarioRequest(BaseModel):
+    scenarios:List[ScenarioIn]
+    segment_ids:Optional[List[str]]=None
+    pipeline_id:Optional[str]=None
+    region:Optional[str]=None
+    detail:bool=False
+    with_drivers:bool=False
+
+class ScenarioSegment(BaseModel):
+    segment_id:str
+    hri:float
+    readiness_class:str
+    delta_hri:float
+    pillars:Dict[str,float]
+    drivers:Optional[List[str]]=None
+
+class ScenarioSummary(BaseModel):
+    name:str
+    segments:int
+    mean_hri:float
+    min_hri:Optional[float]=None
+    mean_delta_hri:float
+    segments_improved:int
+    segments_worsened:int
+    class_counts:Dict[str,int]
+    gate_counts:Dict[str,int]
+    results:Optional[List[ScenarioSegment]]=None
+
+class ScenarioOut(BaseModel):
+    ruleset_version:str
+    segments:int
+    elapsed_s:float
+    baseline:ScenarioSummary
+    scenarios:List[ScenarioSummary]
+
+class PlanIntervention(ScenarioIn):
+    """A fundable mitigation: its effect as a scenario overlay and its capex per km plus per segment."""
+    cost_per_km:float=0.0
+    cost_per_segment:float=0.0
+
+class PlanRequest(BaseModel):
+    interventions:List[PlanIntervention]
+    budget:float
+    objective:str="hri_km"
+    max_per_segment:int=1
+    segment_ids:Optional[List[str]]=None
+    pipeline_id:Optional[str]=None
+    region:Optional[str]=None
+
+class PlannedSegment(BaseModel):
+    segment_id:str
+    pipeline_id:str
+    km:float
+    interventions:List[str]
+    cost:float
+    hri:float
+    new_hri:float
+    gain_hri:float
+    readiness_class:str
+    new_readiness_class:str
+    objective_gain:float
+
+class PlanSpend(BaseModel):
+    name:str
+    segments:int
+    km:float
+    cost:float
+
+class PlanOut(BaseModel):
+    ruleset_version:str
+    objective:str
+    budget:float
+    spent:float
+    objective_value:float
+    upper_bound:float
+    segments:int
+    km:float
+    options_evaluated:int
+    hri_before:Optional[float]=None
+    hri_after:Optional[float]=None
+    km_lifted_from_not_ready:float
+    elapsed_s:float
+    by_intervention:List[PlanSpend]
+    segments_planned:List[PlannedSegment]
+
+class Intervention(BaseModel):
+    """Moving ``field`` to ``target`` (for numeric fields: to a value meeting ``condition``, e.g. "< 25") gains gain_hri."""
+    segment_id:str
+    field:str
+    pillar:Optional[str]=None
+    current:Any=None
+    target:Any=None
+    condition:Optional[str]=None
+    hri:float
+    new_hri:float
+    gain_hri:float
+    new_readiness_class:str
+    gates_released:List[str]
+
+class FieldGain(BaseModel):
+    field:str
+    pillar:Optional[str]=None
+    segments:int
+    total_gain_hri:float
+    max_gain_hri:float
+    gates_released:int
+
+class SensitivityOut(BaseModel):
+    ruleset_version:str
+    segments:int
+    elapsed_s:float
+    interventions:List[Intervention]
+    by_field:List[FieldGain]
+
+class DriverStat(BaseModel):
+    pillar:Optional[str]=None
+    rule:str
+    band:Optional[int]=None
+    label:Optional[str]=None
+    segments:int
+    km:float
+    mean_penalty:float
+    max_penalty:float
+
+class DriverSummaryOut(BaseModel):
+    ruleset_version:str
+    by:str
+    drivers:List[DriverStat]
+
+class Rollup(BaseModel):
+    """Km-weighted aggregate of current scores; key is the pipeline, region or operator (None for the portfolio)."""
+    key:Optional[str]=None
+    segments:int
+    km:float
+    hri:Optional[float]=None
+    class_km:Dict[str,float]
+    class_share:Dict[str,Optional[float]]
+    pillars:Dict[str,Optional[float]]
+    gate_counts:Dict[str,int]
+
+class RollupsOut(BaseModel):
+    by:str
+    groups:List[Rollup]
+
+class JobCreate(BaseModel):
+    """kind is rescore, rescore_stale, ml_rescore (needs model_version), uncertainty or compact_history; scope is pipeline_id and/or region (portfolio if none)."""
+    kind:str
+    pipeline_id:Optional[str]=None
+    region:Optional[str]=None
+    force:bool=False
+    model_version:Optional[str]=None
+    uncertainty:Optional[UncertaintyRequest]=None
+    full_days:Optional[int]=None
+    keep_days:Optional[int]=None
+    dry_run:bool=False
+
+class JobOut(BaseModel):
+    id:str
+    kind:str
+    status:str
+    params:Dict[str,Any]
+    segments_total:int
+    segments_done:int
+    chunks_total:int
+    chunks_done:int
+    progress:float
+    cancel_requested:bool
+    error:Optional[str]=None
+    created_at:Optional[datetime]=None
+    started_at:Optional[datetime]=None
+    finished_at:Optional[datetime]=None
@@ -0,0 +1,317 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Dict,Any,List,Mapping,Iterable,Optional,Sequence,Tuple
+import numpy as np
+from app.scoring.rules import Band,Code,Flag,Ruleset,active,gate_code
+
+NUMERIC_FIELDS=(
+    "smys_mpa","yt_ratio","hardness_haz_hv","ki_mpa_sqrtm","kth_mpa_sqrtm",
+    "stress_ratio","cycles_per_day","cycle_range_bar","surge_events_per_year","dpdt_p95_bar_per_s",
+    "temp_min_c","temp_max_c",
+    "max_metal_loss_pct","crack_density_per_km","max_crack_length_mm",
+    "coating_age_years","dcvg_anomaly_pct","cp_potential_avg_v","cp_overprotect_pct",
+    "soil_resistivity_ohm_cm","soil_ph",
+    "ili_coverage_pct","cp_survey_age_months","scada_uptime_pct","missing_fields_pct",
+)
+TEXT_FIELDS=("api_grade","seam_type","coating_type","mic_risk","stray_current_risk")
+BOOL_FIELDS=(
+    "repair_backlog_high","moisture_high",
+    "has_h2_plan","h2_sensors","operating_procedure_updated","leak_detection_enhanced","training_complete",
+)
+FIELDS=NUMERIC_FIELDS+TEXT_FIELDS+BOOL_FIELDS
+PILLARS=("M","D","I","C","E","Q","O")
+
+@dataclass
+class BatchResult:
+    """Columnar output of compute_hri_batch; row i matches compute_hri on row i."""
+    hri:np.ndarray
+    readiness_class:np.ndarray
+    pillars:Dict[str,np.ndarray]
+    gates:Dict[str,np.ndarray]
+    drivers:Optional[List[List[Code]]]=None
+
+    def __len__(self)->int:
+        return len(self.hri)
+
+    def row(self,i:int)->Tuple[float,str,Dict[str,float],List[Code]]:
+        pillars={k:float(v[i]) for k,v in self.pillars.items()}
+        drivers=self.drivers[i] if self.drivers is not None else []
+        return float(self.hri[i]),str(self.readiness_class[i]),pillars,drivers
+
+def to_columns(rows:Iterable[Mapping[str,Any]])->Dict[str,List[Any]]:
+    """Pivot row dicts (e.g. SegmentInputs column dicts) into per-field lists."""
+    rows=list(rows)
+    return {f:[r.get(f) for r in rows] for f in FIELDS}
+
+def _length(cols:Mapping[str,Any])->int:
+    for f in FIELDS:
+        if f in cols and cols[f] is not None:
+            return len(cols[f])
+    raise ValueError("compute_hri_batch needs at least one SegmentInputs column")
+
+def _num(cols:Mapping[str,Any],name:str,n:int)->np.ndarray:
+    col=cols[name] if name in cols else None
+    if col is None:
+        return np.full(n,np.nan)
+    arr=np.asarray(col)
+    if arr.dtype.kind in "fiub":
+        return arr.astype(float,copy=False)
+    return np.array([np.nan if v is None else v for v in col],dtype=float)
+
+def _raw(cols:Mapping[str,Any],name:str,num:np.ndarray)->List[Any]:
+    """Column values as Python scalars in their original type, falling back to ``num`` (from _num) when absent."""
+    col=cols[name] if name in cols else None
+    if col is None:
+        return num.tolist()
+    return np.asarray(col,dtype=object).tolist()
+
+def _bool(cols:Mapping[str,Any],name:str,n:int)->np.ndarray:
+    col=cols[name] if name in cols else None
+    if col is None:
+        return np.zeros(n,dtype=bool)
+    arr=np.asarray(col)
+    if arr.dtype.kind=="b":
+        return arr
+    return np.array([bool(v) for v in col],dtype=bool)
+
+def _text(cols:Mapping[str,Any],name:str,n:int)->Tuple[np.ndarray,np.ndarray]:
+    """Factorize a text column into (unique values, codes); None maps to ''."""
+    col=cols[name] if name in cols else None
+    if col is None:
+        return np.array([""]),np.zeros(n,dtype=np.intp)
+    vals=col if isinstance(col,np.ndarray) and col.dtype.kind=="U" else np.array([v or "" for v in col],dtype=str)
+    return np.unique(vals,return_inverse=True)
+
+def prepare_columns(cols:Mapping[str,Any])->Dict[str,Any]:
+    """Convert input columns to the arrays the pillar functions use, once, for scoring the same chunk repeatedly."""
+    n=_length(cols)
+    out=dict(cols)
+    for f in NUMERIC_FIELDS:
+        out[f]=_num(cols,f,n)
+    for f in BOOL_FIELDS:
+        out[f]=_bool(cols,f,n)
+    for f in TEXT_FIELDS:
+        col=cols[f] if f in cols else None
+        out[f]=np.array([v or "" for v in col] if col is not None else [""]*n,dtype=str)
+    return out
+
+class _Pillar:
+    """Accumulates one pillar's score column and the rule hits needed to render drivers."""
+    def __init__(self,n:int):
+        self.s=np.ones(n)
+        self.hits:List[Tuple[np.ndarray,Tuple[Optional[Code],...]]]=[]
+        self.pens:List[np.ndarray]=[]
+
+    def apply(self,idx:np.ndarray,pens:Sequence[float],codes:Sequence[Optional[Code]]):
+        """Subtract pens[idx] in rule order; index -1 selects an appended 0.0 (no penalty)."""
+        table=np.array([max(p,0.0) for p in pens]+[0.0])
+        pen=table[idx]
+        self.s=self.s-pen
+        self.pens.append(pen)
+        self.hits.append((idx,tuple(codes)+(None,)))
+
+    def band(self,band:Band,x:np.ndarray,where:Optional[np.ndarray]=None):
+        idx=band.match_array(x)
+        self.apply(idx if where is None else np.where(where,idx,-1),band.pens,band.codes)
+
+    def flags(self,idx:np.ndarray,flags:Sequence[Flag]):
+        self.apply(idx,[f.pen for f in flags],[f.code for f in flags])
+
+    def flag(self,mask:np.ndarray,flag:Flag):
+        self.flags(np.where(mask,0,-1),[flag])
+
+    def score(self)->np.ndarray:
+        return np.maximum(0.0,np.minimum(1.0,self.s))
+
+    def render(self,i:int)->List[Code]:
+        # Rules with non-positive penalties have no code and are skipped, like engine._add.
+        return [c for idx,codes in self.hits if (c:=codes[idx[i]]) is not None]
+
+def _lookup(uniq:np.ndarray,codes:np.ndarray,fn)->np.ndarray:
+    """Evaluate fn once per distinct text value and broadcast the rule index back to rows."""
+    return np.array([fn(u) for u in uniq.tolist()],dtype=np.intp)[codes]
+
+def _batch_M(cols,n,rs:Ruleset)->_Pillar:
+    p=_Pillar(n)
+    p.band(rs.bands["M.hardness"],_num(cols,"hardness_haz_hv",n))
+    p.band(rs.bands["M.yt_ratio"],_num(cols,"yt_ratio",n))
+    def seam(v:str)->int:
+        v=v.lower()
+        if "pre1970" in v or "vintage" in v: return 0
+        if "erw" in v: return 1
+        return -1
+    uniq,codes=_text(cols,"seam_type",n)
+    p.flags(_lookup(uniq,codes,seam),[rs.flags["M.seam_pre1970"],rs.flags["M.seam_erw"]])
+    return p
+
+def _batch_D(cols,n,rs:Ruleset)->_Pillar:
+    p=_Pillar(n)
+    p.band(rs.bands["D.stress_ratio"],_num(cols,"stress_ratio",n))
+    cycles=_num(cols,"cycles_per_day",n)
+    rng=_num(cols,"cycle_range_bar",n)
+    both=~np.isnan(cycles)&~np.isnan(rng)
+    cyc=np.full(n,-1,dtype=np.intp)
+    with np.errstate(invalid="ignore"):
+        for j in range(len(rs.cycling)-1,-1,-1):
+            cmin,rmin,_=rs.cycling[j]
+            cyc=np.where((cycles>=cmin)&(rng>=rmin),j,cyc)
+    p.flags(np.where(both,cyc,-1),[f for _,_,f in rs.cycling])
+    p.band(rs.bands["D.range_only"],rng,where=~both)
+    p.band(rs.bands["D.surges"],_num(cols,"surge_events_per_year",n))
+    p.band(rs.bands["D.dpdt"],_num(cols,"dpdt_p95_bar_per_s",n))
+    return p
+
+def _batch_I(cols,n,rs:Ruleset)->_Pillar:
+    p=_Pillar(n)
+    p.band(rs.bands["I.crack_density"],_num(cols,"crack_density_per_km",n))
+    p.band(rs.bands["I.crack_len"],_num(cols,"max_crack_length_mm",n))
+    p.band(rs.bands["I.metal_loss"],_num(cols,"max_metal_loss_pct",n))
+    p.flag(_bool(cols,"repair_backlog_high",n),rs.flags["I.backlog"])
+    return p
+
+def _batch_C(cols,n,rs:Ruleset)->_Pillar:
+    p=_Pillar(n)
+    def ctype(v:str)->int:
+        v=v.lower()
+        for j,(k,_) in enumerate(rs.coating):
+            if k in v: return j
+        return -1
+    uniq,codes=_text(cols,"coating_type",n)
+    p.flags(_lookup(uniq,codes,ctype),[f for _,f in rs.coating])
+    p.band(rs.bands["C.coating_age"],_num(cols,"coating_age_years",n))
+    p.band(rs.bands["C.dcvg"],_num(cols,"dcvg_anomaly_pct",n))
+    p.band(rs.bands["C.overprot"],_num(cols,"cp_overprotect_pct",n))
+    scr=rs.flags["C.pot_screen"]
+    with np.errstate(invalid="ignore"):
+        p.flag(_num(cols,"cp_potential_avg_v",n)<=scr.at,scr)
+    return p
+
+def _level(p:_Pillar,cols,n:int,field:str,table:Dict[str,Flag]):
+    """Categorical low/medium/high risk lookup; missing values count as 'low'."""
+    keys=list(table)
+    uniq,codes=_text(cols,field,n)
+    levels=[(u or "low").lower() for u in uniq.tolist()]
+    p.flags(np.array([keys.index(v) if v in table else -1 for v in levels],dtype=np.intp)[codes],
+            [table[k] for k in keys])
+
+def _batch_E(cols,n,rs:Ruleset)->_Pillar:
+    p=_Pillar(n)
+    p.band(rs.bands["E.resistivity"],_num(cols,"soil_resistivity_ohm_cm",n))
+    ph=_num(cols,"soil_ph",n)
+    acid,alk=rs.flags["E.ph_acid"],rs.flags["E.ph_alk"]
+    with np.errstate(invalid="ignore"):
+        p.flags(np.where(ph<=acid.at,0,np.where(ph>=alk.at,1,-1)),[acid,alk])
+    _level(p,cols,n,"mic_risk",rs.mic)
+    p.flag(_bool(cols,"moisture_high",n),rs.flags["E.moist"])
+    _level(p,cols,n,"stray_current_risk",rs.stray)
+    return p
+
+def _batch_Q(cols,n,rs:Ruleset)->_Pillar:
+    p=_Pillar(n)
+    p.band(rs.bands["Q.ili"],_num(cols,"ili_coverage_pct",n))
+    p.band(rs.bands["Q.cp_age"],_num(cols,"cp_survey_age_months",n))
+    p.band(rs.bands["Q.scada"],_num(cols,"scada_uptime_pct",n))
+    p.band(rs.bands["Q.missing"],_num(cols,"missing_fields_pct",n))
+    return p
+
+def _batch_O(cols,n,rs:Ruleset)->_Pillar:
+    p=_Pillar(n)
+    for field,key in (("has_h2_plan","O.no_plan"),("h2_sensors","O.no_sensors"),
+                      ("operating_procedure_updated","O.no_proc"),("leak_detection_enhanced","O.no_leak"),
+                      ("training_complete","O.no_training")):
+        p.flag(~_bool(cols,field,n),rs.flags[key])
+    return p
+
+BATCH_PILLARS={"M":_batch_M,"D":_batch_D,"I":_batch_I,"C":_batch_C,"E":_batch_E,"Q":_batch_Q,"O":_batch_O}
+# SegmentInputs fields each pillar reads; ki/kth only feed the gate, the rest are not scored.
+PILLAR_FIELDS={
+    "M":("hardness_haz_hv","yt_ratio","seam_type"),
+    "D":("stress_ratio","cycles_per_day","cycle_range_bar","surge_events_per_year","dpdt_p95_bar_per_s"),
+    "I":("crack_density_per_km","max_crack_length_mm","max_metal_loss_pct","repair_backlog_high"),
+    "C":("coating_type","coating_age_years","dcvg_anomaly_pct","cp_overprotect_pct","cp_potential_avg_v"),
+    "E":("soil_resistivity_ohm_cm","soil_ph","mic_risk","moisture_high","stray_current_risk"),
+    "Q":("ili_coverage_pct","cp_survey_age_months","scada_uptime_pct","missing_fields_pct"),
+    "O":("has_h2_plan","h2_sensors","operating_procedure_updated","leak_detection_enhanced","training_complete"),
+}
+GATE_FIELDS=("ki_mpa_sqrtm","kth_mpa_sqrtm")
+CLASSES=("Not Ready","Conditionally Ready","Ready with Controls","Fully Ready")
+
+def score_pillars(cols:Mapping[str,Any],n:int,rs:Ruleset,pillars:Iterable[str]=PILLARS)->Dict[str,np.ndarray]:
+    """Clamped pillar scores before gating, for a subset of pillars."""
+    return {k:BATCH_PILLARS[k](cols,n,rs).score() for k in pillars}
+
+def rule_penalties(cols:Mapping[str,Any],n:int,rs:Ruleset,pillars:Iterable[str]=PILLARS)->Dict[str,List[np.ndarray]]:
+    """Per pillar, the penalty column of each rule in application order (a pillar is 1 minus them in turn)."""
+    return {k:BATCH_PILLARS[k](cols,n,rs).pens for k in pillars}
+
+def apply_gates(pillars:Dict[str,np.ndarray],ki:np.ndarray,kth:np.ndarray,rs:Ruleset,hri:Optional[np.ndarray]=None
+                )->Tuple[np.ndarray,Dict[str,np.ndarray],np.ndarray]:
+    """Weight clamped pillar scores into an unrounded HRI and apply the K_I/K_TH, integrity and data-quality gates.
+
+    A given ``hri`` (e.g. an ML model's prediction) is gated instead of the weighted pillars.
+    Caps pillars["M"] in place and returns (hri, gates, M before the K gate).
+    """
+    if hri is None:
+        hri=np.zeros(len(ki))
+        for k,w in rs.weights.items():
+            hri=hri+w*pillars[k]
+        hri=100.0*hri
+    with np.errstate(invalid="ignore"):
+        ki_gate=~np.isnan(ki)&~np.isnan(kth)&(ki>kth)
+    old_m=pillars["M"]
+    pillars["M"]=np.where(ki_gate,np.minimum(old_m,0.30),old_m)
+    hri=np.where(ki_gate&(hri>40.0),40.0,hri)
+    i_gate=(pillars["I"]<0.30)&(hri>40.0)
+    hri=np.where(i_gate,40.0,hri)
+    q_gate=(pillars["Q"]<0.40)&(hri>50.0)
+    hri=np.where(q_gate,50.0,hri)
+    return hri,{"ki_kth":ki_gate,"integrity":i_gate,"data_quality":q_gate},old_m
+
+def round_hri(hri:np.ndarray)->np.ndarray:
+    # Python's round() is correctly rounded whereas np.round scales by 100 first;
+    # keep the scalar semantics so results stay bit-identical.
+    return np.array([round(h,2) for h in hri.tolist()],dtype=float)
+
+def readiness_code_batch(hri:np.ndarray)->np.ndarray:
+    """Index into CLASSES, including readiness_class's 40 < hri < 41 fall-through to 'Fully Ready'."""
+    return np.select([hri<=40,(hri>=41)&(hri<=69),(hri>=70)&(hri<=85)],[0,1,2],default=3)
+
+def readiness_class_batch(hri:np.ndarray)->np.ndarray:
+    """Vectorized readiness_class."""
+    return np.array(CLASSES,dtype=object)[readiness_code_batch(hri)]
+
+def compute_hri_batch(cols:Mapping[str,Any],with_drivers:bool=False,rs:Optional[Ruleset]=None)->BatchResult:
+    """Score many segments at once from columnar SegmentInputs fields.
+
+    ``cols`` maps field names to equal-length sequences (lists, NumPy arrays or
+    DataFrame columns); absent fields and None/NaN values are treated as missing.
+    Results are bit-identical to calling compute_hri row by row.
+    """
+    rs=rs or active()
+    n=_length(cols)
+    acc={k:fn(cols,n,rs) for k,fn in BATCH_PILLARS.items()}
+    pillars={k:acc[k].score() for k in PILLARS}
+    ki=_num(cols,"ki_mpa_sqrtm",n)
+    kth=_num(cols,"kth_mpa_sqrtm",n)
+    hri,gates,old_m=apply_gates(pillars,ki,kth,rs)
+    ki_gate,i_gate,q_gate=gates["ki_kth"],gates["integrity"],gates["data_quality"]
+    hri=round_hri(hri)
+
+    drivers=None
+    if with_drivers:
+        drivers=[]
+        # The gate text quotes K_I/K_TH as given (46, not 46.0), like compute_hri.
+        ki_l,kth_l=_raw(cols,"ki_mpa_sqrtm",ki),_raw(cols,"kth_mpa_sqrtm",kth)
+        for r in range(n):
+            d=[]
+            for k in PILLARS:
+                d+=acc[k].render(r)
+            if ki_gate[r]:
+                d.append(gate_code("gate.ki_kth",ki_l[r],kth_l[r],float(old_m[r]),float(pillars["M"][r])))
+            if i_gate[r]:
+                d.append(gate_code("gate.integrity",float(pillars["I"][r])))
+            if q_gate[r]:
+                d.append(gate_code("gate.data_quality",float(pillars["Q"][r])))
+            drivers.append(d)
+
+    return BatchResult(hri=hri,readiness_class=readiness_class_batch(hri),pillars=pillars,gates=gates,drivers=drivers)
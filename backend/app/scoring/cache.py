@@ -0,0 +1,90 @@
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Dict,Any,List,Mapping,Optional,Tuple
+import hashlib,json,threading
+from sqlalchemy.orm import Session
+from app.core.config import SCORE_CACHE_SIZE,SCORE_CACHE_PERSIST
+from app.db.models import ScoreCacheEntry
+from app.db.upsert import upsert
+from app.scoring.batch import NUMERIC_FIELDS,TEXT_FIELDS,BOOL_FIELDS
+from app.scoring.rules import Code,Ruleset
+
+Result=Tuple[float,str,Dict[str,float],List[Code]]
+
+def score_key(inputs:Mapping[str,Any],rs:Ruleset,model_version:str)->str:
+    """Content address of a score: normalized input row + ruleset hash + model version."""
+    row=[None if inputs.get(f) is None else float(inputs[f]) for f in NUMERIC_FIELDS]
+    row+=[inputs.get(f) for f in TEXT_FIELDS]
+    row+=[None if inputs.get(f) is None else bool(inputs[f]) for f in BOOL_FIELDS]
+    raw=json.dumps([model_version,rs.version,row],separators=(",",":"))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+class ScoreCache:
+    """Thread-safe in-process LRU of compute_hri results with hit/miss counters."""
+    def __init__(self,maxsize:int=SCORE_CACHE_SIZE):
+        self.maxsize=maxsize
+        self._data:"OrderedDict[str,Result]"=OrderedDict()
+        self._lock=threading.Lock()
+        self.stats={"hits":0,"persistent_hits":0,"misses":0,"duplicate_inserts_skipped":0}
+
+    def get(self,key:str)->Optional[Result]:
+        with self._lock:
+            hit=self._data.get(key)
+            if hit is not None:
+                self._data.move_to_end(key)
+                self.stats["hits"]+=1
+            return hit
+
+    def put(self,key:str,result:Result):
+        if self.maxsize<=0:
+            return
+        with self._lock:
+            self._data[key]=result
+            self._data.move_to_end(key)
+            while len(self._data)>self.maxsize:
+                self._data.popitem(last=False)
+
+    def count(self,name:str,n:int=1):
+        with self._lock:
+            self.stats[name]+=n
+
+    def snapshot(self)->Dict[str,Any]:
+        with self._lock:
+            return {**self.stats,"size":len(self._data),"maxsize":self.maxsize,"persistent":SCORE_CACHE_PERSIST}
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+CACHE=ScoreCache()
+
+def _copy(r:Result)->Result:
+    return r[0],r[1],dict(r[2]),list(r[3])
+
+def lookup(db:Session,key:str)->Optional[Result]:
+    """LRU first, then the score_cache table when persistence is enabled."""
+    hit=CACHE.get(key)
+    if hit is not None:
+        return _copy(hit)
+    if SCORE_CACHE_PERSIST:
+        row=db.get(ScoreCacheEntry,key)
+        drivers=json.loads(row.drivers_json or "[]") if row is not None else None
+        # Entries written before drivers were codes hold strings; recompute those.
+        if row is not None and not any(isinstance(d,str) for d in drivers):
+            res=(row.hri,row.readiness_class,
+                 {"M":row.m,"D":row.d,"I":row.i,"C":row.c,"E":row.e,"Q":row.q,"O":row.o},
+                 [Code(p,r,b,pen,None if v is None else tuple(v)) for p,r,b,pen,v in drivers])
+            CACHE.put(key,res)
+            CACHE.count("persistent_hits")
+            return _copy(res)
+    CACHE.count("misses")
+    return None
+
+def store(db:Session,key:str,result:Result,model_version:str,ruleset_version:str):
+    CACHE.put(key,_copy(result))
+    if SCORE_CACHE_PERSIST:
+        hri,klass,p,drivers=result
+        upsert(db,ScoreCacheEntry,[{"key":key,"model_version":model_version,"ruleset_version":ruleset_version,
+                                    "hri":hri,"readiness_class":klass,
+                                    "m":p["M"],"d":p["D"],"i":p["I"],"c":p["C"],"e":p["E"],"q":p["Q"],"o":p["O"],
+                                    "drivers_json":json.dumps(drivers[:80])}],["key"])
@@ -0,0 +1,360 @@
+from __future__ import annotations
+from datetime import datetime,timedelta,timezone
+from typing import Any,Callable,Dict,Iterable,List,Optional,Sequence,Set,Tuple
+import json,re,string,threading,time
+from sqlalchemy import select,delete,insert,update,func,and_,bindparam,event
+from sqlalchemy.orm import Session
+from app.core.config import CURRENT_SCORES,HISTORY_FULL_DAYS,HISTORY_KEEP_DAYS,INTERN_CACHE_SIZE
+from app.db.models import Driver,Segment,HRIScore,CurrentScore,CurrentDriver
+from app.db.paging import segment_filters
+from app.db.upsert import upsert
+from app.scoring.rollups import tracked,refresh_rollups
+from app.scoring.rules import Code,GATE_LABEL,GATE_PILLAR,GATE_TEXT,Ruleset,active,render
+
+# Columns two consecutive history rows must share to count as the same score.
+SAME=("model_version","hri","readiness_class","m","d","i","c","e","q","o","driver_ids","gate_values")
+DELETE_BATCH=10000
+
+class Interner:
+    """Process-wide driver <-> id map over the drivers table.
+
+    Keys are (ruleset version, Code) for new scores, since drivers.text is rendered with that
+    ruleset's labels, and the text itself for legacy drivers_json rows. Ids created in a
+    transaction are only cached once it commits, so a rollback never leaves the cache holding
+    an id the database may hand out again. The cache starts over once it holds ``size`` entries.
+    """
+    def __init__(self,size:int=INTERN_CACHE_SIZE):
+        self.size=size
+        self._ids:Dict[Any,int]={}
+        self._texts:Dict[int,str]={}
+        self._lock=threading.Lock()
+
+    def _make_room(self,n:int):
+        if len(self._ids)+n>self.size or len(self._texts)+n>self.size:
+            self._ids.clear()
+            self._texts.clear()
+
+    def clear(self):
+        with self._lock:
+            self._ids.clear()
+            self._texts.clear()
+
+    def learn(self,entries:Iterable[Tuple[Any,int,str]]):
+        entries=list(entries)
+        with self._lock:
+            self._make_room(len(entries))
+            for k,i,t in entries:
+                self._ids[k]=i
+                self._texts[i]=t
+
+    def ids(self,db:Session,keys:Iterable[Any],row:Callable[[Any],Dict[str,Any]])->Dict[Any,int]:
+        """Ids of keys; ``row`` builds the drivers row (text and structured columns) of an unknown key."""
+        pending=db.info.setdefault("interned",{})
+        out:Dict[Any,int]={}
+        missing:Dict[Any,Dict[str,Any]]={}
+        for k in set(keys):
+            hit=self._ids.get(k)
+            if hit is None and k in pending:
+                hit=pending[k][0]
+            if hit is None:
+                missing[k]=row(k)
+            else:
+                out[k]=hit
+        if missing:
+            rows={r["text"]:r for r in missing.values()}
+            upsert(db,Driver,[rows[t] for t in sorted(rows)],["text"])
+            got=dict(db.execute(select(Driver.text,Driver.id).where(Driver.text.in_(list(rows)))).all())
+            for k,r in missing.items():
+                out[k]=got[r["text"]]
+                pending[k]=(out[k],r["text"])
+        return out
+
+    def texts(self,db:Session,ids:Iterable[int])->Dict[int,str]:
+        """Text of each requested id."""
+        out:Dict[int,str]={}
+        missing=[]
+        for i in set(ids):
+            t=self._texts.get(i)
+            if t is None:
+                missing.append(i)
+            else:
+                out[i]=t
+        if missing:
+            rows=db.execute(select(Driver.id,Driver.text).where(Driver.id.in_(missing))).all()
+            pending={i for i,_ in db.info.get("interned",{}).values()}
+            known=[(i,t) for i,t in rows if i not in pending]
+            with self._lock:
+                self._make_room(len(known))
+                self._texts.update(known)
+            out.update(rows)
+        return out
+
+INTERNER=Interner()
+
+@event.listens_for(Session,"after_commit")
+def _promote(session:Session):
+    pending=session.info.pop("interned",None)
+    if pending:
+        INTERNER.learn((k,i,t) for k,(i,t) in pending.items())
+
+@event.listens_for(Session,"after_rollback")
+def _discard(session:Session):
+    session.info.pop("interned",None)
+
+def encode_ids(ids:Sequence[int])->str:
+    return ",".join(map(str,ids))
+
+def decode_ids(s:Optional[str])->List[int]:
+    return [int(x) for x in s.split(",")] if s else []
+
+def code_row(code:Code,rs:Ruleset)->Dict[str,Any]:
+    return {"text":render(code,rs),"pillar":code.pillar,"rule":code.rule,"band":code.band,"penalty":code.penalty}
+
+def text_row(text:str,labels:Dict[str,Tuple[str,int]])->Dict[str,Any]:
+    """drivers row for a legacy driver string, with rule and band recovered from ``labels`` (label -> key) when known."""
+    for rule,t in GATE_TEXT.items():
+        if text.startswith(t[:t.index(" = ")]):
+            return {"text":text,"pillar":GATE_PILLAR[rule],"rule":rule,"band":0,"penalty":0.0}
+    pen,_,label=text.partition(": ")
+    try:
+        penalty=-float(pen)
+    except ValueError:
+        return {"text":text,"pillar":None,"rule":None,"band":None,"penalty":None}
+    rule,band=labels.get(label,(None,None))
+    return {"text":text,"pillar":label.split(":")[0] if ":" in label else None,"rule":rule,"band":band,"penalty":penalty}
+
+def _gate_pattern(template:str)->re.Pattern:
+    return re.compile("".join(re.escape(lit)+("(\\S+?)" if f is not None else "")
+                              for lit,f,_,_ in string.Formatter().parse(template))+"$")
+
+GATE_PATTERNS={rule:_gate_pattern(t) for rule,t in GATE_TEXT.items()}
+
+def _number(s:str)->float:
+    return int(s) if s.lstrip("-").isdigit() else float(s)
+
+def split_gates(drivers:Sequence[str])->Tuple[List[str],Optional[str]]:
+    """Legacy driver strings with each gate message replaced by its GATE_LABEL, plus the gate_values they quoted."""
+    out,g=[],{}
+    for t in drivers:
+        for rule,pat in GATE_PATTERNS.items():
+            hit=pat.match(t)
+            if hit:
+                g[rule]=[_number(v) for v in hit.groups()]
+                t=GATE_LABEL[rule]
+                break
+        out.append(t)
+    return out,json.dumps(g,sort_keys=True) if g else None
+
+def _reverse(rs:Ruleset)->Dict[str,Tuple[str,int]]:
+    out:Dict[str,Tuple[str,int]]={}
+    for k,label in rs.labels.items():
+        out.setdefault(label,k)
+    return out
+
+def driver_ids(db:Session,drivers:Sequence[Sequence[Code]],rs:Ruleset)->List[str]:
+    """Encode each score's driver codes (first 80, as before) as a driver_ids value.
+
+    Gates are interned without their values (see gate_values), so the drivers table stays one row per rule band.
+    """
+    v=rs.version
+    keys=[[(v,c if c.values is None else c._replace(values=None)) for c in d[:80]] for d in drivers]
+    m=INTERNER.ids(db,(k for d in keys for k in d),lambda k:code_row(k[1],rs))
+    return [encode_ids([m[k] for k in d]) for d in keys]
+
+def gate_values(drivers:Sequence[Sequence[Code]])->List[Optional[str]]:
+    """The gate_values column of each score: JSON {rule: [values]} of its triggered gates, None without gates."""
+    out:List[Optional[str]]=[]
+    for d in drivers:
+        g={c.rule:list(c.values) for c in d if c.values is not None}
+        out.append(json.dumps(g,sort_keys=True) if g else None)
+    return out
+
+def text_ids(db:Session,drivers:Sequence[Sequence[str]])->List[str]:
+    """driver_ids for legacy driver strings."""
+    labels=_reverse(active())
+    m=INTERNER.ids(db,(t for d in drivers for t in d[:80]),lambda t:text_row(t,labels))
+    return [encode_ids([m[t] for t in d[:80]]) for d in drivers]
+
+GATE_RULE={t:r for r,t in GATE_LABEL.items()}
+
+def _gate_text(text:str,values:Dict[str,List[Any]])->str:
+    rule=GATE_RULE.get(text)
+    return GATE_TEXT[rule].format(*values[rule]) if rule in values else text
+
+def load_drivers(db:Session,rows:Sequence[Tuple[Optional[str],Optional[str],Optional[str]]])->List[List[str]]:
+    """Driver strings of stored scores from (driver_ids, drivers_json, gate_values); legacy rows only have the JSON.
+
+    Gate labels get the score's own values back here, at the edge.
+    """
+    ids=[None if a is None else decode_ids(a) for a,_,_ in rows]
+    texts=INTERNER.texts(db,[i for x in ids if x for i in x])
+    out=[]
+    for x,(_,j,g) in zip(ids,rows):
+        if x is None:
+            out.append(json.loads(j or "[]"))
+        else:
+            values=json.loads(g) if g else {}
+            out.append([_gate_text(texts[i],values) for i in x])
+    return out
+
+def link_drivers(db:Session,rows:Sequence[Tuple[str,Optional[str]]]):
+    """Replace the current_drivers links of these segments from their current (segment_id, driver_ids)."""
+    if not CURRENT_SCORES or not rows:
+        return
+    db.execute(delete(CurrentDriver).where(CurrentDriver.segment_id.in_([s for s,_ in rows])))
+    links=[{"segment_id":s,"driver_id":i} for s,ids in rows for i in sorted(set(decode_ids(ids)))]
+    if links:
+        db.execute(insert(CurrentDriver),links)
+
+def refresh_current_drivers(db:Session,segments=None):
+    """Rebuild current_drivers from current_scores.driver_ids (for the segment ids selected by ``segments``).
+
+    A partial rebuild keeps pipeline rollups in step (gate counts come from the links); a full one leaves them to the caller.
+    """
+    stmt=select(CurrentScore.segment_id,CurrentScore.driver_ids)
+    if segments is None:
+        db.execute(delete(CurrentDriver))
+    else:
+        stmt=stmt.where(CurrentScore.segment_id.in_(segments))
+    rows=db.execute(stmt).all()
+    for s in range(0,len(rows),DELETE_BATCH):
+        part=rows[s:s+DELETE_BATCH]
+        if segments is None:
+            link_drivers(db,part)
+            continue
+        with tracked(db,[sid for sid,_ in part]):
+            link_drivers(db,part)
+    db.commit()
+
+def classify_drivers(db:Session)->int:
+    """Fill rule/band columns of drivers rows interned as plain text, against the active ruleset's labels.
+
+    Rollups are rebuilt when a gate turns up, since gate counts are read from classified drivers.
+    """
+    old=db.execute(select(Driver.id,Driver.text).where(Driver.rule.is_(None),Driver.pillar.is_(None))).all()
+    if not old:
+        return 0
+    labels=_reverse(active())
+    rows=[{"did":i,**{k:v for k,v in text_row(t,labels).items() if k!="text"}} for i,t in old]
+    d=Driver.__table__.c
+    db.execute(update(Driver.__table__).where(d.id==bindparam("did"))
+               .values(pillar=bindparam("pillar"),rule=bindparam("rule"),band=bindparam("band"),penalty=bindparam("penalty")),rows)
+    db.commit()
+    if CURRENT_SCORES and any(r["rule"] in GATE_PILLAR for r in rows):
+        refresh_rollups(db)
+    return len(rows)
+
+def unchanged(db:Session,rows:Sequence[Dict[str,Any]])->List[bool]:
+    """Whether each new score row equals its segment's current score, so appending it would add nothing to history."""
+    if not CURRENT_SCORES or not rows:
+        return [False]*len(rows)
+    c=CurrentScore.__table__.c
+    cur={r[0]:tuple(r[1:]) for r in db.execute(select(c.segment_id,*[c[k] for k in SAME])
+                                                 .where(c.segment_id.in_([r["segment_id"] for r in rows])))}
+    return [cur.get(r["segment_id"])==tuple(r[k] for k in SAME) for r in rows]
+
+def _month(db:Session,col):
+    if db.get_bind().dialect.name=="postgresql":
+        return func.date_trunc("month",col)
+    return func.strftime("%Y-%m",col)
+
+def _in_scope(pipeline_id:Optional[str],region:Optional[str],id_range:Optional[Tuple[Optional[str],Optional[str]]]):
+    segs=segment_filters(select(Segment.id),pipeline_id,region)
+    lo,hi=id_range or (None,None)
+    if lo is not None:
+        segs=segs.where(Segment.id>=lo)
+    if hi is not None:
+        segs=segs.where(Segment.id<hi)
+    return HRIScore.segment_id.in_(segs)
+
+def _convert_legacy(db:Session,scope)->int:
+    """Move drivers_json rows to driver_ids, give current scores their driver_ids and links, and classify old drivers rows."""
+    rows=db.execute(select(HRIScore.id,HRIScore.drivers_json).where(scope,HRIScore.driver_ids.is_(None))).all()
+    h=HRIScore.__table__.c
+    for s in range(0,len(rows),DELETE_BATCH):
+        part=rows[s:s+DELETE_BATCH]
+        split=[split_gates(json.loads(j or "[]")) for _,j in part]
+        enc=text_ids(db,[d for d,_ in split])
+        db.execute(update(HRIScore.__table__).where(h.id==bindparam("rid"))
+                   .values(driver_ids=bindparam("ids"),gate_values=bindparam("gates"),drivers_json=None),
+                   [{"rid":rid,"ids":e,"gates":g} for (rid,_),e,(_,g) in zip(part,enc,split)])
+        db.commit()
+    c=CurrentScore.__table__.c
+    segs=select(HRIScore.segment_id).where(scope)
+    db.execute(update(CurrentScore.__table__)
+               .where(c.driver_ids.is_(None),c.segment_id.in_(segs))
+               .values(driver_ids=select(h.driver_ids).where(h.id==c.score_id).scalar_subquery(),
+                       gate_values=select(h.gate_values).where(h.id==c.score_id).scalar_subquery()))
+    db.commit()
+    if rows:
+        refresh_current_drivers(db,segs)
+    classify_drivers(db)
+    return len(rows)
+
+def _protected(db:Session,scope)->Set[int]:
+    """Rows compaction never removes: current scores and each segment's newest row per model_version."""
+    rn=func.row_number().over(partition_by=(HRIScore.segment_id,HRIScore.model_version),order_by=(HRIScore.created_at.desc(),HRIScore.id.desc()))
+    newest=select(HRIScore.id,rn.label("rn")).where(scope).subquery()
+    keep=set(db.scalars(select(newest.c.id).where(newest.c.rn==1)))
+    keep.update(db.scalars(select(CurrentScore.score_id).where(CurrentScore.segment_id.in_(select(HRIScore.segment_id).where(scope)))))
+    return keep
+
+def _delete(db:Session,ids:List[int],keep:Set[int],commit:bool=True)->int:
+    ids=[i for i in ids if i not in keep]
+    for s in range(0,len(ids),DELETE_BATCH):
+        db.execute(delete(HRIScore).where(HRIScore.id.in_(ids[s:s+DELETE_BATCH])))
+        if commit:
+            db.commit()
+    return len(ids)
+
+def _duplicates(db:Session,scope)->List[int]:
+    """Rows equal to the previous row of the same segment and model_version (every change is kept).
+
+    Rules and Level-2 model scores share hri_scores, so each model's history is compared on its own.
+    drivers_json only differs on legacy rows a dry run has not converted.
+    """
+    order=(HRIScore.created_at,HRIScore.id)
+    part=(HRIScore.segment_id,HRIScore.model_version)
+    same=SAME+("drivers_json",)
+    cols=[getattr(HRIScore,k) for k in same]
+    w=select(HRIScore.id,*[c.label(k) for k,c in zip(same,cols)],
+             *[func.lag(c).over(partition_by=part,order_by=order).label("p_"+k) for k,c in zip(same,cols)],
+             func.row_number().over(partition_by=part,order_by=order).label("rn")).where(scope).subquery()
+    return list(db.scalars(select(w.c.id).where(w.c.rn>1,and_(*[w.c[k].is_not_distinct_from(w.c["p_"+k]) for k in same]))))
+
+def _superseded(db:Session,scope,cutoff:datetime)->List[int]:
+    """Rows older than cutoff that are not the last score of their segment, model_version and calendar month."""
+    rn=func.row_number().over(partition_by=(HRIScore.segment_id,HRIScore.model_version,_month(db,HRIScore.created_at)),
+                              order_by=(HRIScore.created_at.desc(),HRIScore.id.desc()))
+    m=select(HRIScore.id,rn.label("rn")).where(scope,HRIScore.created_at<cutoff).subquery()
+    return list(db.scalars(select(m.c.id).where(m.c.rn>1)))
+
+def compact_history(db:Session,pipeline_id:Optional[str]=None,region:Optional[str]=None,
+                    id_range:Optional[Tuple[Optional[str],Optional[str]]]=None,now:Optional[datetime]=None,
+                    full_days:int=HISTORY_FULL_DAYS,keep_days:int=HISTORY_KEEP_DAYS,dry_run:bool=False)->Dict[str,Any]:
+    """Shrink hri_scores for the matching segments.
+
+    Legacy drivers_json rows are re-encoded as driver_ids, rows identical to their predecessor
+    are dropped, rows older than ``full_days`` are thinned to the last score of each calendar
+    month, and with ``keep_days`` > 0 rows older than that are dropped. Each model_version is
+    thinned separately, and each segment's current row and newest row per model_version are always kept.
+    A dry run counts the same rows inside one transaction that is rolled back, and converts nothing.
+    """
+    t=time.perf_counter()
+    now=now or datetime.now(timezone.utc)
+    scope=_in_scope(pipeline_id,region,id_range)
+    if dry_run:
+        converted=db.scalar(select(func.count()).select_from(HRIScore).where(scope,HRIScore.driver_ids.is_(None)))
+    else:
+        converted=_convert_legacy(db,scope)
+    keep=_protected(db,scope)
+    dups=_delete(db,_duplicates(db,scope),keep,not dry_run)
+    thinned=_delete(db,_superseded(db,scope,now-timedelta(days=full_days)),keep,not dry_run)
+    expired=0
+    if keep_days>0:
+        expired=_delete(db,list(db.scalars(select(HRIScore.id).where(scope,HRIScore.created_at<now-timedelta(days=keep_days)))),
+                        keep,not dry_run)
+    if dry_run:
+        db.rollback()
+    return {"rows_converted":converted,"duplicates_removed":dups,"downsampled":thinned,"expired":expired,
+            "dry_run":dry_run,"elapsed_s":round(time.perf_counter()-t,3)}
@@ -0,0 +1,155 @@
+from __future__ import annotations
+from typing import Dict,Any,List,Optional,Tuple
+from sqlalchemy import select,func,delete,insert,update,and_,bindparam
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.core.config import CURRENT_SCORES
+from app.db.models import Segment,HRIScore,CurrentScore,CurrentDriver,Driver
+from app.db.paging import keyset,page,segment_filters
+from app.db.upsert import upsert
+from app.scoring.engine import MODEL_VERSION
+from app.scoring.history import link_drivers,refresh_current_drivers
+from app.scoring.rollups import tracked,refresh_rollups
+from app.scoring.rules import Ruleset
+
+SCORE_FIELDS=("model_version","hri","readiness_class","m","d","i","c","e","q","o")
+
+def record_current(db:Session,scores:List[Dict[str,Any]]):
+    """Point current_scores at freshly inserted HRIScore rows (dicts carrying their 'id' and optional 'cache_key').
+
+    Driver links and pipeline rollups move with them in the same transaction.
+    """
+    if not CURRENT_SCORES or not scores:
+        return
+    with tracked(db,[s["segment_id"] for s in scores]):
+        upsert(db,CurrentScore,
+               [{"segment_id":s["segment_id"],"score_id":s["id"],"cache_key":s.get("cache_key"),
+                 "inputs_revision":s.get("inputs_revision"),"ruleset_version":s.get("ruleset_version"),
+                 "driver_ids":s.get("driver_ids"),"gate_values":s.get("gate_values"),**{k:s[k] for k in SCORE_FIELDS}}
+                for s in scores],
+               ["segment_id"])
+        link_drivers(db,[(s["segment_id"],s.get("driver_ids")) for s in scores])
+
+def confirm_current(db:Session,marks:List[Dict[str,Any]]):
+    """Stamp unchanged current scores with the inputs revision/ruleset they were re-verified against."""
+    if not CURRENT_SCORES or not marks:
+        return
+    db.execute(update(CurrentScore.__table__)
+               .where(CurrentScore.__table__.c.segment_id==bindparam("sid"))
+               .values(inputs_revision=bindparam("rev"),ruleset_version=bindparam("ver")),marks)
+
+def restamp_current(db:Session,marks:List[Dict[str,Any]]):
+    """confirm_current for scores recomputed to the same result from new inputs: the cache key moves too."""
+    if not CURRENT_SCORES or not marks:
+        return
+    db.execute(update(CurrentScore.__table__)
+               .where(CurrentScore.__table__.c.segment_id==bindparam("sid"))
+               .values(cache_key=bindparam("key"),inputs_revision=bindparam("rev"),ruleset_version=bindparam("ver")),marks)
+
+def current_keys(db:Session,segment_ids:List[str])->Dict[str,Optional[str]]:
+    """cache_key of each segment's current score, for skipping unchanged rescoring."""
+    if not CURRENT_SCORES or not segment_ids:
+        return {}
+    rows=db.execute(select(CurrentScore.segment_id,CurrentScore.cache_key)
+                    .where(CurrentScore.segment_id.in_(segment_ids)))
+    return {sid:key for sid,key in rows}
+
+def ranked_scores(pipeline_id:Optional[str]=None,model_version:str=MODEL_VERSION):
+    """One model's hri_scores with rn=1 on each segment's latest row (created_at, then id).
+
+    Defaults to the rules engine, whose scores are the current ones; Level-2 model rows never take over.
+    """
+    rn=func.row_number().over(partition_by=HRIScore.segment_id,
+                              order_by=(HRIScore.created_at.desc(),HRIScore.id.desc())).label("rn")
+    stmt=(select(HRIScore.id,HRIScore.segment_id,*[getattr(HRIScore,k) for k in SCORE_FIELDS],HRIScore.driver_ids,HRIScore.gate_values,rn)
+          .where(HRIScore.model_version==model_version))
+    if pipeline_id:
+        stmt=stmt.where(HRIScore.segment_id.in_(select(Segment.id).where(Segment.pipeline_id==pipeline_id)))
+    return stmt.subquery()
+
+def refresh_current_scores(db:Session):
+    """Rebuild current_scores from rules-engine history with one INSERT ... SELECT, then their driver links and rollups."""
+    r=ranked_scores()
+    db.execute(delete(CurrentDriver))
+    db.execute(delete(CurrentScore))
+    db.execute(insert(CurrentScore).from_select(
+        ["segment_id","score_id",*SCORE_FIELDS,"driver_ids","gate_values"],
+        select(r.c.segment_id,r.c.id,*[r.c[k] for k in SCORE_FIELDS],r.c.driver_ids,r.c.gate_values).where(r.c.rn==1)))
+    refresh_current_drivers(db)
+    refresh_rollups(db)
+
+def latest_stmt(pipeline_id:Optional[str]=None,current:Optional[bool]=None,*,region:Optional[str]=None,
+                classes:Optional[List[str]]=None,hri_min:Optional[float]=None,hri_max:Optional[float]=None,
+                km_min:Optional[float]=None,km_max:Optional[float]=None):
+    """Every segment with its latest score columns (NULL when unscored), as one statement.
+
+    ``current`` picks current_scores (True) or the history window (False); defaults to CURRENT_SCORES.
+    Class and HRI filters drop unscored segments.
+    """
+    if CURRENT_SCORES if current is None else current:
+        src=CurrentScore.__table__
+        on=src.c.segment_id==Segment.id
+    else:
+        src=ranked_scores(pipeline_id)
+        on=and_(src.c.segment_id==Segment.id,src.c.rn==1)
+    stmt=(select(Segment.id,Segment.pipeline_id,Segment.start_km,Segment.end_km,
+                 *[src.c[k] for k in SCORE_FIELDS[1:]])
+          .outerjoin(src,on))
+    stmt=segment_filters(stmt,pipeline_id,region,km_min,km_max)
+    if classes:
+        stmt=stmt.where(src.c.readiness_class.in_(classes))
+    if hri_min is not None:
+        stmt=stmt.where(src.c.hri>=hri_min)
+    if hri_max is not None:
+        stmt=stmt.where(src.c.hri<=hri_max)
+    return stmt
+
+def latest_rows(rows)->List[Dict[str,Any]]:
+    out=[]
+    for sid,pid,start,end,hri,klass,m,d,i,c,e,q,o in rows:
+        out.append({
+            "segment_id":sid,
+            "pipeline_id":pid,
+            "start_km":start,
+            "end_km":end,
+            "hri":hri,
+            "readiness_class":klass,
+            "pillars":{"M":m,"D":d,"I":i,"C":c,"E":e,"Q":q,"O":o} if hri is not None else None,
+        })
+    return out
+
+def latest_scores(db:Session,pipeline_id:Optional[str]=None)->List[Dict[str,Any]]:
+    """Every segment with its latest score (or None) in a single query."""
+    return latest_rows(db.execute(latest_stmt(pipeline_id)))
+
+async def latest_scores_async(db:AsyncSession,pipeline_id:Optional[str]=None)->List[Dict[str,Any]]:
+    return latest_rows((await db.execute(latest_stmt(pipeline_id))).all())
+
+LATEST_ORDER=(Segment.pipeline_id,Segment.start_km,Segment.id)
+
+async def latest_page_async(db:AsyncSession,cursor:Optional[str],limit:Optional[int],**filters)->Tuple[List[Dict[str,Any]],Optional[str]]:
+    """One keyset page of latest scores in (pipeline_id, start_km, segment_id) order, plus the next cursor; limit None reads them all."""
+    rows=(await db.execute(keyset(latest_stmt(**filters),LATEST_ORDER,cursor,limit))).all()
+    rows,nxt=page(rows,limit,lambda r:(r.pipeline_id,r.start_km,r.id))
+    return latest_rows(rows),nxt
+
+def driver_summary(db:Session,rs:Ruleset,pipeline_id:Optional[str]=None,region:Optional[str]=None,
+                   pillar:Optional[str]=None,by:str="rule",limit:int=20)->List[Dict[str,Any]]:
+    """Drivers of current scores aggregated in SQL per rule (or rule band): segments and km affected, most km first.
+
+    Labels for bands come from ``rs``; gates count as rules with zero penalty.
+    """
+    keys=[Driver.pillar,Driver.rule]+([Driver.band] if by=="band" else [])
+    km=func.sum(Segment.end_km-Segment.start_km)
+    stmt=(select(*keys,func.count().label("segments"),km.label("km"),
+                 func.avg(Driver.penalty).label("mean_penalty"),func.max(Driver.penalty).label("max_penalty"))
+          .select_from(CurrentDriver).join(Driver,Driver.id==CurrentDriver.driver_id)
+          .join(Segment,Segment.id==CurrentDriver.segment_id).where(Driver.rule.is_not(None)))
+    if pillar:
+        stmt=stmt.where(Driver.pillar==pillar)
+    stmt=segment_filters(stmt,pipeline_id,region).group_by(*keys).order_by(km.desc(),*keys).limit(limit)
+    return [{"pillar":r.pillar,"rule":r.rule,"band":r.band if by=="band" else None,
+             "label":rs.labels.get((r.rule,r.band)) if by=="band" else None,
+             "segments":r.segments,"km":round(r.km or 0.0,3),
+             "mean_penalty":round(r.mean_penalty or 0.0,4),"max_penalty":r.max_penalty or 0.0}
+            for r in db.execute(stmt)]
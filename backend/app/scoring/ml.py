@@ -0,0 +1,288 @@
+"""Level-2 scoring: tabular regressors that predict HRI from SegmentInputs, gated like the rules engine.
+
+Artifacts live under ML_MODEL_DIR (default app/scoring/models) as ``<name>/<version>.json`` and are
+scored as model_version ``ml-<name>-<version>``, so their HRIScore rows sit next to the rules engine's.
+Every artifact has ``kind`` and ``features``; a feature is a numeric or boolean SegmentInputs field,
+``field=value`` (1 where a text field equals value, case-insensitive) or ``pillar.<P>`` (the rules
+pillar score). Kinds:
+
+- ``linear``: ``intercept``, ``coef`` (one per feature) and optional ``impute`` (value for missing, default 0).
+- ``tree_ensemble``: ``base_score`` and ``trees``, each with node arrays ``feature``, ``threshold``,
+  ``left``, ``right`` (-1 on leaves), ``value`` and optional ``missing_left`` (default true); ``split``
+  is "<=" (default, scikit-learn, LightGBM) or "<" (XGBoost). The prediction is base_score plus the leaf values.
+
+Predictions are clipped to 0..100 and then capped by the K_I/K_TH, integrity and data-quality gates,
+which use the rules pillars; the pillar columns of ML scores are those rules pillars.
+"""
+from __future__ import annotations
+from typing import Any,Callable,Dict,List,Optional,Sequence,Tuple
+import hashlib,json,os,threading,time
+import numpy as np
+from sqlalchemy import select,insert,func
+from sqlalchemy.orm import Session
+from app.core.config import ML_MODEL_DIR,RESCORE_CHUNK_SIZE
+from app.db.models import HRIScore
+from app.scoring.batch import (BOOL_FIELDS,NUMERIC_FIELDS,PILLARS,TEXT_FIELDS,BatchResult,apply_gates,
+                               prepare_columns,readiness_class_batch,round_hri,score_pillars)
+from app.scoring.history import SAME,driver_ids
+from app.scoring.rescore import iter_input_chunks,score_rows
+from app.scoring.rules import Code,Ruleset,active,gate_code
+
+DEFAULT_DIR=ML_MODEL_DIR or os.path.join(os.path.dirname(__file__),"models")
+
+def check_feature(f:str):
+    if f.startswith("pillar."):
+        ok=f[7:] in PILLARS
+    elif "=" in f:
+        ok=f.split("=",1)[0] in TEXT_FIELDS
+    else:
+        ok=f in NUMERIC_FIELDS or f in BOOL_FIELDS
+    if not ok:
+        raise ValueError(f"unknown feature {f}")
+
+def features(cols:Dict[str,Any],names:Sequence[str],pillars:Dict[str,np.ndarray])->np.ndarray:
+    """(n, len(names)) float matrix from prepare_columns output; missing numerics are NaN."""
+    n=len(next(iter(pillars.values())))
+    X=np.empty((n,len(names)))
+    lower:Dict[str,np.ndarray]={}
+    for j,f in enumerate(names):
+        if f.startswith("pillar."):
+            X[:,j]=pillars[f[7:]]
+        elif "=" in f:
+            k,v=f.split("=",1)
+            if k not in lower:
+                lower[k]=np.char.lower(cols[k])
+            X[:,j]=lower[k]==v.lower()
+        else:
+            X[:,j]=cols[f]
+    return X
+
+class Scorer:
+    """A loaded model artifact; predict maps a feature matrix to raw (ungated) HRI."""
+    kind=""
+    def __init__(self,name:str,version:str,spec:Dict[str,Any],sha256:str):
+        self.name=name
+        self.version=version
+        self.model_version=f"ml-{name}-{version}"
+        self.sha256=sha256
+        self.features=[str(f) for f in spec["features"]]
+        for f in self.features:
+            check_feature(f)
+
+    def predict(self,X:np.ndarray)->np.ndarray:
+        raise NotImplementedError
+
+    def info(self)->Dict[str,Any]:
+        return {"model_version":self.model_version,"name":self.name,"version":self.version,"kind":self.kind,
+                "features":self.features,"sha256":self.sha256}
+
+class LinearScorer(Scorer):
+    kind="linear"
+    def __init__(self,name:str,version:str,spec:Dict[str,Any],sha256:str):
+        super().__init__(name,version,spec,sha256)
+        k=len(self.features)
+        self.intercept=float(spec.get("intercept",0.0))
+        self.coef=np.asarray(spec["coef"],dtype=float)
+        self.impute=np.asarray(spec.get("impute",[0.0]*k),dtype=float)
+        if self.coef.shape!=(k,) or self.impute.shape!=(k,):
+            raise ValueError("coef and impute need one value per feature")
+
+    def predict(self,X:np.ndarray)->np.ndarray:
+        return self.intercept+np.where(np.isnan(X),self.impute,X)@self.coef
+
+class TreeEnsembleScorer(Scorer):
+    """Trees packed into (trees, nodes) arrays and walked together, one level per step, for the whole chunk."""
+    kind="tree_ensemble"
+    def __init__(self,name:str,version:str,spec:Dict[str,Any],sha256:str):
+        super().__init__(name,version,spec,sha256)
+        trees=spec["trees"]
+        if not trees:
+            raise ValueError("tree_ensemble needs at least one tree")
+        if spec.get("split","<=") not in ("<=","<"):
+            raise ValueError('split must be "<=" or "<"')
+        self.strict=spec.get("split","<=")=="<"
+        self.base_score=float(spec.get("base_score",0.0))
+        t,m=len(trees),max(len(tr["value"]) for tr in trees)
+        self.feature=np.zeros((t,m),dtype=np.intp)
+        self.threshold=np.zeros((t,m))
+        self.left=np.tile(np.arange(m),(t,1))
+        self.right=self.left.copy()
+        self.missing_left=np.ones((t,m),dtype=bool)
+        self.value=np.zeros((t,m))
+        for i,tr in enumerate(trees):
+            k=len(tr["value"])
+            left,right=np.asarray(tr["left"],dtype=np.intp),np.asarray(tr["right"],dtype=np.intp)
+            if left.shape!=(k,) or right.shape!=(k,) or len(tr["feature"])!=k or len(tr["threshold"])!=k:
+                raise ValueError(f"tree {i}: node arrays differ in length")
+            if ((left>=k)|(right>=k)).any() or ((left<0)!=(right<0)).any():
+                raise ValueError(f"tree {i}: bad child index")
+            split=left>=0
+            feat=np.asarray(tr["feature"],dtype=np.intp)
+            if ((feat[split]<0)|(feat[split]>=len(self.features))).any():
+                raise ValueError(f"tree {i}: feature index out of range")
+            # Leaves point at themselves, so rows that reach one early stay put.
+            self.left[i,:k]=np.where(split,left,np.arange(k))
+            self.right[i,:k]=np.where(split,right,np.arange(k))
+            self.feature[i,:k]=np.where(split,feat,0)
+            self.threshold[i,:k]=np.asarray(tr["threshold"],dtype=float)
+            self.value[i,:k]=np.asarray(tr["value"],dtype=float)
+            if "missing_left" in tr:
+                self.missing_left[i,:k]=np.asarray(tr["missing_left"],dtype=bool)
+        self.depth=max(_depth(tr["left"],tr["right"],i) for i,tr in enumerate(trees))
+
+    def predict(self,X:np.ndarray)->np.ndarray:
+        n,(t,m)=len(X),self.value.shape
+        k=X.shape[1]
+        x_flat=np.ascontiguousarray(X).ravel()
+        # Flat node ids (tree * m + node) and flat row offsets keep every lookup a 1-D take.
+        feature,threshold=self.feature.ravel(),self.threshold.ravel()
+        left,right=(self.left+np.arange(t)[:,None]*m).ravel(),(self.right+np.arange(t)[:,None]*m).ravel()
+        missing_left=self.missing_left.ravel()
+        node=np.tile(np.arange(t)*m,n)
+        rows=np.repeat(np.arange(n)*k,t)
+        for _ in range(self.depth):
+            x=x_flat.take(rows+feature.take(node))
+            th=threshold.take(node)
+            with np.errstate(invalid="ignore"):
+                go=(x<th) if self.strict else (x<=th)
+            go=np.where(np.isnan(x),missing_left.take(node),go)
+            node=np.where(go,left.take(node),right.take(node))
+        return self.base_score+self.value.ravel().take(node).reshape(n,t).sum(axis=1)
+
+def _depth(left:Sequence[int],right:Sequence[int],i:int)->int:
+    """Longest root-to-leaf path; a node reached twice means the arrays are not a tree."""
+    depth,level,seen=0,[0],set()
+    while level:
+        nxt=[]
+        for k in level:
+            if k in seen:
+                raise ValueError(f"tree {i}: node {k} is reached twice")
+            seen.add(k)
+            if left[k]>=0:
+                nxt+=[left[k],right[k]]
+        if nxt:
+            depth+=1
+        level=nxt
+    return depth
+
+KINDS:Dict[str,Callable[[str,str,Dict[str,Any],str],Scorer]]={"linear":LinearScorer,"tree_ensemble":TreeEnsembleScorer}
+
+def register_kind(kind:str,build:Callable[[str,str,Dict[str,Any],str],Scorer]):
+    """Plug in another artifact kind; build(name, version, spec, sha256) returns a Scorer."""
+    KINDS[kind]=build
+
+def load_model(path:str,name:str,version:str)->Scorer:
+    with open(path,"rb") as f:
+        raw=f.read()
+    spec=json.loads(raw)
+    build=KINDS.get(spec.get("kind"))
+    if build is None:
+        raise ValueError(f"unknown kind {spec.get('kind')} (one of {', '.join(KINDS)})")
+    return build(name,version,spec,hashlib.sha256(raw).hexdigest()[:12])
+
+class Registry:
+    """Every artifact under ``path``, keyed by model_version; ones that fail to load are kept in ``errors``."""
+    def __init__(self,path:str=DEFAULT_DIR):
+        self.path=path
+        self.models:Dict[str,Scorer]={}
+        self.errors:Dict[str,str]={}
+        if not os.path.isdir(path):
+            return
+        for name in sorted(os.listdir(path)):
+            d=os.path.join(path,name)
+            if not os.path.isdir(d):
+                continue
+            for fn in sorted(os.listdir(d)):
+                if not fn.endswith(".json"):
+                    continue
+                try:
+                    m=load_model(os.path.join(d,fn),name,fn[:-5])
+                    self.models[m.model_version]=m
+                except Exception as e:
+                    self.errors[os.path.join(name,fn)]=str(e)
+
+    def get(self,model_version:str)->Scorer:
+        if model_version not in self.models:
+            raise ValueError(f"unknown model {model_version} (one of {', '.join(self.models) or 'none loaded'})")
+        return self.models[model_version]
+
+_REGISTRY:Optional[Registry]=None
+_LOCK=threading.Lock()
+
+def registry()->Registry:
+    """The loaded registry; the first call (API startup, or a worker's first ML job) reads the artifacts."""
+    global _REGISTRY
+    if _REGISTRY is None:
+        with _LOCK:
+            if _REGISTRY is None:
+                _REGISTRY=Registry()
+    return _REGISTRY
+
+def reload(path:Optional[str]=None)->Registry:
+    """Re-read the artifacts and swap the registry in; each uvicorn worker holds its own, like the ruleset."""
+    global _REGISTRY
+    reg=Registry(path or DEFAULT_DIR)
+    with _LOCK:
+        _REGISTRY=reg
+    return reg
+
+def score_ml(cols:Dict[str,Any],scorer:Scorer,rs:Optional[Ruleset]=None,
+             pillars:Optional[Dict[str,np.ndarray]]=None)->BatchResult:
+    """Score a chunk with a model; drivers are the gates that capped its prediction.
+
+    ``cols`` comes from prepare_columns; ``pillars`` (score_pillars output) is computed if not given.
+    """
+    rs=rs or active()
+    n=len(cols["smys_mpa"])
+    pillars=dict(pillars) if pillars is not None else score_pillars(cols,n,rs)
+    raw=np.clip(scorer.predict(features(cols,scorer.features,pillars)),0.0,100.0)
+    ki,kth=cols["ki_mpa_sqrtm"],cols["kth_mpa_sqrtm"]
+    hri,gates,old_m=apply_gates(pillars,ki,kth,rs,hri=raw)
+    hri=round_hri(hri)
+    drivers:List[List[Code]]=[[] for _ in range(n)]
+    for r in np.flatnonzero(gates["ki_kth"]).tolist():
+        drivers[r].append(gate_code("gate.ki_kth",float(ki[r]),float(kth[r]),float(old_m[r]),float(pillars["M"][r])))
+    for r in np.flatnonzero(gates["integrity"]).tolist():
+        drivers[r].append(gate_code("gate.integrity",float(pillars["I"][r])))
+    for r in np.flatnonzero(gates["data_quality"]).tolist():
+        drivers[r].append(gate_code("gate.data_quality",float(pillars["Q"][r])))
+    return BatchResult(hri=hri,readiness_class=readiness_class_batch(hri),pillars=pillars,gates=gates,drivers=drivers)
+
+def _latest(db:Session,ids:List[str],model_version:str)->Dict[str,Tuple[Any,...]]:
+    """SAME columns of each segment's newest score from this model."""
+    last=(select(func.max(HRIScore.id)).where(HRIScore.segment_id.in_(ids),HRIScore.model_version==model_version)
+          .group_by(HRIScore.segment_id))
+    c=HRIScore.__table__.c
+    return {r[0]:tuple(r[1:]) for r in db.execute(select(c.segment_id,*[c[k] for k in SAME]).where(c.id.in_(last)))}
+
+def rescore_ml(db:Session,model_version:str,pipeline_id:Optional[str]=None,region:Optional[str]=None,
+               chunk_size:int=RESCORE_CHUNK_SIZE,force:bool=False,
+               id_range:Optional[Tuple[Optional[str],Optional[str]]]=None)->Dict[str,Any]:
+    """Batch-score segments with a registry model and append HRIScore rows under its model_version.
+
+    Current scores, rollups and the rules engine's history are untouched, and history compaction
+    thins each model_version on its own, so both modes can run in bulk side by side. A score equal to the segment's latest one from the same model is not
+    appended (counted in segments_unchanged) unless ``force``.
+    """
+    t0=time.perf_counter()
+    scorer=registry().get(model_version)
+    rs=active()
+    scored,unchanged,chunks=0,0,0
+    classes:Dict[str,int]={}
+    for ids,cols,_ in iter_input_chunks(db,pipeline_id,region,chunk_size,id_range=id_range):
+        chunks+=1
+        res=score_ml(prepare_columns(cols),scorer,rs)
+        rows=score_rows(ids,res,driver_ids(db,res.drivers,rs),model_version=model_version)
+        if not force:
+            cur=_latest(db,ids,model_version)
+            fresh=[r for r in rows if cur.get(r["segment_id"])!=tuple(r[k] for k in SAME)]
+            unchanged+=len(rows)-len(fresh)
+            rows=fresh
+        if rows:
+            db.execute(insert(HRIScore),rows)
+        db.commit()
+        for r in rows:
+            classes[r["readiness_class"]]=classes.get(r["readiness_class"],0)+1
+        scored+=len(rows)
+    return {"segments_scored":scored,"segments_unchanged":unchanged,"chunks":chunks,"model_version":model_version,
+            "class_counts":classes,"elapsed_s":round(time.perf_counter()-t0,3)}
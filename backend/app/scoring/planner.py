@@ -0,0 +1,193 @@
+from __future__ import annotations
+from itertools import combinations
+from typing import Any,Dict,List,Mapping,Optional,Sequence,Tuple
+import time
+import numpy as np
+from sqlalchemy.orm import Session
+from app.core.config import PLAN_MAX_OPTIONS
+from app.db.models import Segment
+from app.scoring.batch import CLASSES,apply_gates,prepare_columns,readiness_code_batch,round_hri,score_pillars
+from app.scoring.rescore import iter_input_chunks
+from app.scoring.rules import Ruleset,active
+from app.scoring.scenarios import check_scenarios,overlay,touched_pillars
+
+OBJECTIVES=("hri_km","not_ready_km")
+
+def check_plan(interventions:Sequence[Mapping[str,Any]],budget:float,objective:str,max_per_segment:int):
+    check_scenarios(interventions)
+    if objective not in OBJECTIVES:
+        raise ValueError(f"objective must be one of {', '.join(OBJECTIVES)}")
+    if max_per_segment<1:
+        raise ValueError("max_per_segment must be >= 1")
+    if budget<0:
+        raise ValueError("budget must be >= 0")
+    for iv in interventions:
+        if iv.get("cost_per_km",0)<0 or iv.get("cost_per_segment",0)<0:
+            raise ValueError(f"intervention {iv.get('name')}: costs must be >= 0")
+    if len(options(len(interventions),max_per_segment))>PLAN_MAX_OPTIONS:
+        raise ValueError(f"more than {PLAN_MAX_OPTIONS} intervention combinations; lower max_per_segment or the catalogue size")
+
+def options(k:int,max_per_segment:int)->List[Tuple[int,...]]:
+    """Intervention combinations a segment can receive (each applied at most once)."""
+    return [c for r in range(1,max_per_segment+1) for c in combinations(range(k),r)]
+
+def _score(cols:Mapping[str,Any],n:int,combo:Sequence[Mapping[str,Any]],base:Dict[str,np.ndarray],rs:Ruleset)->Tuple[np.ndarray,Dict[str,np.ndarray]]:
+    """(rounded HRI, gates) with the combination's overlays applied in order; like score_scenario, only touched pillars are rescored."""
+    for iv in combo:
+        cols=overlay(cols,n,iv)
+    touched=sorted({p for iv in combo for p in touched_pillars(iv)})
+    pillars={**base,**score_pillars(cols,n,rs,touched)}
+    # Columns come from prepare_columns; a set of None leaves a list, which float() turns into NaN.
+    hri,gates,_=apply_gates(pillars,np.asarray(cols["ki_mpa_sqrtm"],dtype=float),np.asarray(cols["kth_mpa_sqrtm"],dtype=float),rs)
+    return round_hri(hri),gates
+
+def _hull(cost:np.ndarray,gain:np.ndarray)->List[int]:
+    """Options on the upper concave hull of (cost, gain) from the do-nothing point, cheapest first.
+
+    Only these can be LP-optimal in a multiple-choice knapsack, and their increments have falling
+    gain per cost, so a global efficiency order takes each segment's steps in sequence.
+    """
+    order=sorted(range(len(cost)),key=lambda j:(cost[j],-gain[j]))
+    pts=[(0.0,0.0,-1)]
+    for j in order:
+        c,g=float(cost[j]),float(gain[j])
+        if g<=pts[-1][1]:
+            continue
+        while len(pts)>1:
+            (c1,g1,_),(c2,g2,_)=pts[-2],pts[-1]
+            # Drop the last point when it lies on or under the line from its predecessor to the new one.
+            if (g2-g1)*(c-c1)<=(g-g1)*(c2-c1):
+                pts.pop()
+            else:
+                break
+        if pts[-1][0]==c:
+            pts.pop()
+        pts.append((c,g,j))
+    return [j for _,_,j in pts[1:]]
+
+def plan(db:Session,interventions:Sequence[Mapping[str,Any]],budget:float,objective:str="hri_km",
+         max_per_segment:int=1,segment_ids:Optional[List[str]]=None,pipeline_id:Optional[str]=None,
+         region:Optional[str]=None)->Dict[str,Any]:
+    """Choose at most one intervention combination per segment to maximize the objective within ``budget``.
+
+    Every combination is scored with the batch engine (gates included) against stored inputs; nothing is
+    written. ``hri_km`` values each segment's HRI gain times its length, ``not_ready_km`` the km lifted out
+    of Not Ready. A segment's cost is the sum over its interventions of cost_per_km * km + cost_per_segment.
+
+    Selection is the multiple-choice knapsack greedy: options reduced to each segment's convex hull,
+    increments taken by falling gain per cost, and the increment that first overflows the budget gives
+    the LP upper bound reported as ``upper_bound``. Segments whose next step does not fit keep the step
+    they have while cheaper increments elsewhere still fill the budget.
+    """
+    check_plan(interventions,budget,objective,max_per_segment)
+    rs=active()
+    t=time.perf_counter()
+    combos=options(len(interventions),max_per_segment)
+    per_km=np.array([float(iv.get("cost_per_km") or 0.0) for iv in interventions])
+    per_seg=np.array([float(iv.get("cost_per_segment") or 0.0) for iv in interventions])
+    ids:List[str]=[]
+    pids:List[str]=[]
+    kms:List[float]=[]
+    base_hri:List[float]=[]
+    # Hull points of every segment: (segment, rank, combination, cost, gain, new HRI)
+    pts:List[Tuple[int,int,int,float,float,float]]=[]
+    extra={"_km":Segment.end_km-Segment.start_km,"_pipeline_id":Segment.pipeline_id}
+    for cids,cols,_ in iter_input_chunks(db,pipeline_id,region,segment_ids=segment_ids,extra=extra):
+        n=len(cids)
+        off=len(ids)
+        km=np.array(cols["_km"],dtype=float)
+        ids+=cids
+        pids+=cols["_pipeline_id"]
+        kms+=km.tolist()
+        cols=prepare_columns(cols)
+        base=score_pillars(cols,n,rs)
+        hri0,_=_score(cols,n,(),base,rs)
+        base_hri+=hri0.tolist()
+        ready0=readiness_code_batch(hri0)!=0
+        cost=np.empty((n,len(combos)))
+        gain=np.empty((n,len(combos)))
+        new_hri=np.empty((n,len(combos)))
+        for j,combo in enumerate(combos):
+            hri,_=_score(cols,n,[interventions[i] for i in combo],base,rs)
+            new_hri[:,j]=hri
+            cost[:,j]=km*per_km[list(combo)].sum()+per_seg[list(combo)].sum()
+            if objective=="hri_km":
+                gain[:,j]=(hri-hri0)*km
+            else:
+                gain[:,j]=np.where(~ready0&(readiness_code_batch(hri)!=0),km,0.0)
+        for s in np.flatnonzero((gain>0).any(axis=1)).tolist():
+            for r,j in enumerate(_hull(cost[s],gain[s])):
+                pts.append((off+s,r,j,float(cost[s,j]),float(gain[s,j]),float(new_hri[s,j])))
+    chosen,value,spent,bound=_select(pts,budget)
+    rows=[]
+    by_iv={iv["name"]:{"name":iv["name"],"segments":0,"km":0.0,"cost":0.0} for iv in interventions}
+    hri_km_gain=0.0
+    lifted=0.0
+    for s,p in sorted(chosen.items()):
+        _,_,j,c,g,h=pts[p]
+        km=kms[s]
+        names=[interventions[i]["name"] for i in combos[j]]
+        for i in combos[j]:
+            a=by_iv[interventions[i]["name"]]
+            a["segments"]+=1
+            a["km"]+=km
+            a["cost"]+=km*per_km[i]+per_seg[i]
+        old_class,new_class=CLASSES[readiness_code_batch(np.array([base_hri[s]]))[0]],CLASSES[readiness_code_batch(np.array([h]))[0]]
+        hri_km_gain+=(h-base_hri[s])*km
+        if old_class==CLASSES[0] and new_class!=CLASSES[0]:
+            lifted+=km
+        rows.append({"segment_id":ids[s],"pipeline_id":pids[s],"km":round(km,3),"interventions":names,
+                     "cost":round(c,2),"hri":base_hri[s],"new_hri":h,"gain_hri":round(h-base_hri[s],2),
+                     "readiness_class":old_class,"new_readiness_class":new_class,"objective_gain":round(g,4)})
+    total_km=float(np.sum(kms))
+    mean=lambda v:round(v/total_km,4) if total_km>0 else None
+    hri_km=float(np.dot(base_hri,kms)) if ids else 0.0
+    rows.sort(key=lambda r:(-r["objective_gain"],r["segment_id"]))
+    return {"ruleset_version":rs.version,"objective":objective,"budget":budget,"spent":round(spent,2),
+            "objective_value":round(value,4),"upper_bound":round(bound,4),
+            "segments":len(ids),"km":round(total_km,3),"options_evaluated":len(combos)*len(ids),
+            "hri_before":mean(hri_km),"hri_after":mean(hri_km+hri_km_gain),"km_lifted_from_not_ready":round(lifted,3),
+            "elapsed_s":round(time.perf_counter()-t,3),
+            "by_intervention":[{**a,"km":round(a["km"],3),"cost":round(a["cost"],2)} for a in by_iv.values() if a["segments"]],
+            "segments_planned":rows}
+
+def _select(pts:List[Tuple[int,int,int,float,float,float]],budget:float)->Tuple[Dict[int,int],float,float,float]:
+    """Greedy over hull increments; returns ({segment: chosen point}, value, spent, LP upper bound)."""
+    if not pts:
+        return {},0.0,0.0,0.0
+    seg=np.array([p[0] for p in pts])
+    rank=np.array([p[1] for p in pts])
+    c=np.array([p[3] for p in pts])
+    g=np.array([p[4] for p in pts])
+    # Increment over the segment's previous hull point (points of a segment are consecutive, by rank).
+    first=rank==0
+    dc=np.where(first,c,c-np.r_[0.0,c[:-1]])
+    dg=np.where(first,g,g-np.r_[0.0,g[:-1]])
+    with np.errstate(divide="ignore"):
+        eff=np.where(dc>0,dg/np.where(dc>0,dc,1.0),np.inf)
+    order=np.lexsort((rank,seg,-eff))
+    chosen:Dict[int,int]={}
+    blocked=set()
+    value=spent=0.0
+    bound=None
+    for i in order.tolist():
+        s=int(seg[i])
+        if s in blocked:
+            continue
+        if spent+dc[i]<=budget:
+            spent+=float(dc[i])
+            value+=float(dg[i])
+            chosen[s]=i
+        else:
+            if bound is None:
+                bound=value+float(dg[i])*(budget-spent)/float(dc[i])
+            blocked.add(s)
+    if bound is None:
+        bound=value
+    # The greedy can lose to one large option that fits on its own; keep whichever is better.
+    fits=np.flatnonzero(c<=budget)
+    if len(fits):
+        best=int(fits[np.argmax(g[fits])])
+        if g[best]>value:
+            chosen,value,spent={int(seg[best]):best},float(g[best]),float(c[best])
+    return chosen,value,spent,max(bound,value)
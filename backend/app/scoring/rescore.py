@@ -0,0 +1,153 @@
+from __future__ import annotations
+from typing import Dict,Any,List,Iterator,Optional,Tuple
+import time
+from sqlalchemy import select,insert,or_,func
+from sqlalchemy.orm import Session
+from app.core.config import RESCORE_CHUNK_SIZE
+from app.db.models import Pipeline,Segment,SegmentInputs,HRIScore,CurrentScore
+from app.scoring.batch import compute_hri_batch,FIELDS,BatchResult
+from app.scoring.cache import score_key
+from app.scoring.engine import MODEL_VERSION
+from app.scoring.history import driver_ids,gate_values,unchanged as unchanged_scores
+from app.scoring.latest import record_current,current_keys,confirm_current,restamp_current
+from app.scoring.rules import Ruleset,active
+
+INPUT_COLUMNS=[getattr(SegmentInputs,f) for f in FIELDS]
+
+def stale_condition(rs:Ruleset,model_version:str=MODEL_VERSION):
+    """Segments never scored, or whose inputs revision, ruleset or model changed since their current score."""
+    return or_(CurrentScore.segment_id.is_(None),
+               CurrentScore.inputs_revision.is_distinct_from(func.coalesce(SegmentInputs.revision,0)),
+               CurrentScore.ruleset_version.is_distinct_from(rs.version),
+               CurrentScore.model_version!=model_version)
+
+def iter_input_chunks(db:Session,pipeline_id:Optional[str]=None,region:Optional[str]=None,
+                      chunk_size:int=RESCORE_CHUNK_SIZE,stale:Optional[Ruleset]=None,
+                      segment_ids:Optional[List[str]]=None,
+                      id_range:Optional[Tuple[Optional[str],Optional[str]]]=None,
+                      extra:Optional[Dict[str,Any]]=None)->Iterator[Tuple[List[str],Dict[str,List[Any]],List[int]]]:
+    """Yield (segment_ids, columns, input revisions) chunks, keyset-paginated on segment id.
+
+    Segments without an inputs row are yielded with all fields missing, which
+    scores the same as the empty row compute_segment_hri would create. With
+    ``stale`` set, only segments matching stale_condition for that ruleset are read.
+    ``id_range`` is a (first, stop) segment id window, first inclusive, stop exclusive, None open.
+    ``extra`` maps more column names to SQL expressions (e.g. segment length) to read alongside.
+    """
+    extra=extra or {}
+    base=(select(Segment.id,func.coalesce(SegmentInputs.revision,0),*INPUT_COLUMNS,*extra.values())
+          .outerjoin(SegmentInputs,SegmentInputs.segment_id==Segment.id)
+          .order_by(Segment.id).limit(chunk_size))
+    if pipeline_id:
+        base=base.where(Segment.pipeline_id==pipeline_id)
+    if region:
+        base=base.join(Pipeline,Pipeline.id==Segment.pipeline_id).where(Pipeline.region==region)
+    if segment_ids is not None:
+        base=base.where(Segment.id.in_(segment_ids))
+    if id_range is not None:
+        lo,hi=id_range
+        if lo is not None:
+            base=base.where(Segment.id>=lo)
+        if hi is not None:
+            base=base.where(Segment.id<hi)
+    if stale is not None:
+        base=(base.outerjoin(CurrentScore,CurrentScore.segment_id==Segment.id)
+                  .where(stale_condition(stale)))
+    last=None
+    while True:
+        stmt=base if last is None else base.where(Segment.id>last)
+        rows=db.execute(stmt).all()
+        if not rows:
+            return
+        ids=[r[0] for r in rows]
+        revs=[r[1] for r in rows]
+        cols={f:[r[j+2] for r in rows] for j,f in enumerate((*FIELDS,*extra))}
+        yield ids,cols,revs
+        last=ids[-1]
+        if len(rows)<chunk_size:
+            return
+
+def count_stale(db:Session,pipeline_id:Optional[str]=None)->int:
+    rs=active()
+    stmt=(select(func.count()).select_from(Segment)
+          .outerjoin(SegmentInputs,SegmentInputs.segment_id==Segment.id)
+          .outerjoin(CurrentScore,CurrentScore.segment_id==Segment.id)
+          .where(stale_condition(rs)))
+    if pipeline_id:
+        stmt=stmt.where(Segment.pipeline_id==pipeline_id)
+    return db.scalar(stmt)
+
+def score_rows(segment_ids:List[str],res:BatchResult,drivers:Optional[List[str]]=None,
+               model_version:str=MODEL_VERSION)->List[Dict[str,Any]]:
+    """HRIScore insert parameters for a scored chunk, in the layout compute_segment_hri writes.
+
+    ``drivers`` holds each row's encoded driver_ids (see app.scoring.history.driver_ids).
+    """
+    p={k:v.tolist() for k,v in res.pillars.items()}
+    hri=res.hri.tolist()
+    gates=gate_values(res.drivers) if drivers is not None else None
+    return [{"segment_id":sid,"model_version":model_version,"hri":hri[j],
+             "readiness_class":res.readiness_class[j],
+             "m":p["M"][j],"d":p["D"][j],"i":p["I"][j],"c":p["C"][j],
+             "e":p["E"][j],"q":p["Q"][j],"o":p["O"][j],
+             "driver_ids":drivers[j] if drivers is not None else None,"gate_values":gates[j] if gates is not None else None}
+            for j,sid in enumerate(segment_ids)]
+
+def chunk_keys(ids:List[str],cols:Dict[str,List[Any]],rs:Ruleset)->List[str]:
+    return [score_key({f:cols[f][j] for f in FIELDS},rs,MODEL_VERSION) for j in range(len(ids))]
+
+def select_rows(ids:List[str],cols:Dict[str,List[Any]],keep:List[int])->Tuple[List[str],Dict[str,List[Any]]]:
+    return [ids[j] for j in keep],{f:[v[j] for j in keep] for f,v in cols.items()}
+
+def rescore(db:Session,pipeline_id:Optional[str]=None,region:Optional[str]=None,
+            chunk_size:int=RESCORE_CHUNK_SIZE,force:bool=False,stale_only:bool=False,
+            id_range:Optional[Tuple[Optional[str],Optional[str]]]=None)->Dict[str,Any]:
+    """Batch-score every matching segment and append HRIScore rows, one transaction per chunk.
+
+    Segments whose current score already has the same cache key (inputs, ruleset
+    and model version) are counted as unchanged and not rewritten unless ``force``.
+    ``stale_only`` restricts the read to segments edited or rescored under another
+    ruleset since their current score. ``id_range`` limits the run to one job chunk.
+    Scores that come out identical to the current one are not appended to history
+    (counted in history_deduplicated); only the current score's keys are updated.
+    """
+    t0=time.perf_counter()
+    rs=active()
+    scored,unchanged,deduped,chunks=0,0,0,0
+    classes:Dict[str,int]={}
+    for ids,cols,revs in iter_input_chunks(db,pipeline_id,region,chunk_size,stale=rs if stale_only else None,
+                                           id_range=id_range):
+        chunks+=1
+        keys=chunk_keys(ids,cols,rs)
+        if not force:
+            cur=current_keys(db,ids)
+            keep=[j for j,sid in enumerate(ids) if cur.get(sid)!=keys[j]]
+            unchanged+=len(ids)-len(keep)
+            if len(keep)<len(ids):
+                skip=set(range(len(ids)))-set(keep)
+                confirm_current(db,[{"sid":ids[j],"rev":revs[j],"ver":rs.version} for j in sorted(skip)])
+                ids,cols=select_rows(ids,cols,keep)
+                keys=[keys[j] for j in keep]
+                revs=[revs[j] for j in keep]
+            if not ids:
+                db.commit()
+                continue
+        res=compute_hri_batch(cols,with_drivers=True,rs=rs)
+        rows=score_rows(ids,res,driver_ids(db,res.drivers,rs))
+        same=unchanged_scores(db,rows)
+        if any(same):
+            restamp_current(db,[{"sid":r["segment_id"],"key":ck,"rev":rev,"ver":rs.version}
+                                for r,ck,rev,s in zip(rows,keys,revs,same) if s])
+            deduped+=sum(same)
+            fresh=[j for j,s in enumerate(same) if not s]
+            rows,keys,revs=[rows[j] for j in fresh],[keys[j] for j in fresh],[revs[j] for j in fresh]
+        if rows:
+            new_ids=db.scalars(insert(HRIScore).returning(HRIScore.id,sort_by_parameter_order=True),rows).all()
+            record_current(db,[{**r,"id":k,"cache_key":ck,"inputs_revision":rev,"ruleset_version":rs.version}
+                               for r,k,ck,rev in zip(rows,new_ids,keys,revs)])
+        db.commit()
+        for k in res.readiness_class.tolist():
+            classes[k]=classes.get(k,0)+1
+        scored+=len(ids)
+    return {"segments_scored":scored,"segments_unchanged":unchanged,"history_deduplicated":deduped,"chunks":chunks,"model_version":MODEL_VERSION,
+            "class_counts":classes,"elapsed_s":round(time.perf_counter()-t0,3)}
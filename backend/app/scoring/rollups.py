@@ -0,0 +1,119 @@
+from __future__ import annotations
+from contextlib import contextmanager
+from typing import Any,Dict,Iterator,List,Optional,Sequence
+from sqlalchemy import select,delete,insert,func,case
+from sqlalchemy.orm import Session
+from app.core.config import CURRENT_SCORES
+from app.db.models import Pipeline,Segment,CurrentScore,CurrentDriver,Driver,PipelineRollup
+from app.db.upsert import upsert
+from app.scoring.batch import CLASSES,PILLARS
+
+CLASS_COLUMNS=dict(zip(CLASSES,("km_not_ready","km_conditional","km_controls","km_fully")))
+PILLAR_COLUMNS={k:k.lower()+"_km" for k in PILLARS}
+GATE_COLUMNS={"gate.ki_kth":"gate_ki_kth","gate.integrity":"gate_integrity","gate.data_quality":"gate_data_quality"}
+SUMS=("segments","km","hri_km",*CLASS_COLUMNS.values(),*PILLAR_COLUMNS.values(),*GATE_COLUMNS.values())
+GROUPS={"pipeline":Pipeline.id,"region":Pipeline.region,"operator":Pipeline.operator,"portfolio":None}
+BATCH=5000
+
+def _sums(db:Session,segment_ids:Optional[Sequence[str]]=None)->Dict[str,Dict[str,float]]:
+    """Per-pipeline contribution of these segments' current scores (every segment when None)."""
+    km=Segment.end_km-Segment.start_km
+    c=CurrentScore
+    stmt=(select(Segment.pipeline_id,func.count(),func.sum(km),func.sum(c.hri*km),
+                 *[func.sum(case((c.readiness_class==k,km),else_=0.0)) for k in CLASS_COLUMNS],
+                 *[func.sum(getattr(c,k.lower())*km) for k in PILLARS])
+          .join(Segment,Segment.id==c.segment_id).group_by(Segment.pipeline_id))
+    gates=(select(Segment.pipeline_id,Driver.rule,func.count()).select_from(CurrentDriver)
+           .join(Driver,Driver.id==CurrentDriver.driver_id).join(Segment,Segment.id==CurrentDriver.segment_id)
+           .where(Driver.rule.in_(list(GATE_COLUMNS))).group_by(Segment.pipeline_id,Driver.rule))
+    if segment_ids is not None:
+        stmt=stmt.where(c.segment_id.in_(segment_ids))
+        gates=gates.where(CurrentDriver.segment_id.in_(segment_ids))
+    out:Dict[str,Dict[str,float]]={}
+    for pid,*vals in db.execute(stmt):
+        out[pid]=dict.fromkeys(SUMS,0)
+        out[pid].update(zip(SUMS,vals))
+    for pid,rule,n in db.execute(gates):
+        out.setdefault(pid,dict.fromkeys(SUMS,0))[GATE_COLUMNS[rule]]=n
+    return out
+
+def _contribution(db:Session,segment_ids:Sequence[str])->Dict[str,Dict[str,float]]:
+    out:Dict[str,Dict[str,float]]={}
+    for s in range(0,len(segment_ids),BATCH):
+        for pid,v in _sums(db,segment_ids[s:s+BATCH]).items():
+            acc=out.setdefault(pid,dict.fromkeys(SUMS,0))
+            for k in SUMS:
+                acc[k]+=v[k]
+    return out
+
+def _lock(db:Session,segment_ids:Sequence[str]):
+    """Hold the pipeline_rollups rows of these segments' pipelines until commit.
+
+    A no-op accumulate takes their row locks on Postgres (the write lock on SQLite), in pipeline
+    order, so a concurrent writer of the same pipelines waits and then reads the committed scores.
+    """
+    pids=set()
+    for s in range(0,len(segment_ids),BATCH):
+        pids.update(db.scalars(select(Segment.pipeline_id).where(Segment.id.in_(segment_ids[s:s+BATCH])).distinct()))
+    upsert(db,PipelineRollup,[{"pipeline_id":p,"segments":0} for p in sorted(pids)],["pipeline_id"],accumulate=True)
+
+@contextmanager
+def tracked(db:Session,segment_ids:Sequence[str])->Iterator[None]:
+    """Apply the net change of these segments' current scores (or geometry) made inside the block to pipeline_rollups.
+
+    The delta is taken under _lock, so writers of the same pipelines apply theirs one after another.
+    """
+    if not CURRENT_SCORES or not segment_ids:
+        yield
+        return
+    ids=list(segment_ids)
+    _lock(db,ids)
+    before=_contribution(db,ids)
+    yield
+    after=_contribution(db,ids)
+    zero=dict.fromkeys(SUMS,0)
+    rows=[]
+    for pid in sorted(set(before)|set(after)):
+        a,b=after.get(pid,zero),before.get(pid,zero)
+        delta={k:a[k]-b[k] for k in SUMS}
+        if any(delta.values()):
+            rows.append({"pipeline_id":pid,**delta})
+    upsert(db,PipelineRollup,rows,["pipeline_id"],accumulate=True)
+
+def refresh_rollups(db:Session):
+    """Rebuild pipeline_rollups from current_scores in one pass."""
+    db.execute(delete(PipelineRollup))
+    rows=[{"pipeline_id":pid,**v} for pid,v in sorted(_sums(db).items())]
+    if rows:
+        db.execute(insert(PipelineRollup),rows)
+    db.commit()
+
+def _out(key:Optional[str],r)->Dict[str,Any]:
+    km=r.km or 0.0
+    share=lambda v:round(v/km,4) if km>0 else None
+    return {"key":key,"segments":int(r.segments),"km":round(km,3),
+            "hri":round(r.hri_km/km,2) if km>0 else None,
+            "class_km":{k:round(max(getattr(r,c),0.0),3) for k,c in CLASS_COLUMNS.items()},
+            "class_share":{k:share(getattr(r,c)) for k,c in CLASS_COLUMNS.items()},
+            "pillars":{k:share(getattr(r,c)) for k,c in PILLAR_COLUMNS.items()},
+            "gate_counts":{g.split(".",1)[1]:int(getattr(r,c)) for g,c in GATE_COLUMNS.items()}}
+
+def rollups(db:Session,by:str="pipeline",pipeline_id:Optional[str]=None,region:Optional[str]=None,
+            operator:Optional[str]=None)->List[Dict[str,Any]]:
+    """Km-weighted HRI, class km, pillar means and gate counts per pipeline, region, operator or for the portfolio.
+
+    Reads only pipeline_rollups (one row per pipeline), never segments or scores.
+    """
+    key=GROUPS[by]
+    r=PipelineRollup
+    stmt=(select(*([key.label("key")] if key is not None else []),*[func.sum(getattr(r,k)).label(k) for k in SUMS])
+          .join(Pipeline,Pipeline.id==r.pipeline_id).where(r.segments>0))
+    if pipeline_id:
+        stmt=stmt.where(Pipeline.id==pipeline_id)
+    if region:
+        stmt=stmt.where(Pipeline.region==region)
+    if operator:
+        stmt=stmt.where(Pipeline.operator==operator)
+    if key is not None:
+        stmt=stmt.group_by(key).order_by(key)
+    return [_out(row.key if key is not None else None,row) for row in db.execute(stmt) if row.segments]
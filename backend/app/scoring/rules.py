@@ -0,0 +1,222 @@
+from __future__ import annotations
+from bisect import bisect_left,bisect_right
+from dataclasses import dataclass,field
+from typing import Dict,Any,List,NamedTuple,Optional,Tuple
+import hashlib,os,threading
+import numpy as np
+import yaml
+from app.core.config import PENALTIES_PATH
+
+DEFAULT_PATH=PENALTIES_PATH or os.path.join(os.path.dirname(__file__),"penalties.yaml")
+
+def _driver(pen:float,label:str)->str:
+    """The exact string engine._add used to format on every call."""
+    return f"-{pen:.2f}: {label}" if pen>0 else ""
+
+class Code(NamedTuple):
+    """Structured driver: pillar, rule id, band index within the rule and penalty.
+
+    Gates carry the values their message quotes; text is only produced by render().
+    """
+    pillar:str
+    rule:str
+    band:int
+    penalty:float
+    values:Optional[Tuple[float,...]]=None
+
+def _code(pen:float,rule:str,band:int)->Optional[Code]:
+    # Non-positive penalties produce no driver, like engine._add.
+    return Code(rule.split(".")[0],rule,band,pen) if pen>0 else None
+
+GATE_TEXT={
+    "gate.ki_kth":"Gating: K_I = {0} MPa√m exceeds K_TH = {1} MPa√m. "
+                  "Metallurgy pillar reduced from {2:.2f} to {3:.2f} and HRI capped at 40.",
+    "gate.integrity":"Gating: Integrity pillar I = {0:.2f} < 0.30. HRI limited to 40 until defects are remediated.",
+    "gate.data_quality":"Gating: Data Quality pillar Q = {0:.2f} < 0.40. HRI limited to 50 until data coverage improves.",
+}
+GATE_PILLAR={"gate.ki_kth":"M","gate.integrity":"I","gate.data_quality":"Q"}
+# Text of a gate without its values: what the drivers table interns, so one row serves every score.
+GATE_LABEL={
+    "gate.ki_kth":"Gating: K_I exceeds K_TH. Metallurgy pillar reduced and HRI capped at 40.",
+    "gate.integrity":"Gating: Integrity pillar I < 0.30. HRI limited to 40 until defects are remediated.",
+    "gate.data_quality":"Gating: Data Quality pillar Q < 0.40. HRI limited to 50 until data coverage improves.",
+}
+
+def gate_code(rule:str,*values:float)->Code:
+    return Code(GATE_PILLAR[rule],rule,0,0.0,tuple(values))
+
+@dataclass(frozen=True)
+class Band:
+    """One ordered band list from penalties.yaml: the first rule whose threshold matches wins.
+
+    ``op`` is the comparison ``x <op> threshold`` (">=", ">" or "<"). When the
+    thresholds are monotone in the direction that makes first-match equal to
+    best-match, lookups bisect a sorted copy; otherwise they scan in order.
+    """
+    op:str
+    thresholds:Tuple[float,...]
+    pens:Tuple[float,...]
+    labels:Tuple[str,...]
+    codes:Tuple[Optional[Code],...]
+    sorted_:bool
+    asc:Tuple[float,...]=field(repr=False)
+
+    @classmethod
+    def build(cls,rules:List[Dict[str,Any]],key:str,op:str,rule:str)->"Band":
+        th=tuple(float(r[key]) for r in rules)
+        pens=tuple(float(r["pen"]) for r in rules)
+        labels=tuple(f"{rule.split('.')[0]}: {r['label']}" for r in rules)
+        if op in (">=",">"):
+            ok=all(a>b for a,b in zip(th,th[1:])); asc=th[::-1]
+        else:
+            ok=all(a<b for a,b in zip(th,th[1:])); asc=th
+        return cls(op,th,pens,labels,tuple(_code(p,rule,j) for j,p in enumerate(pens)),ok,asc)
+
+    def _hit(self,x:float,t:float)->bool:
+        return x>=t if self.op==">=" else (x>t if self.op==">" else x<t)
+
+    def match(self,x:float)->int:
+        """Index of the first matching rule, or -1 (also for NaN)."""
+        if x!=x:
+            return -1
+        n=len(self.thresholds)
+        if not self.sorted_:
+            for j,t in enumerate(self.thresholds):
+                if self._hit(x,t): return j
+            return -1
+        if self.op==">=":
+            k=bisect_right(self.asc,x); return n-k if k else -1
+        if self.op==">":
+            k=bisect_left(self.asc,x); return n-k if k else -1
+        j=bisect_right(self.asc,x)
+        return j if j<n else -1
+
+    def match_array(self,x:np.ndarray)->np.ndarray:
+        """Vectorized match over a float column; NaN never matches."""
+        n=len(self.thresholds)
+        if not self.sorted_:
+            idx=np.full(x.shape,-1,dtype=np.intp)
+            with np.errstate(invalid="ignore"):
+                for j in range(n-1,-1,-1):
+                    hit=x>=self.thresholds[j] if self.op==">=" else (x>self.thresholds[j] if self.op==">" else x<self.thresholds[j])
+                    idx=np.where(hit,j,idx)
+            return idx
+        asc=np.asarray(self.asc)
+        if self.op in (">=",">"):
+            k=np.searchsorted(asc,x,side="right" if self.op==">=" else "left")
+            idx=np.where(k>0,n-k,-1)
+        else:
+            j=np.searchsorted(asc,x,side="right")
+            idx=np.where(j<n,j,-1)
+        return np.where(np.isnan(x),-1,idx).astype(np.intp)
+
+@dataclass(frozen=True)
+class Flag:
+    """A single fixed penalty with its driver code, label and optional threshold."""
+    pen:float
+    label:str
+    code:Optional[Code]
+    at:Optional[float]=None
+
+    @classmethod
+    def build(cls,pen:float,label:str,rule:str,band:int=0,at:Optional[float]=None)->"Flag":
+        return cls(float(pen),label,_code(float(pen),rule,band),None if at is None else float(at))
+
+@dataclass(frozen=True)
+class Ruleset:
+    """penalties.yaml compiled into lookup tables, identified by a hash of the file contents."""
+    version:str
+    cfg:Dict[str,Any]
+    weights:Dict[str,float]
+    bands:Dict[str,Band]
+    flags:Dict[str,Flag]
+    cycling:Tuple[Tuple[float,float,Flag],...]
+    coating:Tuple[Tuple[str,Flag],...]
+    mic:Dict[str,Flag]
+    stray:Dict[str,Flag]
+    labels:Dict[Tuple[str,int],str]=field(default_factory=dict,repr=False)
+
+def render(code:Code,rs:Ruleset)->str:
+    """Driver text for a code; labels come from ``rs``, the penalty from the code itself.
+
+    A gate without values renders as its GATE_LABEL.
+    """
+    if code.rule in GATE_TEXT:
+        return GATE_LABEL[code.rule] if code.values is None else GATE_TEXT[code.rule].format(*code.values)
+    label=rs.labels.get((code.rule,code.band),f"{code.pillar}: {code.rule} band {code.band}")
+    return _driver(code.penalty,label)
+
+def compile_rules(cfg:Dict[str,Any],version:str)->Ruleset:
+    M,D,I,C,E,Q,O=(cfg[k] for k in ("M","D","I","C","E","Q","O"))
+    bands={
+        "M.hardness":Band.build(M["hardness"],"min",">=","M.hardness"),
+        "M.yt_ratio":Band.build(M["yt_ratio"],"min",">=","M.yt_ratio"),
+        "D.stress_ratio":Band.build(D["stress_ratio"],"min",">=","D.stress_ratio"),
+        "D.range_only":Band.build(D["range_only"],"min",">=","D.range_only"),
+        "D.surges":Band.build(D["surges"],"min",">=","D.surges"),
+        "D.dpdt":Band.build(D["dpdt"],"min",">=","D.dpdt"),
+        "I.crack_density":Band.build(I["crack_density"],"min",">=","I.crack_density"),
+        "I.crack_len":Band.build(I["crack_len"],"min",">=","I.crack_len"),
+        "I.metal_loss":Band.build(I["metal_loss"],"min",">=","I.metal_loss"),
+        "C.coating_age":Band.build(C["coating_age"],"min",">=","C.coating_age"),
+        "C.dcvg":Band.build(C["dcvg"],"min",">=","C.dcvg"),
+        "C.overprot":Band.build(C["overprot"],"min",">=","C.overprot"),
+        "E.resistivity":Band.build(E["resistivity"],"max","<","E.resistivity"),
+        "Q.ili":Band.build(Q["ili"],"max","<","Q.ili"),
+        "Q.cp_age":Band.build(Q["cp_age"],"min",">","Q.cp_age"),
+        "Q.scada":Band.build(Q["scada"],"max","<","Q.scada"),
+        "Q.missing":Band.build(Q["missing"],"min",">=","Q.missing"),
+    }
+    flags={
+        "M.seam_pre1970":Flag.build(M["seam"]["erw_pre1970"],"M: Vintage ERW / pre-1970 seam","M.seam_pre1970"),
+        "M.seam_erw":Flag.build(M["seam"]["erw"],"M: ERW seam","M.seam_erw"),
+        "I.backlog":Flag.build(I["backlog_pen"],"I: High repair backlog / overdue repairs","I.backlog"),
+        "C.pot_screen":Flag.build(C["pot_screen"]["pen"],f"C: {C['pot_screen']['label']}","C.pot_screen",
+                                  at=C["pot_screen"]["min"]),
+        "E.ph_acid":Flag.build(E["ph"]["acid"]["pen"],f"E: {E['ph']['acid']['label']}","E.ph_acid",at=E["ph"]["acid"]["max"]),
+        "E.ph_alk":Flag.build(E["ph"]["alk"]["pen"],f"E: {E['ph']['alk']['label']}","E.ph_alk",at=E["ph"]["alk"]["min"]),
+        "E.moist":Flag.build(E["moist_pen"],"E: High moisture / wet soil","E.moist"),
+        "O.no_plan":Flag.build(O["no_plan"],"O: No hydrogen transition plan in place","O.no_plan"),
+        "O.no_sensors":Flag.build(O["no_sensors"],"O: No hydrogen-specific sensors/monitoring","O.no_sensors"),
+        "O.no_proc":Flag.build(O["no_proc"],"O: Procedures not updated for hydrogen","O.no_proc"),
+        "O.no_leak":Flag.build(O["no_leak"],"O: Leak detection not enhanced for hydrogen","O.no_leak"),
+        "O.no_training":Flag.build(O["no_training"],"O: Training/competency not confirmed","O.no_training"),
+    }
+    cycling=tuple((float(r["cycles_min"]),float(r["range_min"]),Flag.build(r["pen"],f"D: {r['label']}","D.cycling",j))
+                  for j,r in enumerate(D["cycling"]))
+    coating=tuple((k,Flag.build(p,f"C: {k} coating","C.coating",j)) for j,(k,p) in enumerate(C["coating_type"].items()))
+    mic={k:Flag.build(p,f"E: {k.upper()} MIC risk","E.mic",j) for j,(k,p) in enumerate(E["mic"].items())}
+    stray={k:Flag.build(p,f"E: {k.upper()} stray current risk","E.stray",j) for j,(k,p) in enumerate(E["stray"].items())}
+    labels={(k,j):label for k,b in bands.items() for j,label in enumerate(b.labels)}
+    for f in (*flags.values(),*(f for *_,f in cycling),*(f for _,f in coating),*mic.values(),*stray.values()):
+        if f.code is not None:
+            labels[(f.code.rule,f.code.band)]=f.label
+    return Ruleset(version=version,cfg=cfg,weights=cfg["weights"],bands=bands,flags=flags,
+                   cycling=cycling,coating=coating,mic=mic,stray=stray,labels=labels)
+
+def parse_rules(raw:bytes)->Ruleset:
+    """Compile penalties.yaml contents; the version is a hash of the bytes, so equal files get equal versions."""
+    return compile_rules(yaml.safe_load(raw),hashlib.sha256(raw).hexdigest()[:12])
+
+def load_rules(path:str=DEFAULT_PATH)->Ruleset:
+    with open(path,"rb") as f:
+        return parse_rules(f.read())
+
+_ACTIVE:Ruleset=load_rules()
+_LOCK=threading.Lock()
+
+def active()->Ruleset:
+    """The ruleset new scores should use; callers take one reference per score so a reload never mixes versions."""
+    return _ACTIVE
+
+def reload(path:Optional[str]=None)->Tuple[Ruleset,Ruleset]:
+    """Compile a penalties file and swap it in atomically; returns (previous, new).
+
+    A file that fails to parse or compile raises and leaves the active ruleset untouched.
+    Each uvicorn worker holds its own ruleset, so reload every worker.
+    """
+    global _ACTIVE
+    rs=load_rules(path or DEFAULT_PATH)
+    with _LOCK:
+        prev,_ACTIVE=_ACTIVE,rs
+    return prev,rs
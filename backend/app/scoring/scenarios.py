@@ -0,0 +1,143 @@
+from __future__ import annotations
+from typing import Any,Dict,List,Mapping,Optional,Sequence
+import time
+import numpy as np
+from sqlalchemy.orm import Session
+from app.core.config import SCENARIO_MAX_DETAIL_ROWS
+from app.scoring.batch import (FIELDS,NUMERIC_FIELDS,PILLARS,PILLAR_FIELDS,CLASSES,BatchResult,
+                               compute_hri_batch,score_pillars,apply_gates,round_hri,readiness_code_batch,
+                               readiness_class_batch)
+from app.scoring.rescore import iter_input_chunks
+from app.scoring.rules import Ruleset,active,render
+
+# Applied in this order: set replaces (any field, None clears), then numeric scale, add, floor and cap.
+OPS=("set","scale","add","floor","cap")
+
+def check_scenarios(scenarios:Sequence[Mapping[str,Any]]):
+    for sc in scenarios:
+        for op in OPS:
+            for f in sc.get(op) or {}:
+                if f not in FIELDS:
+                    raise ValueError(f"scenario {sc.get('name')}: unknown field {f}")
+                if op!="set" and f not in NUMERIC_FIELDS:
+                    raise ValueError(f"scenario {sc.get('name')}: {op} needs a numeric field, not {f}")
+
+def _floats(col:Sequence[Any])->np.ndarray:
+    return np.array([np.nan if v is None else v for v in col],dtype=float)
+
+def overlay(cols:Mapping[str,Sequence[Any]],n:int,sc:Mapping[str,Any])->Dict[str,Any]:
+    """Shallow copy of ``cols`` with the scenario's deltas applied; untouched columns are shared, missing stays missing."""
+    out=dict(cols)
+    for f,v in (sc.get("set") or {}).items():
+        out[f]=np.full(n,v,dtype=float) if f in NUMERIC_FIELDS and v is not None else [v]*n
+    for op in OPS[1:]:
+        for f,v in (sc.get(op) or {}).items():
+            x=out[f] if isinstance(out.get(f),np.ndarray) else _floats(out.get(f) or [None]*n)
+            if op=="scale":
+                x=x*v
+            elif op=="add":
+                x=x+v
+            elif op=="floor":
+                x=np.maximum(x,v)
+            else:
+                x=np.minimum(x,v)
+            out[f]=x
+    return out
+
+def touched_pillars(sc:Mapping[str,Any])->List[str]:
+    fields={f for op in OPS for f in (sc.get(op) or {})}
+    return [p for p in PILLARS if fields&set(PILLAR_FIELDS[p])]
+
+def score_scenario(cols:Mapping[str,Any],n:int,sc:Mapping[str,Any],base:Dict[str,np.ndarray],rs:Ruleset,
+                   with_drivers:bool=False)->BatchResult:
+    """Score one overlay, re-evaluating only the pillars it touches; identical to compute_hri_batch on the overlaid inputs.
+
+    ``base`` holds the un-overlaid clamped pillar scores from score_pillars.
+    """
+    cols=overlay(cols,n,sc)
+    if with_drivers:
+        return compute_hri_batch(cols,with_drivers=True,rs=rs)
+    pillars={**base,**score_pillars(cols,n,rs,touched_pillars(sc))}
+    ki=_floats(cols["ki_mpa_sqrtm"]) if "ki_mpa_sqrtm" in cols else np.full(n,np.nan)
+    kth=_floats(cols["kth_mpa_sqrtm"]) if "kth_mpa_sqrtm" in cols else np.full(n,np.nan)
+    hri,gates,_=apply_gates(pillars,ki,kth,rs)
+    hri=round_hri(hri)
+    return BatchResult(hri=hri,readiness_class=readiness_class_batch(hri),pillars=pillars,gates=gates)
+
+class _Summary:
+    """Portfolio aggregates of one scenario, accumulated chunk by chunk."""
+    def __init__(self,name:str):
+        self.name=name
+        self.n=0
+        self.hri_sum=0.0
+        self.hri_min=None
+        self.delta_sum=0.0
+        self.improved=0
+        self.worsened=0
+        self.classes=np.zeros(len(CLASSES),dtype=int)
+        self.gates:Dict[str,int]={}
+
+    def add(self,res:BatchResult,base_hri:Optional[np.ndarray]):
+        h=res.hri
+        self.n+=len(h)
+        self.hri_sum+=float(h.sum())
+        self.hri_min=float(h.min()) if self.hri_min is None else min(self.hri_min,float(h.min()))
+        self.classes+=np.bincount(readiness_code_batch(h),minlength=len(CLASSES))
+        for g,v in res.gates.items():
+            self.gates[g]=self.gates.get(g,0)+int(v.sum())
+        if base_hri is not None:
+            d=h-base_hri
+            self.delta_sum+=float(d.sum())
+            self.improved+=int((d>0).sum())
+            self.worsened+=int((d<0).sum())
+
+    def out(self)->Dict[str,Any]:
+        n=max(self.n,1)
+        return {"name":self.name,"segments":self.n,"mean_hri":round(self.hri_sum/n,3),"min_hri":self.hri_min,
+                "mean_delta_hri":round(self.delta_sum/n,3),"segments_improved":self.improved,
+                "segments_worsened":self.worsened,
+                "class_counts":{c:int(k) for c,k in zip(CLASSES,self.classes)},"gate_counts":self.gates}
+
+def _rows(ids:List[str],res:BatchResult,base_hri:np.ndarray,rs:Ruleset)->List[Dict[str,Any]]:
+    p={k:v.tolist() for k,v in res.pillars.items()}
+    hri=res.hri.tolist()
+    delta=(res.hri-base_hri).tolist()
+    return [{"segment_id":sid,"hri":hri[j],"readiness_class":res.readiness_class[j],
+             "delta_hri":round(delta[j],2),"pillars":{k:p[k][j] for k in PILLARS},
+             "drivers":[render(c,rs) for c in res.drivers[j]] if res.drivers is not None else None}
+            for j,sid in enumerate(ids)]
+
+def run_scenarios(db:Session,scenarios:Sequence[Mapping[str,Any]],segment_ids:Optional[List[str]]=None,
+                  pipeline_id:Optional[str]=None,region:Optional[str]=None,detail:bool=False,
+                  with_drivers:bool=False)->Dict[str,Any]:
+    """Score overlay scenarios against stored inputs in memory; nothing is written.
+
+    Inputs are read once per chunk and every scenario is scored against that chunk, so a
+    scenario costs only its touched pillars plus the gates.
+    """
+    check_scenarios(scenarios)
+    rs=active()
+    t=time.perf_counter()
+    baseline=_Summary("baseline")
+    sums=[_Summary(sc["name"]) for sc in scenarios]
+    details:List[List[Dict[str,Any]]]=[[] for _ in scenarios]
+    for ids,cols,_ in iter_input_chunks(db,pipeline_id,region,segment_ids=segment_ids):
+        n=len(ids)
+        base=score_pillars(cols,n,rs)
+        ref=score_scenario(cols,n,{},base,rs)
+        baseline.add(ref,None)
+        for j,sc in enumerate(scenarios):
+            res=score_scenario(cols,n,sc,base,rs,with_drivers and detail)
+            sums[j].add(res,ref.hri)
+            if detail:
+                details[j]+=_rows(ids,res,ref.hri,rs)
+        if detail and baseline.n*len(scenarios)>SCENARIO_MAX_DETAIL_ROWS:
+            raise ValueError(f"detail would exceed {SCENARIO_MAX_DETAIL_ROWS} rows; narrow the segments or request summaries only")
+    out=[]
+    for j,s in enumerate(sums):
+        r=s.out()
+        if detail:
+            r["results"]=details[j]
+        out.append(r)
+    return {"ruleset_version":rs.version,"segments":baseline.n,"elapsed_s":round(time.perf_counter()-t,3),
+            "baseline":baseline.out(),"scenarios":out}
@@ -0,0 +1,176 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Any,Dict,List,Mapping,Optional,Sequence,Tuple
+import heapq,time
+import numpy as np
+from sqlalchemy.orm import Session
+from app.scoring.batch import compute_hri_batch,score_pillars,apply_gates,round_hri,readiness_class_batch
+from app.scoring.rescore import iter_input_chunks
+from app.scoring.rules import Band,Ruleset,active
+
+BAND_FIELDS={
+    "M.hardness":"hardness_haz_hv","M.yt_ratio":"yt_ratio","D.stress_ratio":"stress_ratio",
+    "D.surges":"surge_events_per_year","D.dpdt":"dpdt_p95_bar_per_s",
+    "I.crack_density":"crack_density_per_km","I.crack_len":"max_crack_length_mm","I.metal_loss":"max_metal_loss_pct",
+    "C.coating_age":"coating_age_years","C.dcvg":"dcvg_anomaly_pct","C.overprot":"cp_overprotect_pct",
+    "E.resistivity":"soil_resistivity_ohm_cm",
+    "Q.ili":"ili_coverage_pct","Q.cp_age":"cp_survey_age_months","Q.scada":"scada_uptime_pct","Q.missing":"missing_fields_pct",
+}
+# Pass/fail inputs and the value that clears their penalty.
+FLAG_FIELDS={"repair_backlog_high":("I",False),"moisture_high":("E",False),
+             "has_h2_plan":("O",True),"h2_sensors":("O",True),"operating_procedure_updated":("O",True),
+             "leak_detection_enhanced":("O",True),"training_complete":("O",True)}
+RECOAT_TO="FBE"
+# seam_type is left out: changing it means replacing pipe, not moving an input.
+# Side of a band's threshold the next better band lies on, by the band's comparison.
+BETTER={">=":"<",">":"<=","<":">="}
+
+@dataclass
+class Move:
+    """One candidate intervention: a field, the pillar it feeds and per-segment target values (None = not applicable).
+
+    For numeric moves the target is a threshold and ``ops`` holds the comparison the input must meet
+    against it ("<" means strictly below the target).
+    """
+    field:str
+    pillar:Optional[str]
+    target:List[Any]
+    ops:Optional[List[Optional[str]]]=None
+
+def _col(cols:Mapping[str,Sequence[Any]],f:str,n:int)->Sequence[Any]:
+    return cols[f] if cols.get(f) is not None else [None]*n
+
+def _floats(col:Sequence[Any])->np.ndarray:
+    return np.array([np.nan if v is None else v for v in col],dtype=float)
+
+def _band_target(band:Band,x:np.ndarray)->np.ndarray:
+    """The matched rule's threshold (NaN where no rule matches); the next better band is on its BETTER[op] side."""
+    idx=band.match_array(x)
+    return np.where(idx>=0,np.array(band.thresholds+(np.nan,))[idx],np.nan)
+
+def _numeric(field:str,pillar:Optional[str],target:np.ndarray,op)->Move:
+    """A threshold move; ``op`` is one comparison for every segment or an array of them."""
+    ops=np.broadcast_to(np.asarray(op,dtype=object),target.shape).tolist()
+    keep=[v==v for v in target.tolist()]
+    return Move(field,pillar,[v if k else None for v,k in zip(target.tolist(),keep)],
+                [o if k else None for o,k in zip(ops,keep)])
+
+def _meeting(target:float,op:Optional[str])->float:
+    """A value that satisfies ``x <op> target``, scored in place of the threshold itself."""
+    if op=="<":
+        return float(np.nextafter(target,-np.inf))
+    if op==">":
+        return float(np.nextafter(target,np.inf))
+    return target
+
+def _level_target(col:Sequence[Any],table:Mapping[str,Any])->List[Any]:
+    """Next lower-penalty risk level (missing counts as 'low', like the engine)."""
+    order=sorted(table,key=lambda k:table[k].pen)
+    out=[]
+    for v in col:
+        cur=(v or "low").lower()
+        if cur not in table:
+            out.append(None); continue
+        better=[k for k in order if table[k].pen<table[cur].pen]
+        out.append(better[-1] if better else None)
+    return out
+
+def moves(cols:Mapping[str,Sequence[Any]],n:int,rs:Ruleset)->List[Move]:
+    """Every next-better-band move for a chunk of segments."""
+    num=lambda f:_floats(_col(cols,f,n))
+    out=[_numeric(f,key[0],_band_target(rs.bands[key],num(f)),BETTER[rs.bands[key].op]) for key,f in BAND_FIELDS.items()]
+
+    cycles,rng=num("cycles_per_day"),num("cycle_range_bar")
+    both=~np.isnan(cycles)&~np.isnan(rng)
+    cyc=np.full(n,np.nan)
+    with np.errstate(invalid="ignore"):
+        for cmin,rmin,_ in reversed(rs.cycling):
+            cyc=np.where((cycles>=cmin)&(rng>=rmin),rmin,cyc)
+    out.append(_numeric("cycle_range_bar","D",np.where(both,cyc,_band_target(rs.bands["D.range_only"],rng)),
+                        np.where(both,"<",BETTER[rs.bands["D.range_only"].op])))
+
+    scr=rs.flags["C.pot_screen"]
+    pot=num("cp_potential_avg_v")
+    with np.errstate(invalid="ignore"):
+        out.append(_numeric("cp_potential_avg_v","C",np.where(pot<=scr.at,scr.at,np.nan),">"))
+        ph=num("soil_ph")
+        acid,alk=rs.flags["E.ph_acid"],rs.flags["E.ph_alk"]
+        out.append(_numeric("soil_ph","E",np.where(ph<=acid.at,acid.at,np.where(ph>=alk.at,alk.at,np.nan)),
+                            np.where(ph<=acid.at,">","<")))
+
+    coat=[(v or "").lower() for v in _col(cols,"coating_type",n)]
+    out.append(Move("coating_type","C",[RECOAT_TO if any(k in v and f.pen>0 for k,f in rs.coating) else None for v in coat]))
+    out.append(Move("mic_risk","E",_level_target(_col(cols,"mic_risk",n),rs.mic)))
+    out.append(Move("stray_current_risk","E",_level_target(_col(cols,"stray_current_risk",n),rs.stray)))
+    for f,(p,good) in FLAG_FIELDS.items():
+        out.append(Move(f,p,[None if bool(v)==good else good for v in _col(cols,f,n)]))
+
+    ki,kth=num("ki_mpa_sqrtm"),num("kth_mpa_sqrtm")
+    with np.errstate(invalid="ignore"):
+        out.append(_numeric("ki_mpa_sqrtm",None,np.where(ki>kth,kth,np.nan),"<="))
+    return out
+
+def evaluate(ids:List[str],cols:Mapping[str,Sequence[Any]],rs:Ruleset)->List[Dict[str,Any]]:
+    """Score every applicable move for a chunk; one row per (segment, move) with a non-zero HRI change."""
+    n=len(ids)
+    base_p=score_pillars(cols,n,rs)
+    ref=compute_hri_batch(cols,rs=rs)
+    ki,kth=_floats(_col(cols,"ki_mpa_sqrtm",n)),_floats(_col(cols,"kth_mpa_sqrtm",n))
+    out=[]
+    for mv in moves(cols,n,rs):
+        hit=[j for j,v in enumerate(mv.target) if v is not None]
+        if not hit:
+            continue
+        cur=_col(cols,mv.field,n)
+        new=list(cur)
+        for j in hit:
+            new[j]=_meeting(mv.target[j],mv.ops[j]) if mv.ops else mv.target[j]
+        mod={**cols,mv.field:new}
+        pillars={**base_p,**(score_pillars(mod,n,rs,[mv.pillar]) if mv.pillar else {})}
+        k_new=_floats(new) if mv.field=="ki_mpa_sqrtm" else ki
+        hri,gates,_=apply_gates(pillars,k_new,kth,rs)
+        hri=round_hri(hri)
+        klass=readiness_class_batch(hri)
+        gain=hri-ref.hri
+        for j in hit:
+            if gain[j]==0:
+                continue
+            out.append({"segment_id":ids[j],"field":mv.field,"pillar":mv.pillar,
+                        "current":cur[j],"target":mv.target[j],
+                        "condition":f"{mv.ops[j]} {mv.target[j]:g}" if mv.ops else None,
+                        "hri":float(ref.hri[j]),"new_hri":float(hri[j]),"gain_hri":round(float(gain[j]),2),
+                        "new_readiness_class":klass[j],
+                        "gates_released":[g for g,v in gates.items() if ref.gates[g][j] and not v[j]]})
+    return out
+
+def run_sensitivity(db:Session,segment_ids:Optional[List[str]]=None,pipeline_id:Optional[str]=None,
+                    region:Optional[str]=None,limit:int=100,min_gain:float=0.0)->Dict[str,Any]:
+    """Interventions ranked by HRI gain, portfolio-wide top ``limit`` plus per-field totals."""
+    rs=active()
+    t=time.perf_counter()
+    top:List[Tuple[float,int,Dict[str,Any]]]=[]
+    by_field:Dict[str,Dict[str,Any]]={}
+    segments=0
+    seq=0
+    for ids,cols,_ in iter_input_chunks(db,pipeline_id,region,segment_ids=segment_ids):
+        segments+=len(ids)
+        for r in evaluate(ids,cols,rs):
+            if r["gain_hri"]<=min_gain:
+                continue
+            agg=by_field.setdefault(r["field"],{"field":r["field"],"pillar":r["pillar"],"segments":0,
+                                                "total_gain_hri":0.0,"max_gain_hri":0.0,"gates_released":0})
+            agg["segments"]+=1
+            agg["total_gain_hri"]+=r["gain_hri"]
+            agg["max_gain_hri"]=max(agg["max_gain_hri"],r["gain_hri"])
+            agg["gates_released"]+=bool(r["gates_released"])
+            # Ties keep scan order (pipeline chunks by segment id); seq keeps dicts out of comparisons.
+            item=(r["gain_hri"],-seq,r); seq+=1
+            if len(top)<limit:
+                heapq.heappush(top,item)
+            elif item[:2]>top[0][:2]:
+                heapq.heapreplace(top,item)
+    fields=sorted(by_field.values(),key=lambda a:-a["total_gain_hri"])
+    for a in fields:
+        a["total_gain_hri"]=round(a["total_gain_hri"],2)
+    return {"ruleset_version":rs.version,"segments":segments,"elapsed_s":round(time.perf_counter()-t,3),
+            "interventions":[r for _,_,r in sorted(top,key=lambda i:i[:2],reverse=True)],"by_field":fields}
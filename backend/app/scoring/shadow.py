@@ -0,0 +1,116 @@
+from __future__ import annotations
+from typing import Any,Dict,List,Optional
+import time
+import numpy as np
+from sqlalchemy.orm import Session
+from app.core.config import SHADOW_TOP
+from app.db.models import Segment
+from app.scoring.batch import PILLARS,CLASSES,BatchResult,compute_hri_batch,prepare_columns,readiness_code_batch
+from app.scoring.engine import MODEL_VERSION
+from app.scoring.rescore import iter_input_chunks
+from app.scoring.rules import Ruleset,active
+
+# Buckets of the HRI change (candidate - active); unchanged segments are counted separately.
+DELTA_EDGES=(-20.0,-10.0,-5.0,-1.0,0.0,1.0,5.0,10.0,20.0)
+GATES=("ki_kth","integrity","data_quality")
+
+class _Diff:
+    """Portfolio diff of two rulesets, accumulated chunk by chunk."""
+    def __init__(self,top:int):
+        self.top=top
+        self.n=0
+        self.km=0.0
+        self.unchanged=0
+        k=len(CLASSES)
+        self.moves=np.zeros(k*k,dtype=np.int64)
+        self.moves_km=np.zeros(k*k)
+        b=len(DELTA_EDGES)+1
+        self.buckets=np.zeros(b,dtype=np.int64)
+        self.buckets_km=np.zeros(b)
+        self.hri_km={"active":0.0,"candidate":0.0}
+        self.pillar_km={side:dict.fromkeys(PILLARS,0.0) for side in ("active","candidate")}
+        self.gates={g:dict.fromkeys(("active","candidate","triggered","cleared","triggered_km"),0) for g in GATES}
+        self.largest:List[Dict[str,Any]]=[]
+
+    def add(self,ids:List[str],pids:List[str],km:np.ndarray,a:BatchResult,c:BatchResult):
+        n=len(ids)
+        self.n+=n
+        self.km+=float(km.sum())
+        k=len(CLASSES)
+        ca,cc=readiness_code_batch(a.hri),readiness_code_batch(c.hri)
+        self.moves+=np.bincount(ca*k+cc,minlength=k*k)
+        self.moves_km+=np.bincount(ca*k+cc,weights=km,minlength=k*k)
+        d=c.hri-a.hri
+        changed=d!=0
+        self.unchanged+=int((~changed).sum())
+        # Buckets are [min_delta, max_delta): a delta on an edge goes to the bucket above it.
+        b=np.searchsorted(DELTA_EDGES,d[changed],side="right")
+        self.buckets+=np.bincount(b,minlength=len(self.buckets))
+        self.buckets_km+=np.bincount(b,weights=km[changed],minlength=len(self.buckets))
+        for side,r in (("active",a),("candidate",c)):
+            self.hri_km[side]+=float(r.hri@km)
+            for p in PILLARS:
+                self.pillar_km[side][p]+=float(r.pillars[p]@km)
+        new_gates={}
+        for g in GATES:
+            ga,gc=a.gates[g],c.gates[g]
+            new_gates[g]=gc&~ga
+            s=self.gates[g]
+            s["active"]+=int(ga.sum())
+            s["candidate"]+=int(gc.sum())
+            s["triggered"]+=int(new_gates[g].sum())
+            s["cleared"]+=int((ga&~gc).sum())
+            s["triggered_km"]+=float(km[new_gates[g]].sum())
+        if self.top<=0 or not changed.any():
+            return
+        # Keep only this chunk's top candidates, then trim the running list back to ``top``.
+        cand=np.flatnonzero(changed)
+        if len(cand)>self.top:
+            cand=cand[np.argpartition(-np.abs(d[cand]),self.top-1)[:self.top]]
+        for j in cand.tolist():
+            self.largest.append({"segment_id":ids[j],"pipeline_id":pids[j],"km":round(float(km[j]),3),
+                                 "hri_active":float(a.hri[j]),"hri_candidate":float(c.hri[j]),
+                                 "delta_hri":round(float(d[j]),2),
+                                 "class_active":CLASSES[ca[j]],"class_candidate":CLASSES[cc[j]],
+                                 "gates_triggered":[g for g in GATES if new_gates[g][j]]})
+        self.largest.sort(key=lambda r:(-abs(r["delta_hri"]),r["segment_id"]))
+        del self.largest[self.top:]
+
+    def out(self)->Dict[str,Any]:
+        km=self.km
+        mean=lambda v:round(v/km,4) if km>0 else None
+        k=len(CLASSES)
+        moves=[{"from_class":CLASSES[i//k],"to_class":CLASSES[i%k],"segments":int(self.moves[i]),
+                "km":round(float(self.moves_km[i]),3)}
+               for i in np.flatnonzero(self.moves).tolist() if i//k!=i%k]
+        edges=(None,*DELTA_EDGES,None)
+        buckets=[{"min_delta":edges[i],"max_delta":edges[i+1],"segments":int(self.buckets[i]),
+                  "km":round(float(self.buckets_km[i]),3)} for i in range(len(self.buckets)) if self.buckets[i]]
+        return {"segments":self.n,"km":round(km,3),"segments_unchanged":self.unchanged,
+                "segments_changing_class":sum(m["segments"] for m in moves),
+                "km_changing_class":round(sum(m["km"] for m in moves),3),
+                "hri_active":mean(self.hri_km["active"]),"hri_candidate":mean(self.hri_km["candidate"]),
+                "class_changes":moves,"hri_delta_buckets":buckets,
+                "pillars":{side:{p:mean(v) for p,v in ps.items()} for side,ps in self.pillar_km.items()},
+                "gates":{g:{**v,"triggered_km":round(v["triggered_km"],3)} for g,v in self.gates.items()},
+                "largest_changes":self.largest}
+
+def shadow_diff(db:Session,candidate:Ruleset,pipeline_id:Optional[str]=None,region:Optional[str]=None,
+                segment_ids:Optional[List[str]]=None,top:int=SHADOW_TOP)->Dict[str,Any]:
+    """Score stored inputs under the active and a candidate ruleset in one pass and diff the results; nothing is written.
+
+    Both scorings run on the same input chunk, vectorized and without drivers. Means and bucket
+    totals are km-weighted; ``largest_changes`` lists the ``top`` segments with the biggest HRI change.
+    """
+    rs=active()
+    t=time.perf_counter()
+    diff=_Diff(top)
+    extra={"_km":Segment.end_km-Segment.start_km,"_pipeline_id":Segment.pipeline_id}
+    for ids,cols,_ in iter_input_chunks(db,pipeline_id,region,segment_ids=segment_ids,extra=extra):
+        km=np.array(cols["_km"],dtype=float)
+        cols=prepare_columns(cols)
+        a=compute_hri_batch(cols,rs=rs)
+        c=compute_hri_batch(cols,rs=candidate)
+        diff.add(ids,cols["_pipeline_id"],km,a,c)
+    return {"active_version":rs.version,"candidate_version":candidate.version,"model_version":MODEL_VERSION,
+            "elapsed_s":round(time.perf_counter()-t,3),**diff.out()}
@@ -0,0 +1,178 @@
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any,Dict,List,Mapping,Optional,Sequence,Tuple
+import time,zlib
+import numpy as np
+from sqlalchemy.orm import Session
+from app.core.config import MC_DRAWS,MC_MAX_DRAWS,MC_MAX_CELLS,MC_WORKERS
+from app.scoring.batch import (NUMERIC_FIELDS,PILLARS,PILLAR_FIELDS,GATE_FIELDS,CLASSES,
+                               compute_hri_batch,rule_penalties,apply_gates,readiness_code_batch)
+from app.scoring.rescore import iter_input_chunks
+from app.scoring.rules import Ruleset,active
+
+# Typical measurement error when a request gives no distributions: fracture toughness tests scatter
+# ~10-15%, field HAZ hardness readings ~10 HV and ILI crack sizing roughly +/-25%.
+DEFAULT_DISTRIBUTIONS:Dict[str,Dict[str,Any]]={
+    "ki_mpa_sqrtm":{"dist":"normal","cv":0.10,"min":0.0},
+    "kth_mpa_sqrtm":{"dist":"normal","cv":0.15,"min":0.0},
+    "hardness_haz_hv":{"dist":"normal","sd":10.0,"min":0.0},
+    "max_crack_length_mm":{"dist":"lognormal","cv":0.25},
+}
+DISTS=("normal","lognormal","uniform","triangular")
+# Fields whose rules read them jointly must be varied together (D cycling needs both).
+COUPLED=(("cycles_per_day","cycle_range_bar"),)
+
+def check_distributions(specs:Mapping[str,Mapping[str,Any]]):
+    for f,spec in specs.items():
+        if f not in NUMERIC_FIELDS:
+            raise ValueError(f"{f} is not a numeric SegmentInputs field")
+        if spec.get("dist","normal") not in DISTS:
+            raise ValueError(f"{f}: dist must be one of {', '.join(DISTS)}")
+        if spec.get("sd") is None and spec.get("cv") is None:
+            raise ValueError(f"{f}: give sd or cv")
+        if spec.get("dist")=="lognormal" and spec.get("cv") is None:
+            raise ValueError(f"{f}: lognormal takes cv (log-space sigma)")
+
+def check_run(draws:int,percentiles:Sequence[float]):
+    if not 1<=draws<=MC_MAX_DRAWS:
+        raise ValueError(f"draws must be between 1 and {MC_MAX_DRAWS}")
+    if not percentiles or any(not 0<=q<=100 for q in percentiles):
+        raise ValueError("percentiles must be within 0-100")
+
+def _varied(specs:Mapping[str,Any])->Tuple[str,...]:
+    out=set(specs)
+    for group in COUPLED:
+        if out&set(group):
+            out|=set(group)
+    return tuple(f for f in NUMERIC_FIELDS if f in out)
+
+def _sample(rng:np.random.Generator,center:float,spec:Mapping[str,Any],k:int)->np.ndarray:
+    """k draws around a segment's stored value; a missing value stays missing."""
+    if spec.get("value") is not None:
+        center=float(spec["value"])
+    if center!=center:
+        return np.full(k,np.nan)
+    dist=spec.get("dist","normal")
+    spread=spec["sd"] if spec.get("sd") is not None else spec["cv"]*abs(center)
+    if dist=="normal":
+        x=center+spread*rng.standard_normal(k)
+    elif dist=="lognormal":
+        x=center*np.exp(spec["cv"]*rng.standard_normal(k)) if center>0 else np.full(k,center)
+    elif dist=="uniform":
+        x=center+spread*rng.uniform(-1.0,1.0,k)
+    else:
+        x=center+spread*rng.triangular(-1.0,0.0,1.0,k)
+    if spec.get("min") is not None or spec.get("max") is not None:
+        x=np.clip(x,spec.get("min"),spec.get("max"))
+    return x
+
+def _floats(cols:Mapping[str,Sequence[Any]],f:str,n:int)->np.ndarray:
+    col=cols.get(f)
+    if col is None:
+        return np.full(n,np.nan)
+    return np.array([np.nan if v is None else v for v in col],dtype=float)
+
+def segment_rng(seed:int,segment_id:str)->np.random.Generator:
+    """Per-segment stream, so a segment's draws do not depend on chunking, workers or which other segments ran."""
+    return np.random.default_rng([seed,zlib.crc32(segment_id.encode())])
+
+def simulate(ids:Sequence[str],cols:Mapping[str,Sequence[Any]],specs:Mapping[str,Mapping[str,Any]],draws:int,
+             seed:int,rs:Ruleset,percentiles:Sequence[float]=(5,50,95))->List[Dict[str,Any]]:
+    """Monte Carlo HRI for a chunk of segments (ids x draws cells evaluated at once).
+
+    Every rule reads one field (or one COUPLED group), so rules on non-sampled fields are scored
+    once per segment and only rules on sampled fields run on the ids x draws grid. A grid rule
+    whose penalty differs from the empty-row penalty overrides the per-segment one; penalties are
+    then subtracted in rule order, so zero-spread draws reproduce compute_hri_batch exactly.
+    HRI is rounded with np.round rather than round().
+    """
+    n,k=len(ids),draws
+    varied=_varied(specs)
+    touched=[p for p in PILLARS if set(PILLAR_FIELDS[p])&set(varied)]
+    base=rule_penalties({f:(None if f in varied else v) for f,v in cols.items()},n,rs)
+    empty=rule_penalties({},1,rs,touched)
+
+    grid:Dict[str,np.ndarray]={}
+    if varied:
+        centers={f:_floats(cols,f,n) for f in varied}
+        grid={f:np.empty((n,k)) for f in varied}
+        for j,sid in enumerate(ids):
+            rng=segment_rng(seed,sid)
+            for f in varied:
+                spec=specs.get(f)
+                grid[f][j]=_sample(rng,centers[f][j],spec,k) if spec else centers[f][j]
+        grid={f:v.ravel() for f,v in grid.items()}
+    var=rule_penalties(grid,n*k,rs,touched) if touched else {}
+
+    pillars={}
+    for p in PILLARS:
+        if p in var:
+            raw=np.ones((n,k))
+            for b,v,e in zip(base[p],var[p],empty[p]):
+                v=v.reshape(n,k)
+                hit=v!=e[0]
+                raw-=np.where(hit,v,b[:,None]) if hit.any() else b[:,None]
+            raw=raw.ravel()
+        else:
+            raw=np.ones(n)
+            for b in base[p]:
+                raw=raw-b
+            raw=np.repeat(raw,k)
+        pillars[p]=np.maximum(0.0,np.minimum(1.0,raw))
+    gate={f:grid[f] if f in grid else np.repeat(_floats(cols,f,n),k) for f in GATE_FIELDS}
+    hri,gates,_=apply_gates(pillars,gate["ki_mpa_sqrtm"],gate["kth_mpa_sqrtm"],rs)
+    hri=np.round(hri,2)
+    codes=readiness_code_batch(hri).reshape(n,k)
+    hri=hri.reshape(n,k)
+
+    det=compute_hri_batch(cols,rs=rs)
+    pct=np.percentile(hri,list(percentiles),axis=1)
+    mean,std=hri.mean(axis=1),hri.std(axis=1)
+    cls=np.stack([(codes==c).mean(axis=1) for c in range(len(CLASSES))])
+    gp={g:v.reshape(n,k).mean(axis=1) for g,v in gates.items()}
+    return [{"segment_id":sid,
+             "hri_deterministic":float(det.hri[j]),
+             "readiness_class_deterministic":str(det.readiness_class[j]),
+             "hri_mean":round(float(mean[j]),3),
+             "hri_std":round(float(std[j]),3),
+             "hri_percentiles":{f"p{q:g}":float(pct[m][j]) for m,q in enumerate(percentiles)},
+             "class_probabilities":{c:float(cls[m][j]) for m,c in enumerate(CLASSES)},
+             "gate_probabilities":{g:float(v[j]) for g,v in gp.items()}}
+            for j,sid in enumerate(ids)]
+
+def _simulate_task(args)->List[Dict[str,Any]]:
+    return simulate(*args)
+
+def _tasks(chunks,specs,draws,seed,rs,percentiles):
+    """Split input chunks so each simulate call holds at most MC_MAX_CELLS segment x draw cells."""
+    rows=max(1,MC_MAX_CELLS//draws)
+    for ids,cols,_ in chunks:
+        for s in range(0,len(ids),rows):
+            yield (ids[s:s+rows],{f:v[s:s+rows] for f,v in cols.items()},specs,draws,seed,rs,percentiles)
+
+def run_uncertainty(db:Session,segment_ids:Optional[List[str]]=None,pipeline_id:Optional[str]=None,
+                    region:Optional[str]=None,distributions:Optional[Mapping[str,Mapping[str,Any]]]=None,
+                    draws:int=MC_DRAWS,seed:Optional[int]=None,percentiles:Sequence[float]=(5,50,95),
+                    workers:int=MC_WORKERS,id_range:Optional[Tuple[Optional[str],Optional[str]]]=None)->Dict[str,Any]:
+    """Monte Carlo uncertainty for one segment, a pipeline, a region or the portfolio.
+
+    ``workers`` > 1 fans chunks out to a process pool; results are identical either way.
+    """
+    specs=dict(DEFAULT_DISTRIBUTIONS if distributions is None else distributions)
+    check_distributions(specs)
+    if seed is None:
+        seed=int(np.random.SeedSequence().generate_state(1)[0])
+    rs=active()
+    t=time.perf_counter()
+    chunks=iter_input_chunks(db,pipeline_id,region,segment_ids=segment_ids,id_range=id_range)
+    tasks=_tasks(chunks,specs,draws,seed,rs,tuple(percentiles))
+    out:List[Dict[str,Any]]=[]
+    if workers>1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for res in pool.map(_simulate_task,tasks):
+                out+=res
+    else:
+        for task in tasks:
+            out+=_simulate_task(task)
+    return {"draws":draws,"seed":seed,"ruleset_version":rs.version,"distributions":specs,
+            "elapsed_s":round(time.perf_counter()-t,3),"segments":out}
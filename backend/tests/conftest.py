@@ -0,0 +1,66 @@
+"""Tests run against a throwaway SQLite file; DATABASE_URL is set before app.db creates its engines."""
+import io,os,tempfile
+os.environ["DATABASE_URL"]=f"sqlite:///{os.path.join(tempfile.mkdtemp(),'h2ready-test.db')}"
+import pytest
+
+def reset_db():
+    """Drop and recreate every table; cached driver ids go with them."""
+    from app.db.database import Base,engine
+    from app.db.init_db import init_db
+    from app.scoring.history import INTERNER
+    Base.metadata.drop_all(bind=engine)
+    INTERNER.clear()
+    init_db()
+
+def line_segments(db,n=4):
+    """Pipeline p1 with n one-km segments s0.. starting at km 0."""
+    from app.db.models import Pipeline,Segment
+    db.add(Pipeline(id="p1",name="Line 1",region="UK"))
+    db.add_all([Segment(id=f"s{j}",pipeline_id="p1",start_km=j,end_km=j+1) for j in range(n)])
+    db.commit()
+
+def stored_inputs(db):
+    """Stored inputs by segment id, limited to fields that are set somewhere."""
+    from sqlalchemy import select
+    from app.db.models import SegmentInputs
+    from app.scoring.batch import FIELDS
+    rows={r.segment_id:{f:getattr(r,f) for f in FIELDS} for r in db.scalars(select(SegmentInputs))}
+    used=[f for f in FIELDS if any(v[f] is not None for v in rows.values())]
+    return {k:{f:v[f] for f in used} for k,v in rows.items()}
+
+def as_file(df,fmt):
+    """A DataFrame written to an in-memory CSV or Parquet upload."""
+    buf=io.BytesIO()
+    if fmt=="csv":
+        df.to_csv(buf,index=False)
+    else:
+        df.to_parquet(buf,index=False)
+    buf.seek(0)
+    return buf
+
+def by_chunk_size(db,ingest,sizes):
+    """Run ``ingest(db,chunk_size)`` on a fresh database per chunk size; (result, stored inputs) of each."""
+    out=[]
+    for size in sizes:
+        reset_db()
+        res=ingest(db,size)
+        db.expire_all()
+        out.append((res,stored_inputs(db)))
+    return out
+
+@pytest.fixture
+def db():
+    from app.db.database import SessionLocal
+    reset_db()
+    s=SessionLocal()
+    try:
+        yield s
+    finally:
+        s.close()
+
+@pytest.fixture
+def client(db):
+    from fastapi.testclient import TestClient
+    from app.main import app
+    with TestClient(app) as c:
+        yield c
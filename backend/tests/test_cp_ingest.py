@@ -0,0 +1,30 @@
+"""CP survey aggregation: the chunk size never changes the segment aggregates."""
+from datetime import datetime
+import pandas as pd
+from conftest import as_file,by_chunk_size,line_segments
+from app.ingest.cp import ingest_cp
+
+CP=pd.DataFrame({
+    "pipeline_id":["p1","p1","p1","p1","p1"],
+    "chainage_km":[0.1,0.9,1.5,2.5,7.0],
+    "potential_v":[-1.0,-1.3,-0.9,-1.25,-1.0],
+    "timestamp":["2024-06-01T00:00:00Z","2024-03-01T00:00:00Z","2024-01-01T00:00:00Z",None,"2024-01-01T00:00:00Z"],
+})
+
+def test_cp_chunk_sizes(db):
+    as_of=datetime(2024,7,1)
+    def ingest(db,size):
+        line_segments(db)
+        return ingest_cp(db,as_file(CP,"csv"),"csv",as_of=as_of,chunk_size=size)
+    runs=by_chunk_size(db,ingest,[1,2,100])
+    for res,inputs in runs:
+        assert res==runs[-1][0]
+        assert inputs==runs[-1][1]
+    res,inputs=runs[-1]
+    assert (res["readings_assigned"],res["readings_unmatched"],res["readings_overprotected"])==(4,1,2)
+    # Overprotected means at or below C.pot_screen (-1.25 V); the undated reading leaves survey age unset.
+    assert inputs=={
+        "s0":{"cp_potential_avg_v":-1.15,"cp_overprotect_pct":50.0,"cp_survey_age_months":0.99},
+        "s1":{"cp_potential_avg_v":-0.9,"cp_overprotect_pct":0.0,"cp_survey_age_months":5.98},
+        "s2":{"cp_potential_avg_v":-1.25,"cp_overprotect_pct":100.0,"cp_survey_age_months":None},
+    }
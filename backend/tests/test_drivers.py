@@ -0,0 +1,69 @@
+"""Driver interning: gates take one drivers row per rule, their values live on the score and are rendered at the edge."""
+import json
+from sqlalchemy import func,select
+from app.db.models import CurrentScore,Driver,HRIScore
+from app.scoring.engine import MODEL_VERSION,compute_hri
+from app.scoring.history import Interner,compact_history,load_drivers,split_gates
+from app.scoring.rules import GATE_LABEL,active,gate_code,render
+
+INPUTS={"hardness_haz_hv":265.0,"kth_mpa_sqrtm":40.0,"smys_mpa":359.0,"coating_type":"FBE"}
+KI=(46.0,50.5,55.0)
+
+def _gated(client):
+    client.post("/pipelines",json={"id":"p1","name":"Line 1"})
+    for j,ki in enumerate(KI):
+        client.post("/segments",json={"id":f"s{j}","pipeline_id":"p1","start_km":j,"end_km":j+1})
+        client.post(f"/segments/s{j}/inputs",json={**INPUTS,"ki_mpa_sqrtm":ki})
+    assert client.post("/scores/rescore").json()["segments_scored"]==len(KI)
+
+def _expected(ki):
+    rs=active()
+    return [render(c,rs) for c in compute_hri({**INPUTS,"ki_mpa_sqrtm":ki},rs)[3]]
+
+def test_gates_intern_once_and_render_their_values(client,db):
+    _gated(client)
+    gates=db.execute(select(Driver.text,Driver.rule).where(Driver.rule=="gate.ki_kth")).all()
+    assert gates==[(GATE_LABEL["gate.ki_kth"],"gate.ki_kth")]
+    for j,ki in enumerate(KI):
+        hist=client.get(f"/segments/s{j}/hri/history").json()
+        assert [h["drivers"] for h in hist]==[_expected(ki)]
+        assert f"K_I = {ki} MPa√m exceeds K_TH = 40.0 MPa√m" in hist[0]["drivers"][-1]
+        # An unchanged recompute answers from the stored row.
+        assert client.post(f"/segments/s{j}/hri/compute").json()["drivers"]==_expected(ki)[:20]
+    assert db.scalar(select(func.count()).select_from(HRIScore))==len(KI)
+    top={d["rule"]:d for d in client.get("/scores/drivers").json()["drivers"]}
+    assert (top["gate.ki_kth"]["segments"],top["gate.ki_kth"]["km"])==(3,3.0)
+    stored=json.loads(db.scalar(select(CurrentScore.gate_values).where(CurrentScore.segment_id=="s1")))
+    assert stored["gate.ki_kth"][:2]==[50.5,40.0]
+
+def test_gate_values_split_back_exactly():
+    for code in (gate_code("gate.ki_kth",46,40.0,0.8123,0.4),gate_code("gate.integrity",0.1234),
+                 gate_code("gate.data_quality",0.35)):
+        text=render(code,active())
+        drivers,values=split_gates(["-5.00: M: hard",text])
+        assert drivers==["-5.00: M: hard",GATE_LABEL[code.rule]]
+        assert render(code._replace(values=tuple(json.loads(values)[code.rule])),active())==text
+
+def test_legacy_gate_text_converts_to_label_and_values(client,db):
+    _gated(client)
+    old=_expected(KI[0])
+    rec=HRIScore(segment_id="s0",model_version=MODEL_VERSION,hri=1.0,readiness_class="D",drivers_json=json.dumps(old),
+                 m=0,d=0,i=0,c=0,e=0,q=0,o=0)
+    db.add(rec); db.commit()
+    gates_before=db.scalar(select(func.count()).select_from(Driver).where(Driver.rule=="gate.ki_kth"))
+    assert compact_history(db)["rows_converted"]==1
+    db.expire_all()
+    row=db.get(HRIScore,rec.id)
+    assert row.drivers_json is None and json.loads(row.gate_values)["gate.ki_kth"][0]==KI[0]
+    assert db.scalar(select(func.count()).select_from(Driver).where(Driver.rule=="gate.ki_kth"))==gates_before==1
+    assert load_drivers(db,[(row.driver_ids,None,row.gate_values)])==[old]
+
+def test_interner_cache_is_bounded(db):
+    db.add_all([Driver(id=j,text=f"t{j}") for j in range(1,6)]); db.commit()
+    cache=Interner(size=3)
+    assert cache.texts(db,[1,2])=={1:"t1",2:"t2"}
+    assert cache.texts(db,[2,3,4])=={2:"t2",3:"t3",4:"t4"}
+    assert len(cache._texts)<=3
+    # Learning past the bound starts the cache over.
+    cache.learn([(("v",k),k,f"t{k}") for k in (1,2)])
+    assert (len(cache._ids),sorted(cache._texts))==(2,[1,2])
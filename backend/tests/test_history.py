@@ -0,0 +1,84 @@
+"""History compaction: exact rows kept per (segment_id, model_version), dry run against a real run."""
+from datetime import datetime,timezone
+from sqlalchemy import func,select
+from conftest import line_segments
+from app.db.models import CurrentScore,HRIScore
+from app.scoring.engine import MODEL_VERSION
+from app.scoring.history import compact_history
+
+NOW=datetime(2026,6,15,tzinfo=timezone.utc)
+ML="ml-gbm-1"
+PILLARS=dict(m=1.0,d=2.0,i=3.0,c=4.0,e=5.0,q=6.0,o=7.0)
+# (name, segment, model_version, created, hri, driver_ids, drivers_json); the cutoff for full_days=90 is 2026-03-17.
+ROWS=[("a1","s0",MODEL_VERSION,(2026,1,5),50,"1",None),
+      ("a2","s0",MODEL_VERSION,(2026,1,20),50,"1",None),   # same as a1: duplicate
+      ("a3","s0",MODEL_VERSION,(2026,1,25),60,"1",None),   # last of January: a1 is superseded
+      ("a4","s0",MODEL_VERSION,(2026,2,10),70,"1,2",None), # superseded by a5
+      ("a5","s0",MODEL_VERSION,(2026,2,20),65,"1,2",None),
+      ("a6","s0",MODEL_VERSION,(2026,5,1),65,"1,2",None),  # same as a5: duplicate, though recent
+      ("a7","s0",MODEL_VERSION,(2026,5,10),80,"2",None),   # current
+      ("b1","s0",ML,(2026,1,3),50,"1",None),               # same values as a1, other model: compared apart
+      ("b2","s0",ML,(2026,1,28),45,"1",None),
+      ("b3","s0",ML,(2026,2,1),45,"1",None),               # duplicate of b2 but the newest ml row: kept
+      ("c1","s1",MODEL_VERSION,(2026,4,1),30,None,'["-5.0: legacy x"]'),
+      ("c2","s1",MODEL_VERSION,(2026,4,10),30,None,'["-6.0: legacy y"]'),  # differs from c1 by drivers only; current
+      ("c3","s1",MODEL_VERSION,(2026,1,2),20,"3",None),
+      ("c4","s1",MODEL_VERSION,(2026,1,9),20,"3",None)]    # duplicate of c3
+CURRENT={"s0":"a7","s1":"c2"}
+
+def _seed(db):
+    line_segments(db,2)
+    ids={}
+    for name,seg,mv,day,hri,dids,dj in ROWS:
+        r=HRIScore(segment_id=seg,model_version=mv,hri=hri,readiness_class="B",driver_ids=dids,drivers_json=dj,
+                   created_at=datetime(*day,tzinfo=timezone.utc),**PILLARS)
+        db.add(r); db.flush()
+        ids[r.id]=name
+    for seg,name in CURRENT.items():
+        r=next(db.get(HRIScore,i) for i,n in ids.items() if n==name)
+        db.add(CurrentScore(segment_id=seg,score_id=r.id,model_version=r.model_version,hri=r.hri,
+                            readiness_class=r.readiness_class,driver_ids=r.driver_ids,**PILLARS))
+    db.commit()
+    return ids
+
+def _left(db,ids):
+    """Surviving row names per (segment_id, model_version)."""
+    db.expire_all()
+    out={}
+    for i,seg,mv in db.execute(select(HRIScore.id,HRIScore.segment_id,HRIScore.model_version).order_by(HRIScore.id)):
+        out.setdefault((seg,mv),[]).append(ids[i])
+    return out
+
+ALL={("s0",MODEL_VERSION):["a1","a2","a3","a4","a5","a6","a7"],("s0",ML):["b1","b2","b3"],
+     ("s1",MODEL_VERSION):["c1","c2","c3","c4"]}
+KEPT={("s0",MODEL_VERSION):["a3","a5","a7"],("s0",ML):["b2","b3"],("s1",MODEL_VERSION):["c1","c2","c3"]}
+
+def test_dry_run_counts_without_deleting(db):
+    ids=_seed(db)
+    res=compact_history(db,now=NOW,full_days=90,dry_run=True)
+    assert {k:res[k] for k in ("rows_converted","duplicates_removed","downsampled","expired","dry_run")}==\
+        {"rows_converted":2,"duplicates_removed":3,"downsampled":3,"expired":0,"dry_run":True}
+    assert _left(db,ids)==ALL
+    assert db.scalar(select(func.count()).select_from(HRIScore).where(HRIScore.driver_ids.is_(None)))==2
+
+def test_compaction_keeps_changes_monthly_snapshots_and_newest(db):
+    ids=_seed(db)
+    res=compact_history(db,now=NOW,full_days=90)
+    assert {k:res[k] for k in ("rows_converted","duplicates_removed","downsampled","expired","dry_run")}==\
+        {"rows_converted":2,"duplicates_removed":3,"downsampled":3,"expired":0,"dry_run":False}
+    assert _left(db,ids)==KEPT
+    # Legacy rows were converted, not merged: their drivers differ.
+    c1,c2=(db.scalar(select(HRIScore.driver_ids).where(HRIScore.id==i)) for i,n in ids.items() if n in ("c1","c2"))
+    assert c1 and c2 and c1!=c2
+    assert compact_history(db,now=NOW,full_days=90)["duplicates_removed"]==0
+    assert _left(db,ids)==KEPT
+
+def test_dry_run_matches_real_run_with_expiry(db):
+    ids=_seed(db)
+    dry=compact_history(db,now=NOW,full_days=90,keep_days=120,dry_run=True)
+    assert _left(db,ids)==ALL
+    real=compact_history(db,now=NOW,full_days=90,keep_days=120)
+    keys=("rows_converted","duplicates_removed","downsampled","expired")
+    assert [dry[k] for k in keys]==[real[k] for k in keys]==[2,3,3,3]
+    # Rows before 2026-02-15 expire except each segment's newest per model_version.
+    assert _left(db,ids)=={("s0",MODEL_VERSION):["a5","a7"],("s0",ML):["b3"],("s1",MODEL_VERSION):["c1","c2"]}
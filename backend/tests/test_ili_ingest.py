@@ -0,0 +1,33 @@
+"""ILI feature aggregation: the chunk size never changes the segment aggregates."""
+import pandas as pd
+import pytest
+from conftest import as_file,by_chunk_size,line_segments
+from app.ingest.ili import ingest_ili
+
+ILI=pd.DataFrame({
+    "pipeline_id":["p1","p1","p1","p1","p1","p1","p1",None,"p9"],
+    "chainage_km":[0.2,0.7,1.5,1.6,1.8,2.5,9.0,1.0,0.5],
+    "feature_type":["Metal loss","Corrosion","Crack","SCC","crack-like","Dent","Metal loss","Crack","Crack"],
+    "depth_pct":[12.0,30.0,None,None,None,4.0,50.0,None,None],
+    "length_mm":[None,None,40.0,None,25.0,None,None,10.0,10.0],
+})
+
+@pytest.mark.parametrize("fmt",["csv","parquet"])
+def test_ili_chunk_sizes(db,fmt):
+    def ingest(db,size):
+        line_segments(db)
+        return ingest_ili(db,as_file(ILI,fmt),fmt,chunk_size=size)
+    runs=by_chunk_size(db,ingest,[1,2,3,100])
+    for res,inputs in runs:
+        assert res==runs[-1][0]
+        assert inputs==runs[-1][1]
+    res,inputs=runs[-1]
+    assert {k:res[k] for k in ("features_read","features_assigned","features_unmatched","cracks","metal_loss")}== \
+           {"features_read":9,"features_assigned":6,"features_unmatched":3,"cracks":3,"metal_loss":2}
+    assert res["errors"]==["row 8: pipeline_id and a numeric chainage_km are required"]
+    # The inspected span is km 0.2-2.5: s2 gets zeros, s3 is left alone.
+    assert inputs=={
+        "s0":{"max_metal_loss_pct":30.0,"crack_density_per_km":0.0,"max_crack_length_mm":0.0},
+        "s1":{"max_metal_loss_pct":0.0,"crack_density_per_km":3.0,"max_crack_length_mm":40.0},
+        "s2":{"max_metal_loss_pct":0.0,"crack_density_per_km":0.0,"max_crack_length_mm":0.0},
+    }
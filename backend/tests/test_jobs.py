@@ -0,0 +1,123 @@
+"""Job queue: chunk planning, claims across sessions, lease expiry, cancel and ruleset pinning."""
+import json
+from datetime import datetime,timedelta,timezone
+from sqlalchemy import select,update
+from conftest import line_segments
+from app.core.config import JOB_MAX_ATTEMPTS
+from app.db.database import SessionLocal
+from app.db.models import CurrentScore,Job,JobChunk
+from app.jobs.queue import cancel,claim,complete,enqueue,reap,result
+from app.jobs.worker import run_one
+from app.scoring import rules
+
+def _chunks(db,job_id):
+    db.expire_all()
+    return [(c.seq,c.status,c.attempts) for c in
+            db.scalars(select(JobChunk).where(JobChunk.job_id==job_id).order_by(JobChunk.seq))]
+
+def _job(db,job_id):
+    db.expire_all()
+    return db.get(Job,job_id)
+
+def test_enqueue_plans_windows_and_pins_ruleset(db):
+    line_segments(db,7)
+    job=enqueue(db,"rescore",{"pipeline_id":"p1"},chunk_size=3)
+    windows=[(c.first_id,c.stop_id,c.segments) for c in
+             db.scalars(select(JobChunk).where(JobChunk.job_id==job.id).order_by(JobChunk.seq))]
+    assert windows==[("s0","s3",3),("s3","s6",3),("s6",None,1)]
+    assert (job.status,job.segments_total,job.chunks_total)==("queued",7,3)
+    assert json.loads(job.params_json)=={"pipeline_id":"p1","region":None,"force":False,
+                                         "ruleset_version":rules.active().version}
+
+def test_enqueue_without_segments_is_done(db):
+    job=enqueue(db,"rescore",{},chunk_size=3)
+    assert (job.status,job.chunks_total)==("succeeded",0)
+
+def test_two_sessions_claim_different_chunks(db):
+    line_segments(db,4)
+    job=enqueue(db,"rescore",{},chunk_size=2)
+    a,b=SessionLocal(),SessionLocal()
+    try:
+        ca,cb=claim(a,"a"),claim(b,"b")
+        assert {ca.seq,cb.seq}=={0,1}
+        assert claim(a,"a") is None and claim(b,"b") is None
+        assert _job(db,job.id).status=="running"
+        complete(a,ca,{"n":1})
+        assert _job(db,job.id).status=="running"
+        complete(b,cb,{"n":2})
+    finally:
+        a.close(); b.close()
+    done=_job(db,job.id)
+    assert (done.status,done.chunks_done,done.segments_done)==("succeeded",2,4)
+
+def test_reap_releases_expired_lease(db):
+    line_segments(db,2)
+    job=enqueue(db,"rescore",{},chunk_size=2)
+    lost=claim(db,"dead")
+    assert reap(db,timeout_s=60)==0
+    db.execute(update(JobChunk).where(JobChunk.id==lost.id)
+               .values(claimed_at=datetime.now(timezone.utc)-timedelta(seconds=120)))
+    db.commit()
+    assert reap(db,timeout_s=60)==1
+    assert _chunks(db,job.id)==[(0,"pending",1)]
+    again=claim(db,"alive")
+    assert again.attempts==2
+    # The dead worker's late completion no longer holds the chunk and is dropped.
+    complete(db,lost,{"n":1})
+    assert _chunks(db,job.id)==[(0,"running",2)]
+    assert _job(db,job.id).chunks_done==0
+    complete(db,again,{"n":2})
+    assert _chunks(db,job.id)==[(0,"done",2)]
+    assert _job(db,job.id).status=="succeeded"
+
+def test_reap_fails_job_after_max_attempts(db):
+    line_segments(db,4)
+    job=enqueue(db,"rescore",{},chunk_size=2)
+    for _ in range(JOB_MAX_ATTEMPTS):
+        c=claim(db,"dead")
+        assert c.seq==0
+        reap(db,timeout_s=-1)
+    assert _chunks(db,job.id)==[(0,"failed",JOB_MAX_ATTEMPTS),(1,"cancelled",0)]
+    failed=_job(db,job.id)
+    assert failed.status=="failed" and failed.error.startswith("chunk 0: claim expired")
+
+def test_cancel_mid_job_keeps_running_chunk(db):
+    line_segments(db,6)
+    job=enqueue(db,"rescore",{},chunk_size=2)
+    assert run_one(db,"w")
+    running=claim(db,"w")
+    assert cancel(db,job.id).status=="running"
+    assert _chunks(db,job.id)==[(0,"done",1),(1,"running",1),(2,"cancelled",0)]
+    assert claim(db,"w") is None
+    complete(db,running,{"segments_scored":2,"segments_unchanged":0,"history_deduplicated":0,"chunks":1,
+                         "class_counts":{},"elapsed_s":0.0})
+    done=_job(db,job.id)
+    assert (done.status,done.cancel_requested,done.chunks_done,done.segments_done)==("cancelled",True,2,4)
+    assert result(db,done)["segments_scored"]==4
+    assert cancel(db,job.id).status=="cancelled"
+
+def test_worker_reloads_pinned_ruleset(db,monkeypatch):
+    line_segments(db,2)
+    pinned=rules.active()
+    job=enqueue(db,"rescore",{},chunk_size=2)
+    # A worker that compiled an older penalties.yaml reloads before scoring.
+    with open(rules.DEFAULT_PATH,"rb") as f:
+        monkeypatch.setattr(rules,"_ACTIVE",rules.parse_rules(f.read()+b"\n# older\n"))
+    assert rules.active().version!=pinned.version
+    assert run_one(db,"w")
+    assert rules.active().version==pinned.version
+    assert _job(db,job.id).status=="succeeded"
+    assert set(db.scalars(select(CurrentScore.ruleset_version)))=={pinned.version}
+
+def test_worker_fails_chunk_on_unknown_ruleset(db):
+    line_segments(db,2)
+    job=enqueue(db,"rescore",{},chunk_size=2)
+    db.execute(update(Job).where(Job.id==job.id)
+               .values(params_json=json.dumps({**json.loads(job.params_json),"ruleset_version":"elsewhere"})))
+    db.commit()
+    for attempt in range(1,JOB_MAX_ATTEMPTS+1):
+        assert run_one(db,"w")
+        assert _chunks(db,job.id)==[(0,"pending" if attempt<JOB_MAX_ATTEMPTS else "failed",attempt)]
+    failed=_job(db,job.id)
+    assert failed.status=="failed" and "job needs ruleset elsewhere" in failed.error
+    assert db.scalar(select(CurrentScore.segment_id)) is None
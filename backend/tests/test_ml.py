@@ -0,0 +1,73 @@
+"""Level-2 models: tree ensembles against a hand-walked tree, and rescore_ml appending only changed scores."""
+import json
+import numpy as np
+import pytest
+from sqlalchemy import func,select
+from conftest import line_segments
+from app.db.models import HRIScore,SegmentInputs
+from app.scoring import ml
+from app.scoring.ml import Registry,TreeEnsembleScorer,rescore_ml
+
+FEATURES=["hardness_haz_hv","temp_min_c"]
+# x0 <= 5 ? (x1 <= 2 ? 10 : 20) : 30; a missing x0 goes left, a missing x1 goes right.
+DEEP={"feature":[0,1,-1,-1,-1],"threshold":[5.0,2.0,0,0,0],"left":[1,3,-1,-1,-1],"right":[2,4,-1,-1,-1],
+      "value":[0,0,30.0,10.0,20.0],"missing_left":[True,False,True,True,True]}
+# x1 <= 0 ? -1 : 2, missing right.
+STUMP={"feature":[1,-1,-1],"threshold":[0.0,0,0],"left":[1,-1,-1],"right":[2,-1,-1],"value":[0,-1.0,2.0],
+       "missing_left":[False,True,True]}
+LEAF={"feature":[-1],"threshold":[0],"left":[-1],"right":[-1],"value":[0.5]}
+
+def _walk(tree,x,strict):
+    """Reference: follow one tree node by node."""
+    k=0
+    while tree["left"][k]>=0:
+        v=x[tree["feature"][k]]
+        if np.isnan(v):
+            go=tree.get("missing_left",[True]*len(tree["value"]))[k]
+        else:
+            go=v<tree["threshold"][k] if strict else v<=tree["threshold"][k]
+        k=tree["left"][k] if go else tree["right"][k]
+    return tree["value"][k]
+
+X=np.array([[5.0,2.0],[5.0,0.0],[4.0,2.5],[6.0,-1.0],[np.nan,1.0],[np.nan,np.nan],[3.0,np.nan],[7.0,np.nan]])
+
+@pytest.mark.parametrize("split,expected",[
+    ("<=",[12,9,22,29,12,22,22,32]),
+    ("<",[32,32,22,29,12,22,22,32]),
+])
+def test_tree_ensemble_matches_hand_walk(split,expected):
+    trees=[DEEP,STUMP,LEAF]
+    scorer=TreeEnsembleScorer("t","1",{"features":FEATURES,"trees":trees,"base_score":40.0,"split":split},"x")
+    got=scorer.predict(X)
+    walked=[40.0+sum(_walk(t,x,split=="<") for t in trees) for x in X]
+    assert got.tolist()==walked==[40.0+e+0.5 for e in expected]
+
+def test_missing_left_defaults_to_true():
+    tree={k:v for k,v in DEEP.items() if k!="missing_left"}
+    scorer=TreeEnsembleScorer("t","1",{"features":FEATURES,"trees":[tree]},"x")
+    # A missing x1 now goes left as well.
+    assert scorer.predict(np.array([[np.nan,np.nan],[8.0,np.nan]])).tolist()==[10.0,30.0]
+
+def test_rescore_ml_skips_unchanged(db,tmp_path,monkeypatch):
+    (tmp_path/"lin").mkdir()
+    (tmp_path/"lin"/"1.json").write_text(json.dumps({"kind":"linear","features":["hardness_haz_hv"],
+                                                     "intercept":90.0,"coef":[-0.1],"impute":[250.0]}))
+    monkeypatch.setattr(ml,"_REGISTRY",Registry(str(tmp_path)))
+    line_segments(db,3)
+    mv="ml-lin-1"
+    count=lambda:db.scalar(select(func.count()).select_from(HRIScore).where(HRIScore.model_version==mv))
+    def run(**kw):
+        res=rescore_ml(db,mv,**kw)
+        return res["segments_scored"],res["segments_unchanged"]
+    assert run()==(3,0)
+    assert run()==(0,3)
+    assert count()==3
+    db.add(SegmentInputs(segment_id="s1",hardness_haz_hv=300.0,revision=1))
+    db.commit()
+    assert run()==(1,2)
+    assert count()==4
+    latest=db.scalar(select(HRIScore.hri).where(HRIScore.model_version==mv,HRIScore.segment_id=="s1")
+                     .order_by(HRIScore.id.desc()).limit(1))
+    assert latest==60.0
+    assert run(force=True)==(3,0)
+    assert count()==7
@@ -0,0 +1,42 @@
+"""List endpoints return every row unless the client pages with limit or cursor."""
+import pytest
+from app.db import paging
+
+@pytest.fixture
+def portfolio(client):
+    client.post("/pipelines",json={"id":"p1","name":"Line 1","region":"UK"})
+    client.post("/pipelines",json={"id":"p2","name":"Line 2","region":"NL"})
+    for j in range(7):
+        client.post("/segments",json={"id":f"s{j}","pipeline_id":"p1" if j<4 else "p2","start_km":j,"end_km":j+1})
+    client.post("/scores/rescore")
+    return client
+
+def _all_pages(client,path,**params):
+    items,pages=[],0
+    while True:
+        r=client.get(path,params=params)
+        assert r.status_code==200
+        items+=r.json()
+        pages+=1
+        if "X-Next-Cursor" not in r.headers:
+            return items,pages
+        params["cursor"]=r.headers["X-Next-Cursor"]
+
+@pytest.mark.parametrize("path,key,n",[("/pipelines","id",2),("/segments","id",7),("/scores/latest","segment_id",7)])
+def test_unpaged_by_default(portfolio,monkeypatch,path,key,n):
+    monkeypatch.setattr(paging,"PAGE_SIZE_DEFAULT",1)
+    r=portfolio.get(path)
+    assert "X-Next-Cursor" not in r.headers
+    everything=r.json()
+    assert len(everything)==n
+    # Paging by limit, and by cursor alone (PAGE_SIZE_DEFAULT rows per page), covers the same rows in the same order.
+    items,pages=_all_pages(portfolio,path,limit=3)
+    assert (items,pages)==(everything,-(-n//3))
+    first=portfolio.get(path,params={"limit":1})
+    items,pages=_all_pages(portfolio,path,cursor=first.headers["X-Next-Cursor"])
+    assert [x[key] for x in first.json()+items]==[x[key] for x in everything]
+    assert pages==n-1
+
+def test_limit_bounds(portfolio):
+    assert portfolio.get("/segments",params={"limit":0}).status_code==400
+    assert portfolio.get("/segments",params={"limit":10**9}).status_code==400
@@ -0,0 +1,61 @@
+"""Pipeline rollups stay equal to a full rebuild when two writers move the same current scores at once."""
+import threading
+from sqlalchemy import select
+from conftest import line_segments
+from app.db.database import SessionLocal
+from app.db.models import HRIScore,PipelineRollup
+from app.scoring.latest import record_current
+from app.scoring.rescore import rescore
+from app.scoring.rollups import SUMS,refresh_rollups
+
+def _score(db,sid,hri,klass):
+    row={"segment_id":sid,"model_version":"rules-test","hri":hri,"readiness_class":klass,
+         "m":0.5,"d":0.5,"i":0.5,"c":0.5,"e":0.5,"q":0.5,"o":0.5}
+    rec=HRIScore(**row); db.add(rec); db.flush()
+    return {**row,"id":rec.id}
+
+def _rollups(db):
+    db.expire_all()
+    return {r.pipeline_id:{k:round(getattr(r,k),6) for k in SUMS} for r in db.scalars(select(PipelineRollup))}
+
+def test_interleaved_writers_match_refresh(db):
+    line_segments(db,4)
+    rescore(db)
+    a=[_score(db,"s0",10.0,"Not Ready"),_score(db,"s1",20.0,"Not Ready")]
+    b=[_score(db,"s1",90.0,"Fully Ready"),_score(db,"s2",80.0,"Fully Ready")]
+    db.commit()
+    held=threading.Event()
+    errors=[]
+
+    def first():
+        s=SessionLocal()
+        try:
+            record_current(s,a)
+            held.set()
+            # Keep the transaction open while the second writer starts on the same segments.
+            threading.Event().wait(0.5)
+            s.commit()
+        except Exception as e:
+            errors.append(e); held.set()
+        finally:
+            s.close()
+
+    def second():
+        held.wait()
+        s=SessionLocal()
+        try:
+            record_current(s,b)
+            s.commit()
+        except Exception as e:
+            errors.append(e)
+        finally:
+            s.close()
+
+    threads=[threading.Thread(target=first),threading.Thread(target=second)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert not errors
+    tracked=_rollups(db)
+    refresh_rollups(db)
+    assert tracked==_rollups(db)
+    assert tracked["p1"]["segments"]==4
@@ -0,0 +1,40 @@
+"""SCADA pressure ingest: rainflow residue, surges and dp/dt carry across chunks."""
+import numpy as np
+import pandas as pd
+from conftest import as_file,by_chunk_size,line_segments
+from app.db.models import ScadaTag
+from app.ingest.scada import ingest_scada
+
+def _pressures():
+    """25 h of one-minute samples for two interleaved tags.
+
+    t1 is a 50-60 bar triangle wave with a 10-minute period (2 bar per minute); t2 holds 50 bar
+    apart from one 90 bar spike at minute 100.
+    """
+    minutes=np.arange(1501)
+    t1=50+2*np.minimum(minutes%10,10-minutes%10)
+    t2=np.where(minutes==100,90,50)
+    ts=pd.to_datetime(minutes*60,unit="s",utc=True).strftime("%Y-%m-%dT%H:%M:%SZ")
+    return pd.DataFrame({"tag":np.repeat([["t1","t2"]],len(minutes),axis=0).ravel(),
+                         "timestamp":np.repeat(ts.to_numpy(),2),
+                         "pressure_bar":np.column_stack([t1,t2]).ravel().astype(float)})
+
+def test_scada_chunk_sizes(db):
+    df=_pressures()
+    def ingest(db,size):
+        line_segments(db)
+        db.add_all([ScadaTag(tag="t1",pipeline_id="p1",start_km=0,end_km=2),
+                    ScadaTag(tag="t2",pipeline_id="p1",start_km=1,end_km=3)])
+        db.commit()
+        return ingest_scada(db,as_file(df,"csv"),"csv",chunk_size=size)
+    runs=by_chunk_size(db,ingest,[1,7,500,10**6])
+    for res,inputs in runs:
+        assert res==runs[-1][0]
+        assert inputs==runs[-1][1]
+    res,inputs=runs[-1]
+    t1={"cycles_per_day":144.0,"cycle_range_bar":10.0,"surge_events_per_year":0.0,"dpdt_p95_bar_per_s":0.0333}
+    # The spike is one surge (two exceedances a minute apart) and one 40 bar cycle from its residue.
+    t2={"cycles_per_day":0.96,"cycle_range_bar":40.0,"surge_events_per_year":350.64,"dpdt_p95_bar_per_s":0.005}
+    assert res["tags"]==[{"tag":"t1","hours":25.0,"samples":1501,**t1},{"tag":"t2","hours":25.0,"samples":1501,**t2}]
+    # s1 is covered by both tags and takes the worse value of each metric.
+    assert inputs=={"s0":t1,"s1":{k:max(t1[k],t2[k]) for k in t1},"s2":t2}
@@ -0,0 +1,24 @@
+"""Sensitivity moves report the band threshold and the comparison to meet, not a nudged float."""
+from app.scoring.engine import compute_hri
+
+INPUTS={"hardness_haz_hv":265.0,"ki_mpa_sqrtm":30.0,"kth_mpa_sqrtm":40.0,"smys_mpa":359.0,"coating_type":"FBE"}
+
+def _moves(client,inputs):
+    client.post("/pipelines",json={"id":"p1","name":"Line 1"})
+    client.post("/segments",json={"id":"s0","pipeline_id":"p1","start_km":0,"end_km":1})
+    client.post("/segments/s0/inputs",json=inputs)
+    return {m["field"]:m for m in client.get("/segments/s0/hri/sensitivity").json()["interventions"]}
+
+def test_band_threshold_and_condition(client):
+    moves=_moves(client,INPUTS)
+    hard=moves["hardness_haz_hv"]
+    assert (hard["current"],hard["target"],hard["condition"])==(265.0,260.0,"< 260")
+    # Any value meeting the condition scores like the reported new_hri.
+    assert compute_hri({**INPUTS,"hardness_haz_hv":259.5})[0]==hard["new_hri"]
+    assert all(m["condition"] is None for m in moves.values() if isinstance(m["target"],(bool,str)))
+
+def test_gate_threshold_is_inclusive(client):
+    inputs={**INPUTS,"ki_mpa_sqrtm":46.0}
+    ki=_moves(client,inputs)["ki_mpa_sqrtm"]
+    assert (ki["target"],ki["condition"],ki["gates_released"])==(40.0,"<= 40",["ki_kth"])
+    assert compute_hri({**inputs,"ki_mpa_sqrtm":40.0})[0]==ki["new_hri"]
@@ -0,0 +1,60 @@
+"""Input revisions move only on real changes, and stale rescoring reads exactly the edited segments."""
+from sqlalchemy import select,func,text
+from app.db.models import HRIScore,Pipeline,Segment,SegmentInputs
+from app.db.init_db import init_db
+from app.db.upsert import upsert
+
+BASE={"smys_mpa":359.0,"ki_mpa_sqrtm":20.0,"kth_mpa_sqrtm":50.0,"coating_type":"FBE"}
+
+def _seed(db,n=4):
+    db.add(Pipeline(id="p1",name="Line 1",region="UK"))
+    db.add_all([Segment(id=f"s{j}",pipeline_id="p1",start_km=j,end_km=j+1) for j in range(n)])
+    db.flush()
+    upsert(db,SegmentInputs,[{"segment_id":f"s{j}",**BASE} for j in range(n)],["segment_id"],revision="revision")
+    db.commit()
+
+def _revisions(db):
+    return dict(db.execute(select(SegmentInputs.segment_id,SegmentInputs.revision)).all())
+
+def test_upsert_bumps_revision_on_real_change_only(db):
+    _seed(db)
+    assert _revisions(db)=={"s0":0,"s1":0,"s2":0,"s3":0}
+    rows=[{"segment_id":"s0",**BASE},
+          {"segment_id":"s1",**BASE,"smys_mpa":414.0},
+          {"segment_id":"s2",**BASE,"coating_type":None}]
+    upsert(db,SegmentInputs,rows,["segment_id"],revision="revision")
+    db.commit()
+    assert _revisions(db)=={"s0":0,"s1":1,"s2":1,"s3":0}
+    # Replaying the same rows is not a change.
+    upsert(db,SegmentInputs,rows,["segment_id"],revision="revision")
+    db.commit()
+    assert _revisions(db)=={"s0":0,"s1":1,"s2":1,"s3":0}
+    assert db.get(SegmentInputs,"s1").smys_mpa==414.0
+
+def test_rescore_stale_reads_changed_segments_only(db,client):
+    _seed(db)
+    assert client.get("/scores/stale").json()=={"stale_segments":4}
+    assert client.post("/scores/rescore").json()["segments_scored"]==4
+    assert client.get("/scores/stale").json()=={"stale_segments":0}
+    upsert(db,SegmentInputs,[{"segment_id":"s1",**BASE,"ki_mpa_sqrtm":60.0},{"segment_id":"s2",**BASE}],
+           ["segment_id"],revision="revision")
+    db.commit()
+    # The inputs endpoint replaces the whole row: s3 gains soil_ph, s0 is posted unchanged.
+    assert client.post("/segments/s3/inputs",json={**BASE,"soil_ph":5.0}).json()["changed"]==["soil_ph"]
+    assert client.post("/segments/s0/inputs",json=BASE).json()["changed"]==[]
+    assert client.get("/scores/stale").json()=={"stale_segments":2}
+    res=client.post("/scores/rescore/stale").json()
+    assert (res["segments_scored"],res["segments_unchanged"])==(2,0)
+    assert client.get("/scores/stale").json()=={"stale_segments":0}
+    counts=dict(db.execute(select(HRIScore.segment_id,func.count()).group_by(HRIScore.segment_id)).all())
+    assert counts=={"s0":1,"s1":2,"s2":1,"s3":2}
+
+def test_init_db_adds_revision_to_existing_table(db):
+    _seed(db,2)
+    db.execute(text("ALTER TABLE segment_inputs DROP COLUMN revision"))
+    db.commit()
+    init_db()
+    assert _revisions(db)=={"s0":0,"s1":0}
+    upsert(db,SegmentInputs,[{"segment_id":"s0",**BASE,"soil_ph":6.0}],["segment_id"],revision="revision")
+    db.commit()
+    assert _revisions(db)=={"s0":1,"s1":0}
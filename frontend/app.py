@@ -12,6 +12,29 @@ st.title("H2Ready – Full MVP (M, D, I, C, E, Q, O with K_I/K_TH Gate)")
 def api_get(path, **params):
     return requests.get(f"{API_BASE}{path}", params=params, timeout=60)
 
+def api_get_all(path, **params):
+    """Follow X-Next-Cursor through every page of a list endpoint; returns (ok, items, error_text)."""
+    items = []
+    params.setdefault("limit", 5000)
+    while True:
+        r = api_get(path, **params)
+        if not r.ok:
+            return False, items, r.text
+        items.extend(r.json())
+        cursor = r.headers.get("X-Next-Cursor")
+        if not cursor:
+            return True, items, ""
+        params["cursor"] = cursor
+
+_segment_ids = None
+
+def segment_ids():
+    """All segment ids, fetched once per rerun (after any segment created in the Setup tab)."""
+    global _segment_ids
+    if _segment_ids is None:
+        _segment_ids = [s["id"] for s in api_get_all("/segments", fields="id")[1]]
+    return _segment_ids
+
 def api_post(path, payload=None):
     return requests.post(f"{API_BASE}{path}", json=payload, timeout=120)
 
@@ -68,9 +91,9 @@ with tabs[0]:
         else:
             st.error(r.text)
 
-    pipes = api_get("/pipelines")
+    pipes = api_get("/pipelines", limit=200)
     if pipes.ok and pipes.json():
-        st.write("Existing pipelines:")
+        st.write("Existing pipelines:" + (" (first 200)" if pipes.headers.get("X-Next-Cursor") else ""))
         st.table(pipes.json())
     else:
         st.info("No pipelines yet. Create one above.")
@@ -93,9 +116,9 @@ with tabs[0]:
         else:
             st.error(r.text)
 
-    segs = api_get("/segments")
+    segs = api_get("/segments", limit=200)
     if segs.ok and segs.json():
-        st.write("Existing segments:")
+        st.write("Existing segments:" + (" (first 200)" if segs.headers.get("X-Next-Cursor") else ""))
         st.table(segs.json())
     else:
         st.info("No segments yet. Create at least one above.")
@@ -103,8 +126,7 @@ with tabs[0]:
 # INPUTS TAB
 with tabs[1]:
     st.subheader("Segment Inputs for All 7 Pillars")
-    segs = api_get("/segments")
-    seg_list = [s["id"] for s in (segs.json() if segs.ok else [])]
+    seg_list = segment_ids()
     if not seg_list:
         st.info("Create a segment first in the Setup tab.")
     else:
@@ -260,8 +282,7 @@ with tabs[2]:
 - 86–100 → 🔵 **Fully Ready** – Suitable for hydrogen duty  
 """)
 
-    segs = api_get("/segments")
-    seg_list = [s["id"] for s in (segs.json() if segs.ok else [])]
+    seg_list = segment_ids()
     if not seg_list:
         st.info("Create a segment first in the Setup tab.")
     else:
@@ -355,14 +376,84 @@ with tabs[2]:
                 st.markdown("**Narrative Recommendation:**")
                 st.markdown(build_narrative(data.get("pillars", {})))
 
+                sens = api_get(f"/segments/{sel}/hri/sensitivity")
+                if sens.ok and sens.json()["interventions"]:
+                    st.markdown("**Highest-gain interventions (one input moved to its next better band):**")
+                    st.dataframe(
+                        pd.DataFrame(sens.json()["interventions"])[
+                            ["field", "pillar", "current", "target", "condition", "gain_hri", "new_hri", "new_readiness_class", "gates_released"]
+                        ].head(10),
+                        use_container_width=True,
+                    )
+
             else:
                 st.error(r.text)
 
+    st.markdown("---")
+    st.subheader("Portfolio Rescore (background job)")
+    if st.button("Rescore stale segments"):
+        r = api_post("/jobs", {"kind": "rescore_stale"})
+        if r.ok:
+            st.session_state["rescore_job"] = r.json()["id"]
+        else:
+            st.error(r.text)
+    job_id = st.session_state.get("rescore_job")
+    if job_id:
+        jr = api_get(f"/jobs/{job_id}")
+        if jr.ok:
+            job = jr.json()
+            st.progress(job["progress"], text=f"{job['status']}: {job['segments_done']} / {job['segments_total']} segments")
+            if job["status"] in ("queued", "running"):
+                c1, c2 = st.columns(2)
+                c1.button("Refresh status")
+                if c2.button("Cancel job"):
+                    api_post(f"/jobs/{job_id}/cancel")
+            elif job["status"] == "failed":
+                st.error(job["error"])
+            else:
+                res = api_get(f"/jobs/{job_id}/result")
+                if res.ok:
+                    st.write(f"Scored {res.json()['segments_scored']}, unchanged {res.json()['segments_unchanged']}.")
+
+    st.markdown("---")
+    st.subheader("Portfolio Rollups")
+    group_by = st.radio("Group by", ["pipeline", "region", "operator", "portfolio"], horizontal=True)
+    ru = api_get("/scores/rollups", by=group_by)
+    if ru.ok and ru.json()["groups"]:
+        groups = ru.json()["groups"]
+        df_ru = pd.DataFrame(
+            [{"group": g["key"] or "(all)", "segments": g["segments"], "km": g["km"], "km-weighted HRI": g["hri"],
+              **{f"gate {k}": v for k, v in g["gate_counts"].items()}} for g in groups]
+        )
+        st.dataframe(df_ru, use_container_width=True)
+        df_km = pd.DataFrame(
+            [{"group": g["key"] or "(all)", "class": c, "km": km} for g in groups for c, km in g["class_km"].items()]
+        )
+        st.altair_chart(
+            alt.Chart(df_km).mark_bar().encode(
+                x=alt.X("km:Q", stack="normalize", title="Share of km"),
+                y=alt.Y("group:N", title=group_by.capitalize()),
+                color=alt.Color("class:N", scale=alt.Scale(
+                    domain=["Not Ready", "Conditionally Ready", "Ready with Controls", "Fully Ready"],
+                    range=["#d73027", "#fc8d59", "#1a9850", "#4575b4"])),
+                tooltip=["group", "class", "km"],
+            ),
+            use_container_width=True,
+        )
+    elif ru.ok:
+        st.info("No scores computed yet.")
+    else:
+        st.error(ru.text)
+
     st.markdown("---")
     st.subheader("Portfolio Dashboard – Latest Scores & Mini Heatmap")
-    latest = api_get("/scores/latest")
-    if latest.ok:
-        df = pd.DataFrame(latest.json())
+    # The per-segment table pages through every segment; load it only on request.
+    show_segments = st.checkbox("Load per-segment scores and heatmap")
+    latest_ok, latest_rows, latest_err = api_get_all("/scores/latest") if show_segments else (True, None, "")
+    if latest_rows is None:
+        pass
+    elif latest_ok:
+        df = pd.DataFrame(latest_rows)
         if not df.empty:
             st.dataframe(df, use_container_width=True)
             df_hm = df.dropna(subset=["hri"]).copy()
@@ -388,4 +479,4 @@ with tabs[2]:
         else:
             st.info("No scores computed yet.")
     else:
-        st.error(latest.text)
+        st.error(latest_err)